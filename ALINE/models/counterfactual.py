@@ -0,0 +1,172 @@
+"""
+Counterfactual (What-If) Scoring
+
+Scores many variants of one 24-hour window in a single forward. Each
+scenario is a list of perturbations (set / scale / add a value on a range
+of features × hours), applied in order. Every perturbation is an affine
+map of the current value (set v: 0·x + v, scale s: s·x, add d: x + d), so a
+whole scenario composes into one per-cell map x → A·x + C. The variants are
+then materialized for all scenarios at once by broadcasting the base window
+against the stacked [N, T, F] maps.
+
+Sensitivity surfaces are the special case used for interactive sliders:
+for each of K actionable features and G grid values, the whole day's value
+of that feature is set to the grid value, for B windows at once.
+
+Author: ALINE Team
+Date: 2025-11-17
+"""
+
+from typing import Dict, List, Sequence, Tuple
+
+import torch
+
+from models.risk_head import analytic_risk
+
+# Supported perturbation operations
+OPERATIONS = ('set', 'scale', 'add')
+
+# (operation, feature indices, first hour, end hour (exclusive), value)
+Perturbation = Tuple[str, Sequence[int], int, int, float]
+
+
+def perturbation_maps(
+    scenarios: List[List[Perturbation]],
+    seq_len: int,
+    n_features: int
+) -> Tuple[torch.Tensor, torch.Tensor]:
+    """
+    Compose each scenario's perturbations into per-cell affine maps.
+
+    Args:
+        scenarios: N scenarios, each a list of perturbations applied in order
+        seq_len: Hours per window (T)
+        n_features: Features per hour (F)
+
+    Returns:
+        scale, shift: Each [N, T, F]; a variant is base * scale + shift
+
+    Raises:
+        ValueError: On an unknown operation or out-of-range feature/hour
+    """
+    scale = torch.ones(len(scenarios), seq_len, n_features)
+    shift = torch.zeros(len(scenarios), seq_len, n_features)
+
+    for n, perturbations in enumerate(scenarios):
+        for operation, features, hour_start, hour_end, value in perturbations:
+            if operation not in OPERATIONS:
+                raise ValueError(f"Unknown operation '{operation}' (expected one of {', '.join(OPERATIONS)})")
+            if not 0 <= hour_start < hour_end <= seq_len:
+                raise ValueError(f"Hour range [{hour_start}, {hour_end}) is not within [0, {seq_len})")
+            if any(not 0 <= f < n_features for f in features):
+                raise ValueError(f"Feature indices must be in [0, {n_features})")
+
+            cells = (n, slice(hour_start, hour_end), list(features))
+            if operation == 'set':
+                scale[cells] = 0.0
+                shift[cells] = value
+            elif operation == 'scale':
+                scale[cells] *= value
+                shift[cells] *= value
+            else:
+                shift[cells] += value
+
+    return scale, shift
+
+
+def materialize_variants(base: torch.Tensor, scale: torch.Tensor, shift: torch.Tensor) -> torch.Tensor:
+    """
+    All variants of a window as one batch.
+
+    Args:
+        base: Base window [T, F]
+        scale, shift: Per-scenario maps [N, T, F]
+
+    Returns:
+        Variants [N, T, F]
+    """
+    return base.unsqueeze(0) * scale + shift
+
+
+def counterfactual_risk(
+    model,
+    base: torch.Tensor,
+    scenarios: List[List[Perturbation]],
+    migraine_weights: torch.Tensor,
+    migraine_bias: float
+) -> Dict[str, torch.Tensor]:
+    """
+    Risk of the base window and of every scenario, from one forward.
+
+    Args:
+        model: SimpleALINE model
+        base: Base window [T, F]
+        scenarios: Perturbation lists (see perturbation_maps)
+        migraine_weights: Weights for migraine prediction [z_dim]
+        migraine_bias: Bias for migraine prediction
+
+    Returns:
+        Dict with 'mean', 'lower', 'upper' of shape [N + 1] (index 0 is the
+        base window) and 'delta' [N]: scenario mean minus base mean
+    """
+    seq_len, n_features = base.shape
+    scale, shift = perturbation_maps(scenarios, seq_len, n_features)
+    batch = torch.cat([
+        base.unsqueeze(0),
+        materialize_variants(base, scale.to(base.device), shift.to(base.device))
+    ])  # [N + 1, T, F]
+
+    with torch.no_grad():
+        posterior, _ = model(batch)
+        mean, lower, upper = analytic_risk(
+            posterior.mean[:, -1, :], posterior.stddev[:, -1, :], migraine_weights, migraine_bias
+        )
+
+    return {'mean': mean, 'lower': lower, 'upper': upper, 'delta': mean[1:] - mean[0]}
+
+
+def sensitivity_surfaces(
+    model,
+    windows: torch.Tensor,
+    feature_indices: Sequence[int],
+    grid: Sequence[float],
+    migraine_weights: torch.Tensor,
+    migraine_bias: float
+) -> Dict[str, torch.Tensor]:
+    """
+    Risk of each window and of each (feature, grid value) variant, from one forward.
+
+    Args:
+        model: SimpleALINE model
+        windows: Base windows [B, T, F]
+        feature_indices: K features to vary
+        grid: G values each feature is set to (over all hours)
+        migraine_weights: Weights for migraine prediction [z_dim]
+        migraine_bias: Bias for migraine prediction
+
+    Returns:
+        Dict with 'mean', 'lower', 'upper' of the base windows [B] and
+        'surface': mean risk of the variants [B, K, G]
+    """
+    B, T, F = windows.shape
+    K, G = len(feature_indices), len(grid)
+
+    # [K, F] one-hot feature masks and [G] values, broadcast to [B, K, G, T, F]
+    device = windows.device
+    mask = torch.zeros(K, F, dtype=torch.bool, device=device)
+    mask[torch.arange(K, device=device), torch.as_tensor(list(feature_indices), device=device)] = True
+    values = torch.as_tensor(list(grid), dtype=windows.dtype, device=device)
+    variants = torch.where(
+        mask[None, :, None, None, :],
+        values[None, None, :, None, None],
+        windows[:, None, None, :, :]
+    )
+
+    batch = torch.cat([windows, variants.reshape(B * K * G, T, F)])
+    with torch.no_grad():
+        posterior, _ = model(batch)
+        mean, lower, upper = analytic_risk(
+            posterior.mean[:, -1, :], posterior.stddev[:, -1, :], migraine_weights, migraine_bias
+        )
+
+    return {'mean': mean[:B], 'lower': lower[:B], 'upper': upper[:B], 'surface': mean[B:].reshape(B, K, G)}
@@ -4,7 +4,14 @@ Active Query Policy Utilities - Ticket 007 & 022
 Implements priority scoring for selecting k hourly slots for targeted sensing.
 Uses uncertainty and impact metrics to determine which hours to query.
 
-Ticket 022 adds feature-level information gain for recommending WHAT to measure.
+Ticket 022 adds feature-level information gain for recommending WHAT to measure;
+feature_information_gain computes it natively for SimpleALINE, per sample for
+a whole batch in one backward, and rank_feature_queries selects the top hours
+and features with batched topk/gather.
+
+plan_measurement_schedule spreads a measurement budget over a multi-day
+horizon: lazy-greedy maximization of a submodular expected-uncertainty-
+reduction objective, scored from one batched forward per chunk of days.
 
 Author: ALINE Team
 Date: 2025-11-15
@@ -14,6 +21,8 @@ import torch
 import numpy as np
 from typing import Tuple, Optional, List, Dict
 
+from models.risk_head import analytic_risk
+
 
 def compute_priority_scores(
     posterior_mean: torch.Tensor,
@@ -319,50 +328,404 @@ def get_priority_queries(
     if feature_names is None:
         feature_names = [f"Feature_{i}" for i in range(F)]
     
-    batch_results = []
-    
-    for b in range(B):
-        # Temporal queries: max across features per timestep
-        temporal_scores = feature_gains[b].max(dim=-1).values  # [T]
-        top_temporal_indices = torch.topk(temporal_scores, min(k_temporal, T)).indices
-        
-        temporal_queries = []
-        for i in range(len(top_temporal_indices)):
-            hour_idx = top_temporal_indices[i].item()
-            score = temporal_scores[hour_idx].item()
-            
-            # Find which features are most important at this hour
-            hour_feature_gains = feature_gains[b, hour_idx]
-            top_features_at_hour = torch.topk(hour_feature_gains, min(3, F)).indices
-            feature_list = [feature_names[idx.item()] for idx in top_features_at_hour]
-            
-            temporal_queries.append({
-                "hour": hour_idx,
-                "score": float(score),
-                "features": feature_list
-            })
-        
-        # Feature queries: max across timesteps per feature
-        feature_scores = feature_gains[b].max(dim=0).values  # [F]
-        top_feature_indices = torch.topk(feature_scores, min(k_features, F)).indices
-        
-        feature_queries = []
-        for i in range(len(top_feature_indices)):
-            feat_idx = top_feature_indices[i].item()
-            score = feature_scores[feat_idx].item()
-            
-            # Find best hour to measure this feature
-            best_hour = feature_gains[b, :, feat_idx].argmax().item()
-            
-            feature_queries.append({
-                "feature": feature_names[feat_idx],
-                "score": float(score),
-                "best_hour": best_hour
-            })
-        
-        batch_results.append({
-            "temporal_queries": temporal_queries,
-            "feature_queries": feature_queries
-        })
-    
-    return batch_results
+    ranked = rank_feature_queries(feature_gains, k_temporal, k_features)
+    return format_feature_queries(ranked, feature_names)
+
+
+# ============================================================================
+# BATCHED FEATURE INFORMATION GAIN FOR SimpleALINE
+# ============================================================================
+
+def simple_aline_risk(
+    model,
+    x: torch.Tensor,
+    migraine_weights: torch.Tensor,
+    migraine_bias: float
+) -> torch.Tensor:
+    """
+    Daily migraine risk of each window: the analytic risk head applied to
+    SimpleALINE's posterior at the last hour.
+
+    Args:
+        model: SimpleALINE model
+        x: Input features [B, T, F]
+        migraine_weights: Weights for migraine prediction [z_dim]
+        migraine_bias: Bias for migraine prediction
+
+    Returns:
+        Mean migraine probability [B]
+    """
+    posterior, _ = model(x)
+    mean, _, _ = analytic_risk(
+        posterior.mean[:, -1, :], posterior.stddev[:, -1, :], migraine_weights, migraine_bias
+    )
+    return mean
+
+
+def risk_input_gradients(
+    model,
+    x: torch.Tensor,
+    migraine_weights: torch.Tensor,
+    migraine_bias: float,
+    method: str = 'backward'
+) -> Tuple[torch.Tensor, torch.Tensor]:
+    """
+    Per-sample gradients of SimpleALINE's daily risk w.r.t. its input window.
+
+    SimpleALINE encodes each window independently, so the Jacobian of the
+    per-sample risks is block-diagonal and one backward of their sum yields
+    every per-sample gradient exactly ('backward'). 'vmap' computes the same
+    with torch.func.vmap(grad(...)); it is kept for models that mix samples
+    but is much slower for the transformer on CPU.
+
+    Args:
+        model: SimpleALINE model
+        x: Input features [B, T, F]
+        migraine_weights: Weights for migraine prediction [z_dim]
+        migraine_bias: Bias for migraine prediction
+        method: 'backward' or 'vmap'
+
+    Returns:
+        gradients: ∂p_b/∂x_b [B, T, F]
+        risk: Daily risk of each window [B]
+    """
+    if method == 'backward':
+        x_grad = x.detach().clone().requires_grad_(True)
+        with torch.enable_grad():
+            risk = simple_aline_risk(model, x_grad, migraine_weights, migraine_bias)
+            gradients = torch.autograd.grad(risk.sum(), x_grad)[0]  # [B, T, F]
+        return gradients, risk.detach()
+
+    if method == 'vmap':
+        from torch.func import functional_call, grad, vmap
+
+        params = {name: p.detach() for name, p in model.named_parameters()}
+        buffers = dict(model.named_buffers())
+
+        def single_risk(window):
+            posterior, _ = functional_call(model, (params, buffers), (window.unsqueeze(0),))
+            return analytic_risk(
+                posterior.mean[0, -1], posterior.stddev[0, -1], migraine_weights, migraine_bias
+            )[0]
+
+        gradients = vmap(grad(single_risk))(x.detach())
+        with torch.no_grad():
+            risk = simple_aline_risk(model, x, migraine_weights, migraine_bias)
+        return gradients, risk
+
+    raise ValueError(f"Unknown method '{method}' (expected 'backward' or 'vmap')")
+
+
+def feature_information_gain(
+    model,
+    x: torch.Tensor,
+    migraine_weights: torch.Tensor,
+    migraine_bias: float,
+    feature_availability: Optional[torch.Tensor] = None,
+    method: str = 'backward'
+) -> Tuple[torch.Tensor, torch.Tensor]:
+    """
+    Feature-level information gain for SimpleALINE, for a whole batch at once.
+
+    Information gain = |∂p_b/∂x_b| × p_b(1 - p_b) × (1 - availability), where
+    p_b is window b's daily risk and the gradient is taken per sample
+    (see risk_input_gradients).
+
+    Args:
+        model: SimpleALINE model
+        x: Input features [B, T, F]
+        migraine_weights: Weights for migraine prediction [z_dim]
+        migraine_bias: Bias for migraine prediction
+        feature_availability: Binary mask [B, T, F] (1=available, 0=missing);
+            default: everything missing, i.e. rank by sensitivity alone
+        method: 'backward' or 'vmap'
+
+    Returns:
+        feature_gains: Information gain scores [B, T, F]
+        risk: Daily risk of each window [B]
+    """
+    gradients, risk = risk_input_gradients(model, x, migraine_weights, migraine_bias, method)
+    uncertainty = (risk * (1 - risk))[:, None, None]  # [B, 1, 1]
+    missing = 1 - feature_availability if feature_availability is not None else 1.0
+    return gradients.abs() * uncertainty * missing, risk
+
+
+def rank_feature_queries(
+    feature_gains: torch.Tensor,
+    k_temporal: int = 3,
+    k_features: int = 5,
+    features_per_hour: int = 3
+) -> Dict[str, torch.Tensor]:
+    """
+    Top hours and features to query, for the whole batch with topk/gather.
+
+    Args:
+        feature_gains: Information gain scores [B, T, F]
+        k_temporal: Number of top hours
+        k_features: Number of top features
+        features_per_hour: Features listed per top hour
+
+    Returns:
+        Dict of tensors:
+            hours [B, kT], hour_scores [B, kT] (max gain over features),
+            hour_features [B, kT, kH] (best features at each top hour),
+            features [B, kF], feature_scores [B, kF] (max gain over hours),
+            best_hours [B, kF] (hour of that max)
+    """
+    B, T, F = feature_gains.shape
+
+    # Temporal queries: max across features per hour
+    hour_scores, hour_best = feature_gains.max(dim=-1)  # [B, T]
+    top_hours = hour_scores.topk(min(k_temporal, T), dim=1)
+    gains_at_hours = feature_gains.gather(
+        1, top_hours.indices.unsqueeze(-1).expand(-1, -1, F)
+    )  # [B, kT, F]
+    hour_features = gains_at_hours.topk(min(features_per_hour, F), dim=-1).indices
+
+    # Feature queries: max across hours per feature
+    feature_scores, best_hours = feature_gains.max(dim=1)  # [B, F]
+    top_features = feature_scores.topk(min(k_features, F), dim=1)
+
+    return {
+        'hours': top_hours.indices,
+        'hour_scores': top_hours.values,
+        'hour_features': hour_features,
+        'features': top_features.indices,
+        'feature_scores': top_features.values,
+        'best_hours': best_hours.gather(1, top_features.indices)
+    }
+
+
+def format_feature_queries(ranked: Dict[str, torch.Tensor], feature_names: List[str]) -> List[Dict]:
+    """
+    Ranked queries as one dict per batch element (the get_priority_queries format),
+    converting each tensor to Python once.
+    """
+    ranked = {key: value.tolist() for key, value in ranked.items()}
+    return [
+        {
+            "temporal_queries": [
+                {"hour": hour, "score": float(score), "features": [feature_names[f] for f in features]}
+                for hour, score, features in zip(
+                    ranked['hours'][b], ranked['hour_scores'][b], ranked['hour_features'][b]
+                )
+            ],
+            "feature_queries": [
+                {"feature": feature_names[f], "score": float(score), "best_hour": hour}
+                for f, score, hour in zip(
+                    ranked['features'][b], ranked['feature_scores'][b], ranked['best_hours'][b]
+                )
+            ]
+        }
+        for b in range(len(ranked['hours']))
+    ]
+
+
+# ============================================================================
+# NON-MYOPIC MEASUREMENT PLANNING ACROSS DAYS
+# ============================================================================
+
+def measurement_coverage(
+    num_days: int,
+    seq_len: int = 24,
+    correlation_hours: float = 3.0,
+    day_correlation: float = 0.3,
+    device: Optional[torch.device] = None
+) -> torch.Tensor:
+    """
+    Fraction of each cell's input uncertainty that one measurement resolves.
+
+    Hourly features are autocorrelated, so measuring hour s also partly
+    reveals hour c: by corr(s, c)² for a Gaussian. Two correlations are
+    combined (max): time proximity exp(-|t_s - t_c| / correlation_hours),
+    which crosses midnight into the next day, and daily routine,
+    day_correlation^|Δday| between the same hour of different days.
+
+    Args:
+        num_days: Days in the horizon (D)
+        seq_len: Hours per day (T)
+        correlation_hours: Decay length of the time-proximity correlation
+        day_correlation: Correlation of the same hour on consecutive days
+
+    Returns:
+        coverage [D*T, D*T] in [0, 1] with a unit diagonal; row s is the
+        measured cell, column c the covered cell (cell index = day * T + hour)
+    """
+    t = torch.arange(num_days * seq_len, dtype=torch.float32, device=device)
+    proximity = torch.exp(-(t[:, None] - t[None, :]).abs() / correlation_hours)
+
+    day, hour = t // seq_len, t % seq_len
+    routine = torch.where(
+        hour[:, None] == hour[None, :],
+        day_correlation ** (day[:, None] - day[None, :]).abs(),
+        torch.zeros((), device=device)
+    )
+    return torch.maximum(proximity, routine) ** 2
+
+
+def plan_measurements(
+    uncertainty: torch.Tensor,
+    coverage: torch.Tensor,
+    budget: int,
+    candidate_mask: Optional[torch.Tensor] = None,
+    max_per_day: Optional[int] = None,
+    eval_batch: int = 16
+) -> Dict:
+    """
+    Greedily choose up to `budget` cells maximizing expected uncertainty reduction.
+
+    f(S) = Σ_c u_c · (1 - Π_{s∈S} (1 - coverage[s, c]))
+
+    is a weighted probabilistic coverage, hence monotone submodular, so
+    greedy selection is within (1 - 1/e) of the optimal schedule and a
+    candidate's last computed marginal gain is an upper bound on its
+    current one. Lazy greedy exploits this: only the candidates with the
+    largest stale bounds are re-evaluated (`eval_batch` at a time, as one
+    matrix-vector product), and a candidate is selected once its fresh gain
+    beats every remaining bound.
+
+    Args:
+        uncertainty: Reducible risk variance of each cell [D, T]
+        coverage: measurement_coverage(D, T) [D*T, D*T]
+        budget: Total number of measurements across the horizon
+        candidate_mask: Cells that may be measured [D, T] (default: all)
+        max_per_day: Cap on measurements per day
+        eval_batch: Stale candidates re-evaluated per step
+
+    Returns:
+        Dict with:
+            days, hours [k]: selected cells in selection order
+            gains [k]: marginal uncertainty reduction of each selection
+            objective: f(S), total expected uncertainty reduction
+            total_uncertainty: Σ_c u_c
+            evaluations: marginal gains computed (lazy) vs D*T*k (plain greedy)
+    """
+    D, T = uncertainty.shape
+    u = uncertainty.flatten()
+    if candidate_mask is None:
+        candidate_mask = torch.ones(D, T, dtype=torch.bool, device=u.device)
+    candidates = candidate_mask.flatten().nonzero().squeeze(-1)  # [N]
+    cover = coverage[candidates]  # [N, D*T]
+    candidate_days = candidates // T
+
+    residual = torch.ones_like(u)  # Π (1 - coverage) over the selection
+    bounds = cover @ u  # exact initial marginal gains
+    fresh = torch.ones_like(bounds, dtype=torch.bool)
+    available = torch.ones_like(bounds, dtype=torch.bool)
+    per_day = torch.zeros(D, dtype=torch.long, device=u.device)
+    evaluations = len(candidates)
+
+    selected, gains = [], []
+    while len(selected) < budget and available.any():
+        masked = bounds.masked_fill(~available, float('-inf'))
+        best = int(masked.argmax())
+
+        if not fresh[best]:
+            # Re-evaluate the largest stale bounds in one batch
+            stale = masked.masked_fill(fresh, float('-inf'))
+            n_stale = int((stale > float('-inf')).sum())
+            idx = stale.topk(min(eval_batch, n_stale)).indices
+            bounds[idx] = cover[idx] @ (u * residual)
+            fresh[idx] = True
+            evaluations += len(idx)
+            continue
+
+        if bounds[best] <= 0:
+            break
+        selected.append(best)
+        gains.append(float(bounds[best]))
+        residual = residual * (1 - cover[best])
+        available[best] = False
+        fresh[:] = False
+
+        day = candidate_days[best]
+        per_day[day] += 1
+        if max_per_day is not None and per_day[day] >= max_per_day:
+            available &= candidate_days != day
+
+    cells = candidates[torch.tensor(selected, dtype=torch.long, device=u.device)]
+    return {
+        'days': cells // T,
+        'hours': cells % T,
+        'gains': torch.tensor(gains),
+        'objective': float((u * (1 - residual)).sum()),
+        'total_uncertainty': float(u.sum()),
+        'evaluations': evaluations
+    }
+
+
+def plan_measurement_schedule(
+    model,
+    x: torch.Tensor,
+    migraine_weights: torch.Tensor,
+    migraine_bias: float,
+    budget: int,
+    feature_availability: Optional[torch.Tensor] = None,
+    candidate_hours: Optional[List[int]] = None,
+    max_per_day: Optional[int] = None,
+    feature_variance: float = 1.0 / 3.0,
+    correlation_hours: float = 3.0,
+    day_correlation: float = 0.3,
+    batch_size: int = 64,
+    eval_batch: int = 16
+) -> Dict:
+    """
+    Non-myopic measurement schedule for a multi-day horizon under a total budget.
+
+    Unlike select_topk_hours, which takes each day's k best hours on its own,
+    the budget is spread over the horizon: a measurement also resolves part
+    of the uncertainty of correlated hours, including the next day's, so
+    hours the schedule already covers lose value (plan_measurements).
+
+    A cell's reducible uncertainty is the delta-method variance of its day's
+    risk due to its unmeasured features,
+        u_{d,h} = feature_variance × Σ_f (∂p_d/∂x_{d,h,f})² × (1 - availability),
+    from one batched forward and backward per `batch_size` days
+    (risk_input_gradients); the greedy selection needs no further forwards.
+
+    Args:
+        model: SimpleALINE model
+        x: Expected feature windows of the horizon's days [D, T, F] (e.g. the
+            same weekday of last week, with what is already known filled in)
+        migraine_weights: Weights for migraine prediction [z_dim]
+        migraine_bias: Bias for migraine prediction
+        budget: Total number of measurements (prompts) across the horizon
+        feature_availability: Binary mask [D, T, F] (1=available, 0=missing)
+        candidate_hours: Hours of the day that may be prompted (default: all)
+        max_per_day: Cap on prompts per day
+        feature_variance: Prior variance of an unmeasured normalized feature
+            (1/3 for values uniform on [-1, 1])
+        correlation_hours: See measurement_coverage
+        day_correlation: See measurement_coverage
+        batch_size: Days per forward
+        eval_batch: See plan_measurements
+
+    Returns:
+        plan_measurements() dict, plus 'risk' [D] and 'uncertainty' [D, T]
+    """
+    D, T, _ = x.shape
+    gradients, risk = zip(*(
+        risk_input_gradients(model, batch, migraine_weights, migraine_bias)
+        for batch in x.split(batch_size)
+    ))
+    variance = torch.cat(gradients).pow(2) * feature_variance  # [D, T, F]
+    if feature_availability is not None:
+        variance = variance * (1 - feature_availability)
+    uncertainty = variance.sum(dim=-1)  # [D, T]
+
+    candidate_mask = None
+    if candidate_hours is not None:
+        candidate_mask = torch.zeros(D, T, dtype=torch.bool, device=x.device)
+        candidate_mask[:, candidate_hours] = True
+
+    plan = plan_measurements(
+        uncertainty,
+        measurement_coverage(D, T, correlation_hours, day_correlation, device=x.device),
+        budget,
+        candidate_mask=candidate_mask,
+        max_per_day=max_per_day,
+        eval_batch=eval_batch
+    )
+    plan['risk'] = torch.cat(risk)
+    plan['uncertainty'] = uncertainty
+    return plan
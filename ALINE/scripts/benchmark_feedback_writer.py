@@ -0,0 +1,82 @@
+"""
+Feedback Ingestion Benchmark - Ticket 026
+
+Compares per-request commits (`Database.add_feedback`) with the group-commit
+`FeedbackBatchWriter` at 1, 10 and 100 concurrent writers.
+
+Usage:
+    uv run python scripts/benchmark_feedback_writer.py [--rows 2000]
+
+Author: ALINE Team
+Date: 2025-11-16
+"""
+
+import sys
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import argparse
+import asyncio
+import tempfile
+import time
+
+from service.database import Database
+from service.feedback_writer import FeedbackBatchWriter
+
+
+async def run_writers(submit, concurrency: int, rows: int) -> float:
+    """Run `rows` submissions spread over `concurrency` writers; return seconds"""
+    per_writer = rows // concurrency
+
+    async def writer(worker_id: int):
+        for i in range(per_writer):
+            await submit(f'user{worker_id}', f'day{i:06d}', i % 3 == 0)
+
+    start = time.perf_counter()
+    await asyncio.gather(*[writer(w) for w in range(concurrency)])
+    return time.perf_counter() - start
+
+
+async def benchmark(concurrency: int, rows: int):
+    """Benchmark both write paths for one concurrency level"""
+    with tempfile.TemporaryDirectory() as tmp:
+        database = Database(str(Path(tmp) / 'direct.db'))
+
+        async def direct(user_id, date, had_migraine):
+            return await asyncio.to_thread(database.add_feedback, user_id, date, had_migraine)
+
+        direct_time = await run_writers(direct, concurrency, rows)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database = Database(str(Path(tmp) / 'batched.db'))
+        writer = FeedbackBatchWriter(database)
+        batched_time = await run_writers(writer.submit, concurrency, rows)
+        await writer.close()
+        batches = writer.batches_committed
+
+    total = (rows // concurrency) * concurrency
+    print(f"{concurrency:>4} writers | "
+          f"direct {total / direct_time:>9.0f} rows/s | "
+          f"batched {total / batched_time:>9.0f} rows/s "
+          f"({batches} commits, {total / max(batches, 1):.1f} rows/commit) | "
+          f"speedup {direct_time / batched_time:.1f}x")
+
+
+def main():
+    """Run the benchmark at 1/10/100 concurrent writers."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=2000, help='Rows written per concurrency level')
+    args = parser.parse_args()
+
+    print("\n" + "="*60)
+    print("Feedback Ingestion Benchmark - Ticket 026")
+    print("="*60 + "\n")
+
+    for concurrency in (1, 10, 100):
+        asyncio.run(benchmark(concurrency, args.rows))
+
+    print()
+
+
+if __name__ == '__main__':
+    main()
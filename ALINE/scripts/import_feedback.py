@@ -0,0 +1,85 @@
+"""
+Bulk Feedback Import CLI
+
+Imports historical migraine diaries from a CSV file into the feedback table.
+
+Expected columns (header row required):
+    user_id, date, had_migraine[, severity, predicted_risk, notes]
+
+Usage:
+    uv run python scripts/import_feedback.py diaries.csv [--db data/aline.db] [--chunk-size 5000]
+
+Author: ALINE Team
+Date: 2025-11-16
+"""
+
+import sys
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import argparse
+import csv
+import time
+
+from tqdm import tqdm
+
+from service.database import Database
+from service.feedback_import import FeedbackImporter
+
+
+def import_csv(csv_path: Path, database: Database, chunk_size: int) -> dict:
+    """Import a CSV file, printing per-row errors; return the summary event"""
+    importer = FeedbackImporter(database, chunk_size=chunk_size)
+
+    def report(events):
+        for event in events:
+            if event['type'] == 'error':
+                tqdm.write(f"  Row {event['row']}: {event['error']}")
+
+    with open(csv_path, newline='', encoding='utf-8') as f:
+        reader = csv.DictReader(f)
+        with tqdm(desc="Importing", unit=" rows") as progress:
+            # Row numbers match the file's line numbers (header is line 1)
+            for row_number, raw in enumerate(reader, start=2):
+                report(importer.add(raw, row_number))
+                progress.update(1)
+
+                if importer.full:
+                    report(importer.flush())
+                    progress.set_postfix(imported=importer.imported, failed=importer.failed)
+
+            report(importer.flush())
+            progress.set_postfix(imported=importer.imported, failed=importer.failed)
+
+    return importer.summary()
+
+
+def main():
+    """Run the CSV import."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('csv_path', type=Path, help='CSV file to import')
+    parser.add_argument('--db', default=None, help='SQLite database path (default: data/aline.db)')
+    parser.add_argument('--chunk-size', type=int, default=FeedbackImporter.DEFAULT_CHUNK_SIZE,
+                        help='Rows per transaction')
+    args = parser.parse_args()
+
+    if not args.csv_path.exists():
+        print(f"❌ File not found: {args.csv_path}")
+        sys.exit(1)
+
+    database = Database(args.db)
+
+    start = time.perf_counter()
+    summary = import_csv(args.csv_path, database, args.chunk_size)
+    elapsed = time.perf_counter() - start
+
+    print(f"\n✓ Imported {summary['imported']:,} rows "
+          f"({summary['failed']:,} failed) in {elapsed:.1f}s "
+          f"({summary['processed'] / max(elapsed, 1e-9):,.0f} rows/s)")
+
+    if summary['failed']:
+        sys.exit(2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""
+Bulk Calendar Context Regeneration CLI
+
+Regenerates and stores tomorrow's (or a given day's) calendar context for
+every calendar-connected user. Interrupted runs resume from the last
+completed page; users that already have a context for the day are skipped.
+
+Usage:
+    uv run python scripts/regenerate_contexts.py [--date 2025-11-18] [--timezone Europe/Berlin]
+        [--db data/aline.db] [--priors priors.json] [--concurrency 32] [--restart]
+
+Author: ALINE Team
+Date: 2025-11-17
+"""
+
+import sys
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import argparse
+import asyncio
+import json
+from datetime import date, datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+from tqdm import tqdm
+
+from service.calendar import CalendarService
+from service.context_batch import ContextBatchRunner
+from service.database import Database
+
+
+async def regenerate(args: argparse.Namespace) -> dict:
+    """Run the batch with a progress bar; return the summary."""
+    tz = ZoneInfo(args.timezone) if args.timezone else timezone.utc
+    day = date.fromisoformat(args.date) if args.date else datetime.now(tz).date() + timedelta(days=1)
+    priors = json.loads(args.priors.read_text()) if args.priors else None
+
+    calendar = CalendarService()
+    with tqdm(desc=f"Contexts for {day}", unit=" users") as progress:
+        def on_page(summary):
+            progress.update(summary['processed'] + summary['skipped'] - progress.n)
+            progress.set_postfix(ok=summary['succeeded'], failed=summary['failed'],
+                                 rate=f"{summary['users_per_s']:.1f}/s")
+
+        runner = ContextBatchRunner(
+            Database(args.db),
+            calendar,
+            day,
+            tz=tz,
+            priors=priors,
+            page_size=args.page_size,
+            concurrency=args.concurrency,
+            host_concurrency=args.host_concurrency,
+            host_rate=args.host_rate,
+            skip_existing=not args.overwrite,
+            on_page=on_page
+        )
+        try:
+            summary = await runner.run(restart=args.restart)
+        finally:
+            await calendar.close()
+
+    for user_id, error in runner.errors[:20]:
+        print(f"  {user_id}: {error}")
+    return summary
+
+
+def main():
+    """Run the bulk regeneration."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--date', default=None, help='Day to generate, YYYY-MM-DD (default: tomorrow)')
+    parser.add_argument('--timezone', default=None, help='IANA time zone of the hourly windows (default: UTC)')
+    parser.add_argument('--db', default=None, help='SQLite database path (default: data/aline.db)')
+    parser.add_argument('--priors', type=Path, default=None, help='JSON file of Beta priors {feature: {a, b}}')
+    parser.add_argument('--page-size', type=int, default=None, help='Connections per page')
+    parser.add_argument('--concurrency', type=int, default=None, help='Feeds processed at once')
+    parser.add_argument('--host-concurrency', type=int, default=None, help='Feeds fetched at once per host')
+    parser.add_argument('--host-rate', type=float, default=None, help='Fetches per second per host')
+    parser.add_argument('--overwrite', action='store_true', help='Regenerate users that already have a context')
+    parser.add_argument('--restart', action='store_true', help='Ignore the saved checkpoint')
+    args = parser.parse_args()
+
+    summary = asyncio.run(regenerate(args))
+
+    print(f"\n✓ {summary['succeeded']:,} contexts for {summary['date']} "
+          f"({summary['failed']:,} failed, {summary['skipped']:,} already present) "
+          f"in {summary['elapsed_s']:.1f}s ({summary['users_per_s']:,.1f} users/s, "
+          f"{summary['hosts']} hosts)")
+
+    if summary['failed']:
+        sys.exit(2)
+
+
+if __name__ == '__main__':
+    main()
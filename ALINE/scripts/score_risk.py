@@ -0,0 +1,127 @@
+"""
+Nightly Batch Risk Scoring CLI
+
+Scores tomorrow's (or a given day's) migraine risk for every user with
+stored hourly features and writes it, with each user's what-if sensitivity
+surface, to the risk_predictions table. The users are split across
+--shards processes; each process checkpoints after every page, so an
+interrupted run resumes where it stopped.
+
+Usage:
+    uv run python scripts/score_risk.py [--date 2025-11-18] [--shards 4]
+        [--db data/aline.db] [--batch-size 512] [--no-sensitivity] [--restart]
+
+Author: ALINE Team
+Date: 2025-11-17
+"""
+
+import sys
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import argparse
+import multiprocessing as mp
+import os
+import queue
+import time
+from datetime import date, datetime, timedelta, timezone
+
+from tqdm import tqdm
+
+
+def score_shard(args: argparse.Namespace, day: date, shard: int, updates) -> None:
+    """Score one shard in a worker process, reporting each page on `updates`."""
+    import torch
+
+    from service.database import Database
+    from service.risk_batch import RiskBatchScorer, SensitivityGrid, load_scoring_model, load_service_config
+
+    torch.set_num_threads(max(1, (os.cpu_count() or 1) // args.shards))
+    service_config = load_service_config()
+    model, weights, bias = load_scoring_model(service_config)
+    scorer = RiskBatchScorer(
+        Database(args.db),
+        model,
+        weights,
+        bias,
+        day,
+        shard=shard,
+        num_shards=args.shards,
+        page_size=args.page_size,
+        batch_size=args.batch_size,
+        sensitivity=None if args.no_sensitivity else SensitivityGrid.from_config(service_config),
+        on_page=lambda summary: updates.put(('page', summary))
+    )
+    try:
+        updates.put(('done', scorer.run(restart=args.restart)))
+    except Exception as e:
+        updates.put(('error', {'shard': shard, 'error': str(e)}))
+        raise
+
+
+def main():
+    """Run the sharded batch scoring."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--date', default=None, help='Day to score, YYYY-MM-DD (default: tomorrow, UTC)')
+    parser.add_argument('--db', default=None, help='SQLite database path (default: data/aline.db)')
+    parser.add_argument('--shards', type=int, default=os.cpu_count() or 1, help='Worker processes')
+    parser.add_argument('--page-size', type=int, default=None, help='Users per page')
+    parser.add_argument('--batch-size', type=int, default=None, help='Windows per model forward')
+    parser.add_argument('--no-sensitivity', action='store_true',
+                        help='Skip the what-if sensitivity surfaces (configs/service.yaml `sensitivity`)')
+    parser.add_argument('--restart', action='store_true', help='Ignore the saved checkpoints')
+    args = parser.parse_args()
+
+    day = date.fromisoformat(args.date) if args.date else datetime.now(timezone.utc).date() + timedelta(days=1)
+
+    # Spawned (not forked) workers, so each builds its own torch thread pool
+    ctx = mp.get_context('spawn')
+    updates = ctx.Queue()
+    workers = [
+        ctx.Process(target=score_shard, args=(args, day, shard, updates), name=f"score-shard-{shard}")
+        for shard in range(args.shards)
+    ]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+
+    progress = {shard: {'scored': 0, 'skipped': 0} for shard in range(args.shards)}
+    summaries, errors = [], []
+    with tqdm(desc=f"Risk for {day}", unit=" users") as bar:
+        while len(summaries) + len(errors) < len(workers):
+            try:
+                kind, payload = updates.get(timeout=1.0)
+            except queue.Empty:
+                if not any(worker.is_alive() for worker in workers):
+                    break
+                continue
+
+            if kind == 'error':
+                errors.append(payload)
+                continue
+            progress[payload['shard']] = payload
+            if kind == 'done':
+                summaries.append(payload)
+            scored = sum(shard['scored'] for shard in progress.values())
+            bar.update(scored + sum(shard['skipped'] for shard in progress.values()) - bar.n)
+            bar.set_postfix(scored=scored, rate=f"{scored / (time.perf_counter() - start):.0f}/s")
+
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - start
+
+    scored = sum(summary['scored'] for summary in summaries)
+    skipped = sum(summary['skipped'] for summary in summaries)
+    for error in errors:
+        print(f"  shard {error['shard']}: {error['error']}")
+
+    print(f"\n✓ {scored:,} predictions for {day} ({skipped:,} users without a full window) "
+          f"in {elapsed:.1f}s ({scored / elapsed if elapsed > 0 else 0.0:,.1f} users/s, "
+          f"{args.shards} shards)")
+
+    if errors or len(summaries) < len(workers):
+        sys.exit(2)
+
+
+if __name__ == '__main__':
+    main()
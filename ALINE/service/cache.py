@@ -0,0 +1,298 @@
+"""
+In-Process Caches
+
+Small bounded caches shared by the service layers, plus an on-disk tier
+shared by the worker processes on a host.
+
+Author: ALINE Team
+Date: 2025-11-16
+"""
+
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Sentinel returned by `get` on a miss when no default is given
+MISSING = object()
+
+
+class LRUCache:
+    """
+    Thread-safe bounded mapping with least-recently-used eviction.
+
+    Values may be None, so lookups use `get(key, MISSING)` to tell a cached
+    None apart from a miss.
+    """
+
+    def __init__(self, maxsize: int = 1024):
+        """
+        Initialize the cache.
+
+        Args:
+            maxsize: Maximum number of entries before the oldest is evicted
+        """
+        if maxsize < 1:
+            raise ValueError("maxsize must be at least 1")
+
+        self.maxsize = maxsize
+        self._data: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable, default: Any = MISSING) -> Any:
+        """Return the cached value (marking it recently used) or `default`"""
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """Insert or replace a value, evicting the least recently used entry if full"""
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        """Remove an entry"""
+        with self._lock:
+            return self._data.pop(key, default)
+
+    def clear(self) -> None:
+        """Remove all entries"""
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict[str, float]:
+        """Size and hit-rate counters"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0
+            }
+
+    def __contains__(self, key: Hashable) -> bool:
+        with self._lock:
+            return key in self._data
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._data)
+
+
+class TTLCache(LRUCache):
+    """
+    Bounded LRU mapping whose entries expire `ttl` seconds after being stored.
+
+    Expired entries are not returned by `get` but stay in place until they
+    are overwritten or evicted, so `get_entry` can still serve them to
+    callers that accept stale data.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = 1024,
+        ttl: float = 3600.0,
+        clock: Callable[[], float] = time.time
+    ):
+        """
+        Initialize the cache.
+
+        Args:
+            maxsize: Maximum number of entries before the oldest is evicted
+            ttl: Seconds an entry stays fresh
+            clock: Wall-clock source (seconds since the epoch)
+        """
+        super().__init__(maxsize)
+        self.ttl = ttl
+        self.clock = clock
+        self.expired = 0
+
+    def get(self, key: Hashable, default: Any = MISSING) -> Any:
+        """Return the cached value if still fresh (marking it recently used) or `default`"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                stored_at, value = entry
+                if self.clock() - stored_at < self.ttl:
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                self.expired += 1
+            self.misses += 1
+            return default
+
+    def get_entry(self, key: Hashable) -> Optional[Tuple[Any, float]]:
+        """
+        Return `(value, age_seconds)` regardless of freshness, or None.
+
+        Counted like `get`: a fresh entry is a hit, a stale one a miss.
+        """
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            stored_at, value = entry
+            age = self.clock() - stored_at
+            if age < self.ttl:
+                self.hits += 1
+            else:
+                self.expired += 1
+                self.misses += 1
+            return value, age
+
+    def age(self, key: Hashable) -> Optional[float]:
+        """Seconds since `key` was stored, or None; does not affect LRU order or stats"""
+        with self._lock:
+            entry = self._data.get(key)
+            return None if entry is None else self.clock() - entry[0]
+
+    def set(self, key: Hashable, value: Any, stored_at: Optional[float] = None) -> None:
+        """Insert or replace a value stored at `stored_at` (default: now)"""
+        super().set(key, (self.clock() if stored_at is None else stored_at, value))
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        """Remove an entry"""
+        entry = super().pop(key, MISSING)
+        return default if entry is MISSING else entry[1]
+
+    def stats(self) -> Dict[str, float]:
+        """Size, hit-rate and expiry counters"""
+        stats = super().stats()
+        stats['ttl'] = self.ttl
+        stats['expired'] = self.expired
+        return stats
+
+
+class DiskCache:
+    """
+    SQLite-backed key/value tier shared by all worker processes on a host.
+
+    Values are stored as JSON with the time they were produced, so readers
+    apply their own freshness rules. The tier is best-effort: SQLite errors
+    are logged and treated as misses rather than failing the request.
+    """
+
+    def __init__(self, path: str, table: str = "cache_entries"):
+        """
+        Initialize the store, creating the file and table if needed.
+
+        Args:
+            path: SQLite file path
+            table: Table name, so several caches can share one file
+        """
+        self.path = path
+        self.table = table
+
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            # WAL lets readers in other workers proceed during a write
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute(f"""
+                CREATE TABLE IF NOT EXISTS {table} (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    stored_at REAL NOT NULL
+                )
+            """)
+            conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_stored_at ON {table}(stored_at)")
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=5.0)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def get(self, key: str) -> Optional[Tuple[Any, float]]:
+        """Return `(value, stored_at)` or None"""
+        try:
+            with self._connect() as conn:
+                row = conn.execute(
+                    f"SELECT value, stored_at FROM {self.table} WHERE key = ?", (key,)
+                ).fetchone()
+        except sqlite3.Error as e:
+            logger.warning(f"Disk cache read failed for {key}: {e}")
+            row = None
+
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(row[0]), row[1]
+
+    def set(self, key: str, value: Any, stored_at: Optional[float] = None) -> None:
+        """Insert or replace a value produced at `stored_at` (default: now)"""
+        try:
+            with self._connect() as conn:
+                conn.execute(
+                    f"INSERT OR REPLACE INTO {self.table} (key, value, stored_at) VALUES (?, ?, ?)",
+                    (key, json.dumps(value), time.time() if stored_at is None else stored_at)
+                )
+            self.writes += 1
+        except sqlite3.Error as e:
+            logger.warning(f"Disk cache write failed for {key}: {e}")
+
+    def recent(self, limit: int, max_age: float) -> List[Tuple[str, Any, float]]:
+        """Most recently stored `(key, value, stored_at)` entries younger than `max_age`"""
+        try:
+            with self._connect() as conn:
+                rows = conn.execute(
+                    f"SELECT key, value, stored_at FROM {self.table} "
+                    f"WHERE stored_at > ? ORDER BY stored_at DESC LIMIT ?",
+                    (time.time() - max_age, limit)
+                ).fetchall()
+        except sqlite3.Error as e:
+            logger.warning(f"Disk cache scan failed: {e}")
+            return []
+        return [(key, json.loads(value), stored_at) for key, value, stored_at in rows]
+
+    def prune(self, max_age: float) -> int:
+        """Delete entries older than `max_age` seconds; return how many were removed"""
+        try:
+            with self._connect() as conn:
+                return conn.execute(
+                    f"DELETE FROM {self.table} WHERE stored_at <= ?", (time.time() - max_age,)
+                ).rowcount
+        except sqlite3.Error as e:
+            logger.warning(f"Disk cache prune failed: {e}")
+            return 0
+
+    def stats(self) -> Dict[str, float]:
+        """Read/write counters"""
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'writes': self.writes,
+            'hit_rate': self.hits / lookups if lookups else 0.0
+        }
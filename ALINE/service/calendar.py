@@ -1,20 +1,730 @@
 """
 Calendar Service - Ticket 019
 
-Handles ICS/WebCal URL validation, normalization, and n8n integration.
+Handles ICS/WebCal URL validation, normalization, and context generation.
+Context is computed in-process by default: feeds are parsed into per-feed
+event indexes, cached and revalidated with conditional GETs, recurrences
+are expanded only over the requested day, and events are bucketed into
+hourly calendar-load features aligned to the model's 24 hourly windows.
+The n8n workflow remains available as an alternative engine. All outbound
+calls share one pooled, long-lived HTTP client that is closed by the
+FastAPI lifespan.
 
 Author: ALINE Team
 Date: 2025-11-15
 """
 
+import asyncio
+import bisect
+import hashlib
+import os
 import re
 import logging
-from typing import Dict, Optional, Tuple
+from datetime import date, datetime, time, timedelta, timezone, tzinfo
+from typing import Dict, Iterator, List, Optional, Tuple
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 import httpx
 from urllib.parse import urlparse
 
+from service.cache import TTLCache
+from service.resilience import CircuitBreaker, CircuitOpenError, Upstream
+
 logger = logging.getLogger(__name__)
 
+try:
+    import h2  # noqa: F401 - enables HTTP/2 in httpx
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+# ============================================================================
+# Local calendar engine
+# ============================================================================
+
+WEEKDAYS = {'MO': 0, 'TU': 1, 'WE': 2, 'TH': 3, 'FR': 4, 'SA': 5, 'SU': 6}
+
+DURATION_RE = re.compile(
+    r'^([+-])?P(?:(\d+)W)?(?:(\d+)D)?(?:T(?:(\d+)H)?(?:(\d+)M)?(?:(\d+)S)?)?$'
+)
+
+# Widest UTC offset; bounds the wall-clock search window before exact filtering
+MAX_UTC_OFFSET = timedelta(hours=15)
+
+# Recurrence periods examined per event and query (guards malformed rules)
+MAX_RECURRENCE_PERIODS = 5000
+
+
+class CalendarFeedError(Exception):
+    """The calendar feed could not be downloaded or is not a calendar."""
+
+
+def unfold_lines(text: str) -> Iterator[str]:
+    """Yield logical content lines, undoing RFC 5545 line folding."""
+    current = None
+    for raw in text.splitlines():
+        if raw[:1] in (' ', '\t') and current is not None:
+            current += raw[1:]
+            continue
+        if current:
+            yield current
+        current = raw
+    if current:
+        yield current
+
+
+def parse_content_line(line: str) -> Tuple[str, Dict[str, str], str]:
+    """Split `NAME;PARAM=VALUE:value` (quoted parameter values may contain ':')."""
+    in_quotes = False
+    for i, ch in enumerate(line):
+        if ch == '"':
+            in_quotes = not in_quotes
+        elif ch == ':' and not in_quotes:
+            break
+    else:
+        return line.upper(), {}, ''
+
+    name, *params = line[:i].split(';')
+    parsed = {}
+    for param in params:
+        key, _, value = param.partition('=')
+        parsed[key.upper()] = value.strip('"')
+    return name.upper(), parsed, line[i + 1:]
+
+
+def parse_ics_time(value: str, params: Dict[str, str]) -> Tuple[datetime, Optional[str], bool]:
+    """
+    Parse a DATE or DATE-TIME value.
+
+    Returns:
+        Tuple of (naive wall-clock datetime, tzid, all_day). tzid is 'UTC'
+        for Z-suffixed times, the TZID parameter, or None for floating times.
+    """
+    value = value.strip()
+    if params.get('VALUE') == 'DATE' or len(value) == 8:
+        return datetime.strptime(value[:8], '%Y%m%d'), None, True
+    if value.endswith('Z'):
+        return datetime.strptime(value[:15], '%Y%m%dT%H%M%S'), 'UTC', False
+    return datetime.strptime(value[:15], '%Y%m%dT%H%M%S'), params.get('TZID'), False
+
+
+def parse_duration(value: str) -> Optional[timedelta]:
+    """Parse an RFC 5545 DURATION such as PT1H30M or P1D."""
+    match = DURATION_RE.match(value.strip())
+    if not match:
+        return None
+    sign, weeks, days, hours, minutes, seconds = match.groups()
+    duration = timedelta(
+        weeks=int(weeks or 0), days=int(days or 0),
+        hours=int(hours or 0), minutes=int(minutes or 0), seconds=int(seconds or 0)
+    )
+    return -duration if sign == '-' else duration
+
+
+def resolve_zone(tzid: Optional[str], default: tzinfo) -> tzinfo:
+    """Time zone for a TZID; floating times and unknown zones use `default`."""
+    if tzid is None:
+        return default
+    if tzid == 'UTC':
+        return timezone.utc
+    try:
+        return ZoneInfo(tzid)
+    except (ZoneInfoNotFoundError, ValueError):
+        return default
+
+
+def _add_months(year: int, month: int, months: int) -> Tuple[int, int]:
+    index = year * 12 + month - 1 + months
+    return index // 12, index % 12 + 1
+
+
+def _month_days(year: int, month: int) -> int:
+    next_year, next_month = _add_months(year, month, 1)
+    return (date(next_year, next_month, 1) - date(year, month, 1)).days
+
+
+class CalendarEvent:
+    """One VEVENT: a single event, a recurring master, or a RECURRENCE-ID override."""
+
+    __slots__ = (
+        'uid', 'start', 'end', 'tzid', 'all_day', 'busy',
+        'rrule', 'exdates', 'recurrence_id'
+    )
+
+    def __init__(
+        self,
+        uid: str,
+        start: datetime,
+        end: datetime,
+        tzid: Optional[str] = None,
+        all_day: bool = False,
+        busy: bool = True,
+        rrule: Optional[Dict[str, str]] = None,
+        exdates: Optional[List[Tuple[datetime, Optional[str]]]] = None,
+        recurrence_id: Optional[Tuple[datetime, Optional[str]]] = None
+    ):
+        self.uid = uid
+        self.start = start
+        self.end = end
+        self.tzid = tzid
+        self.all_day = all_day
+        self.busy = busy
+        self.rrule = rrule
+        self.exdates = exdates or []
+        self.recurrence_id = recurrence_id
+
+    @property
+    def duration(self) -> timedelta:
+        return self.end - self.start
+
+    def expand(self, lo: datetime, hi: datetime, zone: tzinfo) -> List[datetime]:
+        """
+        Wall-clock starts of the occurrences beginning in [lo, hi).
+
+        Expansion follows the RRULE (FREQ DAILY/WEEKLY/MONTHLY/YEARLY with
+        INTERVAL, COUNT, UNTIL, BYDAY and BYMONTHDAY) but only as far as the
+        window: without COUNT, whole periods before `lo` are skipped
+        arithmetically, and expansion stops at `hi`.
+        """
+        if not self.rrule:
+            return [self.start] if lo <= self.start < hi else []
+
+        rule = self.rrule
+        freq = rule.get('FREQ')
+        if freq not in ('DAILY', 'WEEKLY', 'MONTHLY', 'YEARLY'):
+            return [self.start] if lo <= self.start < hi else []
+
+        interval = max(1, int(rule.get('INTERVAL', '1') or 1))
+        count = int(rule['COUNT']) if rule.get('COUNT') else None
+        until = None
+        if rule.get('UNTIL'):
+            until_value, until_tzid, until_all_day = parse_ics_time(rule['UNTIL'], {})
+            if until_all_day:
+                until = until_value + timedelta(days=1) - timedelta(seconds=1)
+            elif until_tzid == 'UTC':
+                until = until_value.replace(tzinfo=timezone.utc).astimezone(zone).replace(tzinfo=None)
+            else:
+                until = until_value
+
+        byday = []
+        for token in filter(None, rule.get('BYDAY', '').split(',')):
+            ordinal, weekday = token[:-2], WEEKDAYS.get(token[-2:].upper())
+            if weekday is not None:
+                byday.append((int(ordinal) if ordinal not in ('', '+', '-') else None, weekday))
+        bymonthday = [int(d) for d in filter(None, rule.get('BYMONTHDAY', '').split(','))]
+
+        start_date = self.start.date()
+        first = 0
+        if count is None and lo.date() > start_date:
+            # Periods that end before the window cannot contribute; skip them
+            days = (lo.date() - start_date).days
+            months = (lo.year - start_date.year) * 12 + lo.month - start_date.month
+            periods = {
+                'DAILY': days, 'WEEKLY': days // 7,
+                'MONTHLY': months, 'YEARLY': lo.year - start_date.year
+            }[freq]
+            first = max(0, periods // interval - 1)
+
+        occurrences = []
+        emitted = 0
+        for period in range(first, first + MAX_RECURRENCE_PERIODS):
+            offset = period * interval
+            if freq == 'DAILY':
+                day = start_date + timedelta(days=offset)
+                period_start = day
+                candidates = [day] if not byday or day.weekday() in {wd for _, wd in byday} else []
+            elif freq == 'WEEKLY':
+                period_start = start_date - timedelta(days=start_date.weekday()) + timedelta(weeks=offset)
+                weekdays = sorted({wd for _, wd in byday}) or [start_date.weekday()]
+                candidates = [period_start + timedelta(days=wd) for wd in weekdays]
+            elif freq == 'MONTHLY':
+                year, month = _add_months(start_date.year, start_date.month, offset)
+                period_start = date(year, month, 1)
+                candidates = self._month_candidates(year, month, byday, bymonthday, start_date.day)
+            else:
+                year = start_date.year + offset
+                period_start = date(year, 1, 1)
+                candidates = []
+                if start_date.month != 2 or start_date.day != 29 or _month_days(year, 2) == 29:
+                    candidates = [date(year, start_date.month, start_date.day)]
+
+            if period_start > hi.date():
+                break
+            for day in candidates:
+                occurrence = datetime.combine(day, self.start.time())
+                if occurrence < self.start:
+                    continue
+                if until is not None and occurrence > until:
+                    return occurrences
+                emitted += 1
+                if count is not None and emitted > count:
+                    return occurrences
+                if occurrence >= hi:
+                    return occurrences
+                if occurrence >= lo:
+                    occurrences.append(occurrence)
+        return occurrences
+
+    @staticmethod
+    def _month_candidates(
+        year: int,
+        month: int,
+        byday: List[Tuple[Optional[int], int]],
+        bymonthday: List[int],
+        default_day: int
+    ) -> List[date]:
+        days_in_month = _month_days(year, month)
+        if bymonthday:
+            days = [d if d > 0 else days_in_month + d + 1 for d in bymonthday]
+        elif byday:
+            days = []
+            for ordinal, weekday in byday:
+                matching = [
+                    d for d in range(1, days_in_month + 1)
+                    if date(year, month, d).weekday() == weekday
+                ]
+                if ordinal is None:
+                    days.extend(matching)
+                elif -len(matching) <= ordinal <= len(matching) and ordinal != 0:
+                    days.append(matching[ordinal - 1 if ordinal > 0 else ordinal])
+        else:
+            days = [default_day]
+        return [date(year, month, d) for d in sorted(set(days)) if 1 <= d <= days_in_month]
+
+
+def iter_vevent_blocks(text: str) -> Iterator[List[str]]:
+    """Yield the unfolded content lines of each VEVENT (nested components included)."""
+    block: Optional[List[str]] = None
+    depth = 0
+
+    for line in unfold_lines(text):
+        upper = line.strip().upper()
+        if block is None:
+            if upper == 'BEGIN:VEVENT':
+                block = []
+            continue
+        if upper.startswith('BEGIN:'):
+            depth += 1  # nested VALARM etc.
+        elif upper.startswith('END:'):
+            if not depth:
+                yield block
+                block = None
+                continue
+            depth -= 1
+        block.append(line)
+
+
+def parse_vevent(lines: List[str]) -> Optional[CalendarEvent]:
+    """Build an event from one VEVENT block, or None if it is malformed."""
+    props: Dict[str, List[Tuple[Dict[str, str], str]]] = {}
+    depth = 0
+    for line in lines:
+        name, params, value = parse_content_line(line)
+        if name == 'BEGIN':
+            depth += 1
+        elif name == 'END':
+            depth -= 1
+        elif not depth:
+            props.setdefault(name, []).append((params, value))
+
+    try:
+        return _build_event(props)
+    except (KeyError, ValueError) as e:
+        logger.debug(f"Skipping malformed VEVENT: {e}")
+        return None
+
+
+def parse_ics(text: str) -> List[CalendarEvent]:
+    """
+    Parse the VEVENTs of an ICS feed.
+
+    All-day, transparent (free) and cancelled events are kept but marked
+    not busy, so that cancelled overrides still suppress their recurring
+    instance. Malformed events are skipped.
+    """
+    events = []
+    for block in iter_vevent_blocks(text):
+        event = parse_vevent(block)
+        if event is not None:
+            events.append(event)
+    return events
+
+
+def _block_uid(block: List[str]) -> Optional[str]:
+    for line in block:
+        if line[:4].upper() == 'UID:':
+            return line[4:].strip()
+    return None
+
+
+def _build_event(props: Dict[str, List[Tuple[Dict[str, str], str]]]) -> Optional[CalendarEvent]:
+    if 'DTSTART' not in props:
+        return None
+    params, value = props['DTSTART'][0]
+    start, tzid, all_day = parse_ics_time(value, params)
+
+    if 'DTEND' in props:
+        end_params, end_value = props['DTEND'][0]
+        end = parse_ics_time(end_value, end_params)[0]
+    elif 'DURATION' in props:
+        end = start + (parse_duration(props['DURATION'][0][1]) or timedelta())
+    else:
+        end = start + (timedelta(days=1) if all_day else timedelta())
+
+    rrule = None
+    if 'RRULE' in props:
+        rrule = {}
+        for part in props['RRULE'][0][1].split(';'):
+            key, _, part_value = part.partition('=')
+            rrule[key.upper()] = part_value.upper()
+
+    exdates = []
+    for ex_params, ex_value in props.get('EXDATE', []):
+        for item in filter(None, ex_value.split(',')):
+            ex_start, ex_tzid, _ = parse_ics_time(item, ex_params)
+            exdates.append((ex_start, ex_tzid))
+
+    recurrence_id = None
+    if 'RECURRENCE-ID' in props:
+        rid_params, rid_value = props['RECURRENCE-ID'][0]
+        rid_start, rid_tzid, _ = parse_ics_time(rid_value, rid_params)
+        recurrence_id = (rid_start, rid_tzid)
+
+    status = props.get('STATUS', [({}, '')])[0][1].strip().upper()
+    transp = props.get('TRANSP', [({}, '')])[0][1].strip().upper()
+
+    return CalendarEvent(
+        uid=props.get('UID', [({}, '')])[0][1].strip(),
+        start=start,
+        end=max(end, start),
+        tzid=tzid,
+        all_day=all_day,
+        busy=not all_day and status != 'CANCELLED' and transp != 'TRANSPARENT',
+        rrule=rrule,
+        exdates=exdates,
+        recurrence_id=recurrence_id
+    )
+
+
+def _to_utc(wall: datetime, zone: tzinfo) -> datetime:
+    return wall.replace(tzinfo=zone).astimezone(timezone.utc)
+
+
+class EventIndex:
+    """
+    Parsed events of one feed, organised for window queries.
+
+    Single events are kept sorted by wall-clock start so a window is found
+    by bisection; recurring masters are expanded per query over the window
+    only.
+    """
+
+    def __init__(
+        self,
+        events: List[CalendarEvent],
+        components: Optional[Dict[str, Tuple[str, List[CalendarEvent]]]] = None
+    ):
+        """
+        Build the index.
+
+        Args:
+            events: Parsed events
+            components: UID -> (hash of its VEVENT blocks, parsed events), kept
+                so the next version of the feed only re-parses changed UIDs
+        """
+        self.size = len(events)
+        self.components = components or {}
+        self.reparsed = len(self.components)
+        self.reused = 0
+
+        overrides = [e for e in events if e.recurrence_id is not None]
+        self.recurring = [e for e in events if e.rrule and e.recurrence_id is None]
+
+        self.single = sorted(
+            (e for e in events if e.busy and (e.recurrence_id is not None or not e.rrule)),
+            key=lambda e: e.start
+        )
+        self._starts = [e.start for e in self.single]
+        self.max_duration = max((e.duration for e in self.single), default=timedelta())
+
+        self.overrides: Dict[str, List[CalendarEvent]] = {}
+        for event in overrides:
+            self.overrides.setdefault(event.uid, []).append(event)
+
+    @classmethod
+    def from_ics(cls, text: str, previous: Optional['EventIndex'] = None) -> 'EventIndex':
+        """
+        Index a feed, re-parsing only the UIDs whose VEVENTs changed since `previous`.
+
+        A UID's master and its RECURRENCE-ID overrides are hashed together,
+        so editing one instance re-parses that series only.
+        """
+        blocks: Dict[str, List[List[str]]] = {}
+        for block in iter_vevent_blocks(text):
+            uid = _block_uid(block)
+            if uid is None:
+                # No UID: key by content so identical blocks still match across versions
+                uid = '#' + hashlib.sha1('\n'.join(block).encode()).hexdigest()
+            blocks.setdefault(uid, []).append(block)
+
+        known = previous.components if previous is not None else {}
+        components = {}
+        events = []
+        reused = 0
+        for uid, uid_blocks in blocks.items():
+            digest = hashlib.sha1('\n'.join('\n'.join(b) for b in uid_blocks).encode()).hexdigest()
+            cached = known.get(uid)
+            if cached is not None and cached[0] == digest:
+                parsed = cached[1]
+                reused += 1
+            else:
+                parsed = [e for e in map(parse_vevent, uid_blocks) if e is not None]
+            components[uid] = (digest, parsed)
+            events.extend(parsed)
+
+        index = cls(events, components)
+        index.reused = reused
+        index.reparsed = len(components) - reused
+        return index
+
+    def __len__(self) -> int:
+        return self.size
+
+    def occurrences(
+        self,
+        window_start: datetime,
+        window_end: datetime,
+        default_tz: tzinfo
+    ) -> List[Tuple[datetime, datetime]]:
+        """
+        Busy intervals overlapping [window_start, window_end).
+
+        Args:
+            window_start: Aware start of the window
+            window_end: Aware end of the window
+            default_tz: Zone for floating times and unknown TZIDs
+
+        Returns:
+            Sorted list of (start, end) in UTC
+        """
+        window_start = window_start.astimezone(timezone.utc)
+        window_end = window_end.astimezone(timezone.utc)
+        result = []
+
+        def add(start_utc: datetime, duration: timedelta):
+            end_utc = start_utc + duration
+            if start_utc < window_end and end_utc > window_start:
+                result.append((start_utc, end_utc))
+
+        # Wall-clock bounds wide enough for any zone, filtered exactly in add()
+        lo = window_start.replace(tzinfo=None) - MAX_UTC_OFFSET
+        hi = window_end.replace(tzinfo=None) + MAX_UTC_OFFSET
+
+        first = bisect.bisect_left(self._starts, lo - self.max_duration)
+        last = bisect.bisect_left(self._starts, hi)
+        for event in self.single[first:last]:
+            add(_to_utc(event.start, resolve_zone(event.tzid, default_tz)), event.duration)
+
+        for event in self.recurring:
+            if not event.busy:
+                continue
+            zone = resolve_zone(event.tzid, default_tz)
+            excluded = {
+                _to_utc(ex_start, resolve_zone(ex_tzid or event.tzid, default_tz))
+                for ex_start, ex_tzid in event.exdates
+            }
+            excluded.update(
+                _to_utc(rid_start, resolve_zone(rid_tzid or event.tzid, default_tz))
+                for rid_start, rid_tzid in (o.recurrence_id for o in self.overrides.get(event.uid, []))
+            )
+            for occurrence in event.expand(lo - event.duration, hi, zone):
+                start_utc = _to_utc(occurrence, zone)
+                if start_utc not in excluded:
+                    add(start_utc, event.duration)
+
+        result.sort()
+        return result
+
+
+def hourly_load(
+    occurrences: List[Tuple[datetime, datetime]],
+    day: date,
+    tz: tzinfo,
+    workday: Tuple[int, int] = (9, 18),
+    back_to_back_gap: timedelta = timedelta(minutes=5)
+) -> Dict:
+    """
+    Bucket busy intervals into the 24 local hours of `day`.
+
+    Hourly features:
+        meeting_count: events overlapping the hour
+        busy_fraction: share of the hour covered by at least one event
+        back_to_back: transitions in the hour where an event starts within
+            `back_to_back_gap` of the previous one ending (or overlaps it)
+        after_hours: busy fraction outside `workday` hours (all day on weekends)
+
+    Returns:
+        Dict with 'date', 'hourly' (feature -> 24 values) and 'summary' totals
+    """
+    bounds = [
+        datetime.combine(day, time(hour), tz).astimezone(timezone.utc) for hour in range(24)
+    ]
+    bounds.append(datetime.combine(day + timedelta(days=1), time(0), tz).astimezone(timezone.utc))
+
+    meeting_count = [0] * 24
+    busy_seconds = [0.0] * 24
+    back_to_back = [0] * 24
+
+    def hours_overlapping(start: datetime, end: datetime) -> range:
+        first = max(bisect.bisect_right(bounds, start) - 1, 0)
+        last = min(bisect.bisect_left(bounds, end), 24)
+        return range(first, last)
+
+    for start, end in occurrences:
+        for hour in hours_overlapping(start, end):
+            if start < bounds[hour + 1] and end > bounds[hour]:
+                meeting_count[hour] += 1
+
+    # Union of busy time, so double-booked slots are not counted twice
+    merged: List[List[datetime]] = []
+    latest_end = None
+    for start, end in occurrences:
+        if latest_end is not None and start <= latest_end + back_to_back_gap:
+            hour = bisect.bisect_right(bounds, start) - 1
+            if 0 <= hour < 24:
+                back_to_back[hour] += 1
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+        latest_end = end if latest_end is None else max(latest_end, end)
+
+    for start, end in merged:
+        for hour in hours_overlapping(start, end):
+            overlap = min(end, bounds[hour + 1]) - max(start, bounds[hour])
+            busy_seconds[hour] += max(overlap.total_seconds(), 0.0)
+
+    busy_fraction = [
+        round(min(seconds / max((bounds[h + 1] - bounds[h]).total_seconds(), 1.0), 1.0), 4)
+        for h, seconds in enumerate(busy_seconds)
+    ]
+    weekend = day.weekday() >= 5
+    after_hours = [
+        fraction if weekend or not workday[0] <= hour < workday[1] else 0.0
+        for hour, fraction in enumerate(busy_fraction)
+    ]
+
+    day_start, day_end = bounds[0], bounds[-1]
+    return {
+        'date': day.isoformat(),
+        'hourly': {
+            'meeting_count': meeting_count,
+            'busy_fraction': busy_fraction,
+            'back_to_back': back_to_back,
+            'after_hours': after_hours
+        },
+        'summary': {
+            'meetings': sum(1 for start, end in occurrences if start < day_end and end > day_start),
+            'busy_hours': round(sum(busy_fraction), 2),
+            'back_to_back': sum(back_to_back),
+            'after_hours': round(sum(after_hours), 2)
+        }
+    }
+
+
+# Context features informed by calendar load: name keyword -> (signal, direction)
+CONTEXT_SIGNALS = [
+    ('stress', 'strain', 1),
+    ('anxiety', 'strain', 1),
+    ('work', 'meeting_load', 1),
+    ('screen', 'meeting_load', 1),
+    ('sleep', 'after_hours', -1),
+]
+
+
+def calendar_signals(summary: Dict) -> Dict[str, float]:
+    """Map a day's load summary to [0, 1] signals."""
+    meeting_load = min(summary['busy_hours'] / 8.0, 1.0)
+    back_to_back = min(summary['back_to_back'] / 4.0, 1.0)
+    return {
+        'meeting_load': meeting_load,
+        'strain': 0.5 * meeting_load + 0.5 * back_to_back,
+        'after_hours': min(summary['after_hours'] / 2.0, 1.0)
+    }
+
+
+def update_priors(
+    priors: Dict[str, Dict[str, float]],
+    summary: Dict,
+    weight: float
+) -> Tuple[Dict[str, Dict[str, float]], List[Dict]]:
+    """
+    Beta-update context priors with a day of calendar evidence.
+
+    A feature whose name matches CONTEXT_SIGNALS receives `weight`
+    pseudo-observations split by its signal (inverted for features that
+    calendar load lowers, such as sleep quality). Other features keep their
+    prior. Output matches the n8n workflow's contract.
+
+    Returns:
+        Tuple of (posteriors, features)
+    """
+    signals = calendar_signals(summary)
+    posteriors = {}
+    features = []
+
+    for name, prior in priors.items():
+        try:
+            a, b = float(prior['a']), float(prior['b'])
+        except (KeyError, TypeError, ValueError):
+            posteriors[name] = prior
+            continue
+
+        key = name.lower()
+        match = next(((signal, d) for word, signal, d in CONTEXT_SIGNALS if word in key), None)
+        if match is None:
+            posterior = {'a': a, 'b': b}
+            reasoning = "Not informed by calendar"
+        else:
+            signal, direction = match
+            value = signals[signal] if direction > 0 else 1.0 - signals[signal]
+            posterior = {'a': round(a + weight * value, 4), 'b': round(b + weight * (1.0 - value), 4)}
+            reasoning = (
+                f"{summary['meetings']} meetings, {summary['busy_hours']}h busy, "
+                f"{summary['back_to_back']} back-to-back, {summary['after_hours']}h after hours"
+            )
+
+        posteriors[name] = posterior
+        features.append({
+            'feature': name,
+            'prior': {'a': a, 'b': b},
+            'posterior': posterior,
+            'meanPrior': round(a / (a + b), 4) if a + b else 0.0,
+            'meanPosterior': round(posterior['a'] / (posterior['a'] + posterior['b']), 4)
+            if posterior['a'] + posterior['b'] else 0.0,
+            'reasoning': reasoning
+        })
+
+    return posteriors, features
+
+
+class FeedState:
+    """Parsed index of one feed plus the validators used to revalidate it."""
+
+    __slots__ = ('index', 'etag', 'last_modified', 'content_hash')
+
+    def __init__(
+        self,
+        index: EventIndex,
+        etag: Optional[str] = None,
+        last_modified: Optional[str] = None,
+        content_hash: Optional[str] = None
+    ):
+        self.index = index
+        self.etag = etag
+        self.last_modified = last_modified
+        self.content_hash = content_hash
+
 
 class CalendarService:
     """Service for calendar integration operations"""
@@ -22,6 +732,44 @@ class CalendarService:
     # Timeout for ICS feed validation (seconds)
     VALIDATION_TIMEOUT = 2.0
     
+    # Most bytes read from a feed while looking for ICS markers
+    VERIFY_MAX_BYTES = int(os.getenv("CALENDAR_VERIFY_MAX_BYTES", "8192"))
+    
+    # Total seconds for an n8n context call, retries included (was a flat 30s timeout)
+    CONTEXT_LATENCY_BUDGET = float(os.getenv("N8N_LATENCY_BUDGET_S", "15"))
+    
+    # Consecutive n8n failures before failing fast, and how long to fail fast
+    N8N_BREAKER_FAILURES = int(os.getenv("N8N_BREAKER_FAILURES", "3"))
+    N8N_BREAKER_RESET = float(os.getenv("N8N_BREAKER_RESET_S", "60"))
+    
+    # Shared connection pool (calendar hosts and n8n)
+    MAX_CONNECTIONS = int(os.getenv("CALENDAR_HTTP_MAX_CONNECTIONS", "100"))
+    MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("CALENDAR_HTTP_MAX_KEEPALIVE", "20"))
+    KEEPALIVE_EXPIRY = float(os.getenv("CALENDAR_HTTP_KEEPALIVE_EXPIRY_S", "30"))
+    
+    # Negotiate HTTP/2 when the h2 package is installed
+    HTTP2 = os.getenv("CALENDAR_HTTP2", "true").lower() == "true" and HTTP2_AVAILABLE
+    
+    # Context engine for /aline/generate-context: "local" (in-process) or "n8n"
+    CONTEXT_ENGINE = os.getenv("CALENDAR_CONTEXT_ENGINE", "local").lower()
+    
+    # Parsed event indexes kept per feed, and seconds before a feed is revalidated
+    # (a conditional GET: unchanged feeds cost a 304 and no re-parse)
+    INDEX_CACHE_SIZE = int(os.getenv("CALENDAR_INDEX_CACHE_SIZE", "512"))
+    INDEX_TTL = float(os.getenv("CALENDAR_INDEX_TTL_S", "900"))
+    
+    # Largest feed downloaded for local analysis, and its download timeout
+    FEED_MAX_BYTES = int(os.getenv("CALENDAR_FEED_MAX_BYTES", str(5 * 1024 * 1024)))
+    FEED_TIMEOUT = float(os.getenv("CALENDAR_FEED_TIMEOUT_S", "10"))
+    
+    # Local hours counted as the workday, and the gap that still counts as back-to-back
+    WORKDAY_START = int(os.getenv("CALENDAR_WORKDAY_START", "9"))
+    WORKDAY_END = int(os.getenv("CALENDAR_WORKDAY_END", "18"))
+    BACK_TO_BACK_GAP_MINUTES = float(os.getenv("CALENDAR_BACK_TO_BACK_GAP_MIN", "5"))
+    
+    # Pseudo-observations one day of calendar evidence adds to a Beta prior
+    EVIDENCE_WEIGHT = float(os.getenv("CALENDAR_EVIDENCE_WEIGHT", "4"))
+    
     # Valid URL schemes
     VALID_SCHEMES = ['http', 'https', 'webcal']
     
@@ -33,6 +781,53 @@ class CalendarService:
         'application/ics'
     ]
     
+    def __init__(self, client: Optional[httpx.AsyncClient] = None):
+        """
+        Initialize calendar service.
+        
+        Args:
+            client: HTTP client to use (default: pooled client created on first use)
+        """
+        self._client = client
+        self.n8n = Upstream(
+            "n8n",
+            latency_budget=self.CONTEXT_LATENCY_BUDGET,
+            breaker=CircuitBreaker(
+                "n8n",
+                failure_threshold=self.N8N_BREAKER_FAILURES,
+                reset_timeout=self.N8N_BREAKER_RESET
+            )
+        )
+        self.feeds = TTLCache(self.INDEX_CACHE_SIZE, self.INDEX_TTL)
+        self._inflight: Dict[str, asyncio.Future] = {}  # Singleflight: one revalidation per feed
+        self.feed_fetches = 0
+        self.not_modified = 0
+        self.unchanged_bodies = 0
+        self.reindexed = 0
+    
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """Shared HTTP client, (re)created on first use after startup or close."""
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=self.MAX_CONNECTIONS,
+                    max_keepalive_connections=self.MAX_KEEPALIVE_CONNECTIONS,
+                    keepalive_expiry=self.KEEPALIVE_EXPIRY
+                ),
+                http2=self.HTTP2,
+                timeout=self.VALIDATION_TIMEOUT
+            )
+        return self._client
+    
+    async def close(self):
+        """Close the shared HTTP client and its pooled connections."""
+        for fetch in list(self._inflight.values()):
+            fetch.cancel()
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+    
     def normalize_url(self, url: str) -> str:
         """
         Normalize WebCal URLs to HTTPS for HTTP requests
@@ -81,6 +876,10 @@ class CalendarService:
         """
         Verify that the URL points to a valid ICS feed
         
+        The body is streamed and reading stops as soon as the ICS markers
+        are found or VERIFY_MAX_BYTES have been read, so the cost does not
+        depend on the size of the calendar.
+        
         Args:
             url: URL to verify (should be normalized)
             
@@ -88,30 +887,27 @@ class CalendarService:
             Tuple of (is_valid, error_message)
         """
         try:
-            async with httpx.AsyncClient(timeout=self.VALIDATION_TIMEOUT) as client:
-                response = await client.get(url, follow_redirects=True)
-                
+            async with self.client.stream(
+                'GET', url, follow_redirects=True, timeout=self.VALIDATION_TIMEOUT
+            ) as response:
                 # Check status code
                 if response.status_code != 200:
                     return False, f"Could not fetch calendar (HTTP {response.status_code})"
                 
-                # Check content type
-                content_type = response.headers.get('content-type', '').lower()
-                is_valid_content_type = any(
-                    valid_type in content_type 
-                    for valid_type in self.VALID_CONTENT_TYPES
-                )
-                
                 # Check body contains ICS markers
-                body = response.text[:1000]  # Check first 1KB
-                has_vcalendar = 'BEGIN:VCALENDAR' in body
-                has_vevent = 'BEGIN:VEVENT' in body
-                
-                if not has_vcalendar:
-                    return False, "This link does not contain valid calendar data (missing VCALENDAR)"
-                
-                logger.info(f"Successfully verified ICS feed: {url[:50]}...")
-                return True, None
+                head = await self._read_until_markers(response)
+            # Leaving the block closes the connection without downloading the rest
+            
+            has_vcalendar = b'BEGIN:VCALENDAR' in head
+            has_vevent = b'BEGIN:VEVENT' in head
+            
+            if not has_vcalendar:
+                return False, "This link does not contain valid calendar data (missing VCALENDAR)"
+            if not has_vevent:
+                logger.info(f"No VEVENT in first {len(head)} bytes of {url[:50]}...")
+            
+            logger.info(f"Successfully verified ICS feed: {url[:50]}...")
+            return True, None
                 
         except httpx.TimeoutException:
             return False, "Could not fetch your calendar (timeout). Verify sharing settings."
@@ -121,6 +917,18 @@ class CalendarService:
             logger.error(f"Error verifying ICS feed: {e}")
             return False, "Could not verify calendar feed"
     
+    async def _read_until_markers(self, response: httpx.Response) -> bytes:
+        """Read the body until VCALENDAR and VEVENT markers are seen or the byte cap is hit."""
+        head = bytearray()
+        async for chunk in response.aiter_bytes():
+            head += chunk
+            if len(head) >= self.VERIFY_MAX_BYTES:
+                del head[self.VERIFY_MAX_BYTES:]
+                break
+            if b'BEGIN:VCALENDAR' in head and b'BEGIN:VEVENT' in head:
+                break
+        return bytes(head)
+    
     async def validate_and_normalize(self, url: str) -> Dict:
         """
         Complete validation and normalization pipeline
@@ -153,6 +961,192 @@ class CalendarService:
             'normalizedUrl': normalized_url
         }
     
+    async def fetch_feed(
+        self,
+        url: str,
+        etag: Optional[str] = None,
+        last_modified: Optional[str] = None
+    ) -> Tuple[Optional[str], Optional[str], Optional[str]]:
+        """
+        Download a full ICS feed, bounded by FEED_MAX_BYTES.
+        
+        With validators from a previous download the request is conditional.
+        
+        Args:
+            url: Normalized calendar URL
+            etag: ETag of the cached copy
+            last_modified: Last-Modified of the cached copy
+            
+        Returns:
+            Tuple of (text, etag, last_modified); text is None on 304 Not Modified
+        
+        Raises:
+            CalendarFeedError: On HTTP errors, timeouts, oversized or non-calendar bodies
+        """
+        headers = {}
+        if etag:
+            headers['If-None-Match'] = etag
+        if last_modified:
+            headers['If-Modified-Since'] = last_modified
+        
+        self.feed_fetches += 1
+        try:
+            async with self.client.stream(
+                'GET', url, headers=headers, follow_redirects=True, timeout=self.FEED_TIMEOUT
+            ) as response:
+                if response.status_code == 304 and headers:
+                    return None, response.headers.get('etag', etag), \
+                        response.headers.get('last-modified', last_modified)
+                if response.status_code != 200:
+                    raise CalendarFeedError(f"Could not fetch calendar (HTTP {response.status_code})")
+                body = bytearray()
+                async for chunk in response.aiter_bytes():
+                    body += chunk
+                    if len(body) > self.FEED_MAX_BYTES:
+                        raise CalendarFeedError(
+                            f"Calendar feed exceeds {self.FEED_MAX_BYTES} bytes"
+                        )
+                validators = response.headers.get('etag'), response.headers.get('last-modified')
+        except httpx.TimeoutException:
+            raise CalendarFeedError("Could not fetch calendar (timeout)")
+        except httpx.HTTPError as e:
+            raise CalendarFeedError(f"Could not fetch calendar: {e}")
+        
+        text = body.decode('utf-8', errors='replace')
+        if 'BEGIN:VCALENDAR' not in text:
+            raise CalendarFeedError("Calendar feed is missing VCALENDAR")
+        return text, validators[0], validators[1]
+    
+    async def get_event_index(self, url: str) -> EventIndex:
+        """
+        Parsed event index for a feed.
+        
+        Within INDEX_TTL the cached index is returned as is. After that the
+        feed is revalidated with a conditional GET: a 304, or a body with
+        the same content hash, keeps the index; a changed body is re-indexed
+        re-parsing only the UIDs that changed. If revalidation fails the
+        previous index is served.
+        """
+        entry = self.feeds.get_entry(url)
+        if entry is not None and entry[1] < self.INDEX_TTL:
+            return entry[0].index
+        
+        fetch = self._inflight.get(url)
+        if fetch is None:
+            fetch = asyncio.ensure_future(self._revalidate(url, entry[0] if entry else None))
+            self._inflight[url] = fetch
+            fetch.add_done_callback(lambda _: self._inflight.pop(url, None))
+        
+        try:
+            # Shield so one cancelled caller does not cancel the fetch for the others
+            return await asyncio.shield(fetch)
+        except CalendarFeedError as e:
+            if entry is None:
+                raise
+            logger.warning(f"Serving cached calendar index for {url[:50]}...: {e}")
+            return entry[0].index
+    
+    async def _revalidate(self, url: str, state: Optional[FeedState]) -> EventIndex:
+        """Fetch (conditionally if cached) and re-index a feed."""
+        text, etag, last_modified = await self.fetch_feed(
+            url,
+            etag=state.etag if state else None,
+            last_modified=state.last_modified if state else None
+        )
+        
+        if text is None:
+            self.not_modified += 1
+            self.feeds.set(url, FeedState(state.index, etag, last_modified, state.content_hash))
+            return state.index
+        
+        content_hash = hashlib.sha256(text.encode()).hexdigest()
+        if state is not None and content_hash == state.content_hash:
+            # Server ignores validators but the feed did not change
+            self.unchanged_bodies += 1
+            self.feeds.set(url, FeedState(state.index, etag, last_modified, content_hash))
+            return state.index
+        
+        # Parsing runs in a worker thread so large feeds do not stall the event loop
+        index = await asyncio.to_thread(EventIndex.from_ics, text, state.index if state else None)
+        self.reindexed += 1
+        self.feeds.set(url, FeedState(index, etag, last_modified, content_hash))
+        logger.info(
+            f"Indexed {len(index)} events from {url[:50]}... "
+            f"({index.reparsed} UIDs parsed, {index.reused} reused)"
+        )
+        return index
+    
+    def feed_stats(self) -> Dict:
+        """Feed cache and revalidation counters."""
+        stats = self.feeds.stats()
+        stats.update({
+            'feed_fetches': self.feed_fetches,
+            'not_modified': self.not_modified,
+            'unchanged_bodies': self.unchanged_bodies,
+            'reindexed': self.reindexed
+        })
+        return stats
+    
+    async def calendar_load(self, url: str, day: date, tz: tzinfo) -> Dict:
+        """
+        Hourly calendar-load features for one local day.
+        
+        Args:
+            url: Normalized calendar URL
+            day: Day to analyse (local to `tz`)
+            tz: User's time zone; also used for floating event times
+            
+        Returns:
+            hourly_load() result for the day
+        """
+        index = await self.get_event_index(url)
+        window_start = datetime.combine(day, time(0), tz)
+        window_end = datetime.combine(day + timedelta(days=1), time(0), tz)
+        occurrences = index.occurrences(window_start, window_end, tz)
+        return hourly_load(
+            occurrences,
+            day,
+            tz,
+            workday=(self.WORKDAY_START, self.WORKDAY_END),
+            back_to_back_gap=timedelta(minutes=self.BACK_TO_BACK_GAP_MINUTES)
+        )
+    
+    async def generate_context_local(
+        self,
+        user_id: str,
+        calendar_url: str,
+        priors: Dict[str, Dict[str, float]],
+        day: Optional[date] = None,
+        tz: tzinfo = timezone.utc
+    ) -> Dict:
+        """
+        Compute context posteriors in-process from the user's calendar
+        
+        Args:
+            user_id: User identifier
+            calendar_url: Normalized calendar URL
+            priors: Prior Beta distributions (feature -> {a, b})
+            day: Day to analyse (default: tomorrow in `tz`)
+            tz: User's time zone
+            
+        Returns:
+            Dict with posteriors, features and calendarLoad
+        
+        Raises:
+            CalendarFeedError: If the feed cannot be fetched
+        """
+        if day is None:
+            day = datetime.now(tz).date() + timedelta(days=1)
+        
+        load = await self.calendar_load(calendar_url, day, tz)
+        posteriors, features = update_priors(priors, load['summary'], self.EVIDENCE_WEIGHT)
+        logger.info(f"Generated local context for user {user_id} ({load['summary']['meetings']} meetings)")
+        return {
+            'posteriors': posteriors,
+            'features': features,
+            'calendarLoad': load
+        }
+    
     async def generate_context_with_calendar(
         self,
         user_id: str,
@@ -171,6 +1165,9 @@ class CalendarService:
             
         Returns:
             Dict with posteriors and features from n8n
+        
+        Raises:
+            CircuitOpenError: If n8n has been failing and calls are short-circuited
         """
         payload = {
             'userId': user_id,
@@ -179,17 +1176,19 @@ class CalendarService:
         }
         
         try:
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                response = await client.post(n8n_webhook_url, json=payload)
-                
-                if response.status_code != 200:
-                    logger.error(f"n8n webhook failed: {response.status_code}")
-                    raise Exception(f"Context generation failed (HTTP {response.status_code})")
-                
-                result = response.json()
-                logger.info(f"Generated context for user {user_id}")
-                return result
-                
+            response = await self.n8n.post(self.client, n8n_webhook_url, json=payload)
+            
+            if response.status_code != 200:
+                logger.error(f"n8n webhook failed: {response.status_code}")
+                raise Exception(f"Context generation failed (HTTP {response.status_code})")
+            
+            result = response.json()
+            logger.info(f"Generated context for user {user_id}")
+            return result
+            
+        except CircuitOpenError:
+            logger.warning("n8n circuit open, failing fast")
+            raise
         except httpx.TimeoutException:
             logger.error("n8n webhook timeout")
             raise Exception("Context generation timed out")
@@ -0,0 +1,224 @@
+"""
+Bulk Calendar Context Regeneration
+
+Regenerates the calendar context of every calendar-connected user for one
+day (e.g. ahead of morning risk notifications, ticket 028) and stores it in
+the calendar_contexts table. Connections are read in keyset-paginated pages;
+feeds within a page are processed concurrently, bounded overall and per
+calendar host (concurrency plus a request rate), so a provider hosting most
+feeds is not hammered. After each page its results are written in one
+transaction and the page's last userId is checkpointed, so an interrupted
+run resumes where it stopped.
+
+Author: ALINE Team
+Date: 2025-11-17
+"""
+
+import asyncio
+import logging
+import os
+import time
+from datetime import date, timezone, tzinfo
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+from service.calendar import CalendarService
+from service.database import Database
+from service.rate_limit import RateLimiter
+
+logger = logging.getLogger(__name__)
+
+# Priors used when a run is not given any: the calendar-informed context features
+DEFAULT_PRIORS = {
+    'stress_level': {'a': 2.0, 'b': 2.0},
+    'anxiety_score': {'a': 2.0, 'b': 2.0},
+    'work_hours': {'a': 2.0, 'b': 2.0},
+    'screen_time': {'a': 2.0, 'b': 2.0},
+    'sleep_quality': {'a': 2.0, 'b': 2.0},
+}
+
+
+class HostPoliteness:
+    """Per-host concurrency limit and request rate for calendar fetches."""
+
+    def __init__(self, concurrency: int, rate: float):
+        """
+        Args:
+            concurrency: Concurrent requests per host
+            rate: Requests per second per host
+        """
+        self.concurrency = concurrency
+        self.rate = rate
+        self._hosts: Dict[str, Tuple[asyncio.Semaphore, RateLimiter]] = {}
+
+    def limits_for(self, url: str) -> Tuple[asyncio.Semaphore, RateLimiter]:
+        host = urlparse(url).hostname or ''
+        limits = self._hosts.get(host)
+        if limits is None:
+            limits = self._hosts[host] = (
+                asyncio.Semaphore(self.concurrency),
+                RateLimiter(max(1, int(self.rate)), max(1, int(self.rate)) / self.rate, name=host)
+            )
+        return limits
+
+    def __len__(self) -> int:
+        return len(self._hosts)
+
+
+class ContextBatchRunner:
+    """Resumable, concurrency-bounded regeneration of stored calendar contexts"""
+
+    # Connections read (and results committed) per page
+    PAGE_SIZE = int(os.getenv("CONTEXT_BATCH_PAGE_SIZE", "500"))
+
+    # Feeds processed at once, overall and per calendar host
+    CONCURRENCY = int(os.getenv("CONTEXT_BATCH_CONCURRENCY", "32"))
+    HOST_CONCURRENCY = int(os.getenv("CONTEXT_BATCH_HOST_CONCURRENCY", "4"))
+
+    # Requests per second per calendar host
+    HOST_RATE = float(os.getenv("CONTEXT_BATCH_HOST_RATE", "10"))
+
+    def __init__(
+        self,
+        database: Database,
+        calendar: CalendarService,
+        day: date,
+        tz: tzinfo = timezone.utc,
+        priors: Optional[Dict[str, Dict[str, float]]] = None,
+        page_size: Optional[int] = None,
+        concurrency: Optional[int] = None,
+        host_concurrency: Optional[int] = None,
+        host_rate: Optional[float] = None,
+        skip_existing: bool = True,
+        on_page: Optional[Callable[[Dict], None]] = None
+    ):
+        """
+        Initialize the runner.
+
+        Args:
+            database: Database with calendar connections and the context table
+            calendar: Calendar service used to fetch and analyse feeds
+            day: Day the contexts are generated for
+            tz: Time zone the day's hourly windows are aligned to
+            priors: Beta priors updated per user (default: DEFAULT_PRIORS)
+            page_size: Connections per page (default: PAGE_SIZE)
+            concurrency: Feeds processed at once (default: CONCURRENCY)
+            host_concurrency: Feeds fetched at once per host (default: HOST_CONCURRENCY)
+            host_rate: Fetches per second per host (default: HOST_RATE)
+            skip_existing: Skip users that already have a context for `day`
+            on_page: Called with the running summary after each page
+        """
+        self.db = database
+        self.calendar = calendar
+        self.day = day
+        self.tz = tz
+        self.priors = priors or DEFAULT_PRIORS
+        self.page_size = page_size or self.PAGE_SIZE
+        self.concurrency = concurrency or self.CONCURRENCY
+        self.skip_existing = skip_existing
+        self.on_page = on_page
+        self.hosts = HostPoliteness(
+            host_concurrency or self.HOST_CONCURRENCY,
+            host_rate or self.HOST_RATE
+        )
+
+        self.processed = 0
+        self.succeeded = 0
+        self.failed = 0
+        self.skipped = 0
+        self.pages = 0
+        self.errors: List[Tuple[str, str]] = []
+        self._started = 0.0
+
+    @property
+    def checkpoint_name(self) -> str:
+        return f"calendar_contexts:{self.day.isoformat()}"
+
+    async def run(self, restart: bool = False, max_pages: Optional[int] = None) -> Dict:
+        """
+        Regenerate contexts for all connected users, resuming from the checkpoint.
+
+        Args:
+            restart: Ignore (and overwrite) a saved checkpoint
+            max_pages: Stop after this many pages (the checkpoint allows resuming)
+
+        Returns:
+            summary()
+        """
+        self._started = time.perf_counter()
+        cursor = None if restart else self.db.get_checkpoint(self.checkpoint_name)
+        if cursor is not None:
+            logger.info(f"Resuming {self.checkpoint_name} after user {cursor}")
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+        while max_pages is None or self.pages < max_pages:
+            page = await asyncio.to_thread(self.db.list_calendar_connections, cursor, self.page_size)
+            if not page:
+                break
+
+            todo = page
+            if self.skip_existing:
+                done = await asyncio.to_thread(
+                    self.db.users_with_context, [c['userId'] for c in page], self.day.isoformat()
+                )
+                todo = [c for c in page if c['userId'] not in done]
+                self.skipped += len(page) - len(todo)
+
+            results = await asyncio.gather(*(self._process(c, semaphore) for c in todo))
+            contexts = [result for result in results if result is not None]
+            if contexts:
+                await asyncio.to_thread(self.db.save_calendar_contexts, contexts)
+
+            cursor = page[-1]['userId']
+            await asyncio.to_thread(self.db.set_checkpoint, self.checkpoint_name, cursor)
+            self.pages += 1
+            if self.on_page is not None:
+                self.on_page(self.summary())
+
+        if max_pages is None or self.pages < max_pages:
+            # Completed: a later run for the same day starts over (skipping stored users)
+            await asyncio.to_thread(self.db.set_checkpoint, self.checkpoint_name, None)
+        return self.summary()
+
+    async def _process(self, connection: Dict, semaphore: asyncio.Semaphore) -> Optional[Dict]:
+        """Generate one user's context; failures are counted, not raised."""
+        user_id, url = connection['userId'], connection['normalizedUrl']
+        host_slots, host_rate = self.hosts.limits_for(url)
+        # Host slot first, so feeds queued behind a busy host do not hold global slots
+        async with host_slots, semaphore:
+            await host_rate.acquire()
+            try:
+                result = await self.calendar.generate_context_local(
+                    user_id, url, self.priors, day=self.day, tz=self.tz
+                )
+            except Exception as e:
+                self.failed += 1
+                self.errors.append((user_id, str(e)))
+                logger.warning(f"Context regeneration failed for user {user_id}: {e}")
+                return None
+            finally:
+                self.processed += 1
+
+        self.succeeded += 1
+        return {
+            'user_id': user_id,
+            'date': self.day.isoformat(),
+            'posteriors': result['posteriors'],
+            'features': result['features'],
+            'calendar_load': result['calendarLoad']
+        }
+
+    def summary(self) -> Dict:
+        """Counters and throughput so far."""
+        elapsed = time.perf_counter() - self._started if self._started else 0.0
+        return {
+            'date': self.day.isoformat(),
+            'processed': self.processed,
+            'succeeded': self.succeeded,
+            'failed': self.failed,
+            'skipped': self.skipped,
+            'pages': self.pages,
+            'hosts': len(self.hosts),
+            'elapsed_s': round(elapsed, 3),
+            'users_per_s': round(self.processed / elapsed, 2) if elapsed > 0 else 0.0
+        }
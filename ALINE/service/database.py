@@ -9,25 +9,127 @@ Date: 2025-11-15
 """
 
 import sqlite3
+from contextlib import contextmanager
 from pathlib import Path
 from datetime import datetime
-from typing import Optional, Dict
+from typing import Optional, Dict, List
+import json
+import os
+import threading
+import time
 import uuid
 import logging
 
+from service.cache import LRUCache, MISSING
+
 logger = logging.getLogger(__name__)
 
+# Shared by single and batched feedback writes so both keep identical semantics
+FEEDBACK_UPSERT_SQL = """
+    INSERT OR REPLACE INTO user_feedback
+    (user_id, feedback_date, actual_outcome, severity, predicted_risk, timestamp, notes)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+"""
+
+
+def feedback_params(record: Dict, timestamp: int) -> tuple:
+    """Map a feedback record dict to FEEDBACK_UPSERT_SQL parameters"""
+    return (
+        record['user_id'],
+        record['date'],
+        int(record['had_migraine']),
+        record.get('severity'),
+        record.get('predicted_prob'),
+        timestamp,
+        record.get('notes')
+    )
+
+
+# Feedback rows are bucketed into UTC days of their `timestamp`
+SECONDS_PER_DAY = 86400
+
+# Number of equal-width predicted-risk bins used for calibration
+CALIBRATION_BINS = 10
+
+
+def _feedback_aggregate_sql(row: str, sign: int) -> str:
+    """
+    Trigger statements that add (sign=1) or remove (sign=-1) one feedback
+    row's contribution to the daily accuracy and calibration aggregates.
+    
+    Rows without a predicted risk do not contribute.
+    """
+    day = f"{row}.timestamp / {SECONDS_PER_DAY}"
+    correct = (
+        f"CASE WHEN ({row}.predicted_risk > 0.5 AND {row}.actual_outcome = 1) OR "
+        f"({row}.predicted_risk <= 0.5 AND {row}.actual_outcome = 0) THEN 1 ELSE 0 END"
+    )
+    brier = f"({row}.predicted_risk - {row}.actual_outcome) * ({row}.predicted_risk - {row}.actual_outcome)"
+    calibration_bin = f"MIN(CAST({row}.predicted_risk * {CALIBRATION_BINS} AS INTEGER), {CALIBRATION_BINS - 1})"
+    
+    statements = f"""
+        INSERT INTO user_feedback_daily (user_id, day, num_predictions, num_correct, brier_sum)
+        SELECT {row}.user_id, {day}, {sign}, {sign} * ({correct}), {sign} * {brier}
+        WHERE {row}.predicted_risk IS NOT NULL
+        ON CONFLICT(user_id, day) DO UPDATE SET
+            num_predictions = num_predictions + excluded.num_predictions,
+            num_correct = num_correct + excluded.num_correct,
+            brier_sum = brier_sum + excluded.brier_sum;
+        
+        INSERT INTO user_feedback_calibration (user_id, day, bin, count, positives, predicted_sum)
+        SELECT {row}.user_id, {day}, {calibration_bin}, {sign}, {sign} * {row}.actual_outcome,
+               {sign} * {row}.predicted_risk
+        WHERE {row}.predicted_risk IS NOT NULL
+        ON CONFLICT(user_id, day, bin) DO UPDATE SET
+            count = count + excluded.count,
+            positives = positives + excluded.positives,
+            predicted_sum = predicted_sum + excluded.predicted_sum;
+    """
+    
+    if sign < 0:
+        statements += f"""
+        DELETE FROM user_feedback_daily
+        WHERE user_id = {row}.user_id AND day = {day} AND num_predictions <= 0;
+        
+        DELETE FROM user_feedback_calibration
+        WHERE user_id = {row}.user_id AND day = {day} AND count <= 0;
+        """
+    
+    return statements
+
 
 class Database:
     """Simple SQLite database for calendar connections"""
     
-    def __init__(self, db_path: str = None):
+    # Calendar connection cache size (entries)
+    CALENDAR_CACHE_SIZE = int(os.getenv("CALENDAR_CACHE_SIZE", "1024"))
+    
+    # How often (seconds) the cache checks for writes made by other processes
+    CALENDAR_CACHE_VERSION_CHECK = float(os.getenv("CALENDAR_CACHE_VERSION_CHECK_S", "1.0"))
+    
+    def __init__(
+        self,
+        db_path: str = None,
+        calendar_cache_size: Optional[int] = None,
+        calendar_version_check: Optional[float] = None
+    ):
         if db_path is None:
             db_path = str(Path(__file__).parent.parent / 'data' / 'aline.db')
         
         self.db_path = db_path
         self._ensure_db_directory()
         self._init_schema()
+        
+        # Read-through cache for calendar connections. Entries are dropped
+        # on local writes; writes from other worker processes are detected
+        # through the calendar_connections counter in cache_versions.
+        self.calendar_cache = LRUCache(calendar_cache_size or self.CALENDAR_CACHE_SIZE)
+        self.calendar_version_check = (
+            self.CALENDAR_CACHE_VERSION_CHECK if calendar_version_check is None else calendar_version_check
+        )
+        self._calendar_lock = threading.Lock()
+        self._calendar_version = self._read_calendar_version()
+        self._calendar_version_checked_at = time.monotonic()
     
     def _ensure_db_directory(self):
         """Ensure the database directory exists"""
@@ -35,7 +137,7 @@ class Database:
     
     def _init_schema(self):
         """Initialize database schema"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connect() as conn:
             # Calendar connections table
             conn.execute("""
                 CREATE TABLE IF NOT EXISTS user_calendar_connections (
@@ -50,6 +152,23 @@ class Database:
                 )
             """)
             
+            # Change counters for cross-process cache invalidation
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS cache_versions (
+                    name TEXT PRIMARY KEY,
+                    version INTEGER NOT NULL
+                )
+            """)
+            for event in ('INSERT', 'UPDATE', 'DELETE'):
+                conn.execute(f"""
+                    CREATE TRIGGER IF NOT EXISTS trg_calendar_connections_version_{event.lower()}
+                    AFTER {event} ON user_calendar_connections
+                    BEGIN
+                        INSERT INTO cache_versions (name, version) VALUES ('calendar_connections', 1)
+                        ON CONFLICT(name) DO UPDATE SET version = version + 1;
+                    END
+                """)
+            
             # Feedback tables (Ticket 026)
             conn.execute("""
                 CREATE TABLE IF NOT EXISTS user_feedback (
@@ -65,9 +184,12 @@ class Database:
                 )
             """)
             
+            # Covering index for paginated history reads; supersedes the
+            # former (user_id, feedback_date) index, which is its prefix
+            conn.execute("DROP INDEX IF EXISTS idx_user_feedback")
             conn.execute("""
-                CREATE INDEX IF NOT EXISTS idx_user_feedback 
-                ON user_feedback(user_id, feedback_date)
+                CREATE INDEX IF NOT EXISTS idx_user_feedback_history
+                ON user_feedback(user_id, feedback_date, predicted_risk, actual_outcome, severity)
             """)
             
             conn.execute("""
@@ -75,9 +197,179 @@ class Database:
                 ON user_feedback(timestamp)
             """)
             
+            self._init_feedback_aggregates(conn)
+            
+            # Last known location per user, read by the weather prefetcher
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS user_locations (
+                    user_id TEXT PRIMARY KEY,
+                    lat REAL NOT NULL,
+                    lon REAL NOT NULL,
+                    updated_at INTEGER NOT NULL
+                )
+            """)
+            conn.execute("""
+                CREATE INDEX IF NOT EXISTS idx_user_locations_updated
+                ON user_locations(updated_at, lat, lon)
+            """)
+            
+            # Background job status and results, kept until expires_at
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    user_id TEXT,
+                    status TEXT NOT NULL,
+                    result TEXT,
+                    error TEXT,
+                    created_at INTEGER NOT NULL,
+                    updated_at INTEGER NOT NULL,
+                    expires_at INTEGER NOT NULL
+                )
+            """)
+            conn.execute("""
+                CREATE INDEX IF NOT EXISTS idx_jobs_expires
+                ON jobs(expires_at)
+            """)
+            
+            # Calendar context per user and day, written by bulk regeneration
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS calendar_contexts (
+                    user_id TEXT NOT NULL,
+                    context_date TEXT NOT NULL,
+                    posteriors TEXT NOT NULL,
+                    features TEXT NOT NULL,
+                    calendar_load TEXT,
+                    generated_at INTEGER NOT NULL,
+                    PRIMARY KEY (user_id, context_date)
+                ) WITHOUT ROWID
+            """)
+            
+            # Model input features per user and hour (hour_start: Unix seconds, UTC)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS hourly_features (
+                    user_id TEXT NOT NULL,
+                    hour_start INTEGER NOT NULL,
+                    features TEXT NOT NULL,
+                    PRIMARY KEY (user_id, hour_start)
+                ) WITHOUT ROWID
+            """)
+
+            # Daily risk per user and day, written by batch scoring
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS risk_predictions (
+                    user_id TEXT NOT NULL,
+                    prediction_date TEXT NOT NULL,
+                    mean_probability REAL NOT NULL,
+                    lower_bound REAL NOT NULL,
+                    upper_bound REAL NOT NULL,
+                    window_end INTEGER NOT NULL,
+                    generated_at INTEGER NOT NULL,
+                    PRIMARY KEY (user_id, prediction_date)
+                ) WITHOUT ROWID
+            """)
+            # Window start and the what-if sensitivity surface cached with the prediction
+            self._ensure_column(conn, 'risk_predictions', 'window_start', 'INTEGER')
+            self._ensure_column(conn, 'risk_predictions', 'sensitivity', 'TEXT')
+
+            # Resume points of batch runs (last fully processed key)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS batch_checkpoints (
+                    name TEXT PRIMARY KEY,
+                    cursor TEXT,
+                    updated_at INTEGER NOT NULL
+                )
+            """)
+            
             conn.commit()
             logger.info("Database schema initialized")
     
+    def _init_feedback_aggregates(self, conn: sqlite3.Connection):
+        """
+        Create per-user daily accuracy/calibration aggregates and the
+        triggers that keep them in sync with user_feedback.
+        
+        The triggers run inside the writing transaction, so aggregates are
+        always consistent with the raw rows. INSERT OR REPLACE removes the
+        old row through a DELETE, which fires triggers only with
+        recursive_triggers enabled (see `_connect`).
+        """
+        existing = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'user_feedback_daily'"
+        ).fetchone()
+        
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS user_feedback_daily (
+                user_id TEXT NOT NULL,
+                day INTEGER NOT NULL,
+                num_predictions INTEGER NOT NULL DEFAULT 0,
+                num_correct INTEGER NOT NULL DEFAULT 0,
+                brier_sum REAL NOT NULL DEFAULT 0,
+                PRIMARY KEY (user_id, day)
+            ) WITHOUT ROWID
+        """)
+        
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS user_feedback_calibration (
+                user_id TEXT NOT NULL,
+                day INTEGER NOT NULL,
+                bin INTEGER NOT NULL,
+                count INTEGER NOT NULL DEFAULT 0,
+                positives INTEGER NOT NULL DEFAULT 0,
+                predicted_sum REAL NOT NULL DEFAULT 0,
+                PRIMARY KEY (user_id, day, bin)
+            ) WITHOUT ROWID
+        """)
+        
+        conn.executescript(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_user_feedback_agg_insert
+            AFTER INSERT ON user_feedback
+            BEGIN
+                {_feedback_aggregate_sql('NEW', 1)}
+            END;
+            
+            CREATE TRIGGER IF NOT EXISTS trg_user_feedback_agg_delete
+            AFTER DELETE ON user_feedback
+            BEGIN
+                {_feedback_aggregate_sql('OLD', -1)}
+            END;
+            
+            CREATE TRIGGER IF NOT EXISTS trg_user_feedback_agg_update
+            AFTER UPDATE ON user_feedback
+            BEGIN
+                {_feedback_aggregate_sql('OLD', -1)}
+                {_feedback_aggregate_sql('NEW', 1)}
+            END;
+        """)
+        
+        # Backfill aggregates for databases created before they existed
+        if not existing:
+            self._rebuild_feedback_aggregates(conn)
+    
+    @staticmethod
+    def _ensure_column(conn: sqlite3.Connection, table: str, column: str, definition: str):
+        """Add a column to an existing table if it is missing"""
+        columns = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+        if column not in columns:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+            logger.info(f"Added column {table}.{column}")
+    
+    @contextmanager
+    def _connect(self):
+        """
+        Open a connection, commit on success (roll back on error) and close it.
+        
+        Enables recursive triggers so INSERT OR REPLACE keeps the feedback
+        aggregates correct.
+        """
+        conn = sqlite3.connect(self.db_path)
+        try:
+            conn.execute("PRAGMA recursive_triggers = ON")
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+    
     def save_calendar_connection(
         self, 
         user_id: str, 
@@ -97,7 +389,7 @@ class Database:
         """
         now = datetime.utcnow().isoformat()
         
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connect() as conn:
             # Check if connection exists
             cursor = conn.cursor()
             cursor.execute(
@@ -123,8 +415,10 @@ class Database:
                     VALUES (?, ?, ?, ?, ?, ?)
                 """, (connection_id, user_id, calendar_url, normalized_url, now, now))
             
+            new_version = self._read_calendar_version(conn)
             conn.commit()
-            
+        
+        self._after_calendar_write(user_id, new_version)
         logger.info(f"Saved calendar connection for user {user_id}")
         
         return {
@@ -145,7 +439,13 @@ class Database:
         Returns:
             Connection dict or None if not found
         """
-        with sqlite3.connect(self.db_path) as conn:
+        self._check_calendar_version()
+        
+        cached = self.calendar_cache.get(user_id)
+        if cached is not MISSING:
+            return dict(cached) if cached is not None else None
+        
+        with self._connect() as conn:
             conn.row_factory = sqlite3.Row
             cursor = conn.cursor()
             cursor.execute("""
@@ -155,10 +455,10 @@ class Database:
                 WHERE userId = ?
             """, (user_id,))
             row = cursor.fetchone()
-            
-            if row:
-                return dict(row)
-            return None
+        
+        connection = dict(row) if row else None
+        self.calendar_cache.set(user_id, connection)
+        return dict(connection) if connection is not None else None
     
     def update_verification_time(self, user_id: str) -> None:
         """
@@ -169,14 +469,16 @@ class Database:
         """
         now = datetime.utcnow().isoformat()
         
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connect() as conn:
             conn.execute("""
                 UPDATE user_calendar_connections
                 SET lastVerifiedAt = ?, updatedAt = ?
                 WHERE userId = ?
             """, (now, now, user_id))
+            new_version = self._read_calendar_version(conn)
             conn.commit()
         
+        self._after_calendar_write(user_id, new_version)
         logger.info(f"Updated verification time for user {user_id}")
     
     def delete_calendar_connection(self, user_id: str) -> bool:
@@ -189,21 +491,77 @@ class Database:
         Returns:
             True if deleted, False if not found
         """
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connect() as conn:
             cursor = conn.cursor()
             cursor.execute("""
                 DELETE FROM user_calendar_connections
                 WHERE userId = ?
             """, (user_id,))
+            new_version = self._read_calendar_version(conn)
             conn.commit()
             
             deleted = cursor.rowcount > 0
-            
+        
+        self._after_calendar_write(user_id, new_version)
         if deleted:
             logger.info(f"Deleted calendar connection for user {user_id}")
         
         return deleted
     
+    def list_calendar_connections(self, after: Optional[str] = None, limit: int = 200) -> List[Dict]:
+        """
+        Page through calendar connections in userId order (keyset pagination).
+        
+        Args:
+            after: Last userId of the previous page (None = start)
+            limit: Page size
+            
+        Returns:
+            List of {'userId', 'normalizedUrl'} dicts
+        """
+        with self._connect() as conn:
+            rows = conn.execute("""
+                SELECT userId, normalizedUrl FROM user_calendar_connections
+                WHERE userId > ?
+                ORDER BY userId
+                LIMIT ?
+            """, (after if after is not None else '', limit)).fetchall()
+        
+        return [{'userId': row[0], 'normalizedUrl': row[1]} for row in rows]
+    
+    def _read_calendar_version(self, conn: Optional[sqlite3.Connection] = None) -> int:
+        """Current value of the calendar_connections change counter"""
+        if conn is None:
+            with self._connect() as conn:
+                return self._read_calendar_version(conn)
+        
+        row = conn.execute(
+            "SELECT version FROM cache_versions WHERE name = 'calendar_connections'"
+        ).fetchone()
+        return row[0] if row else 0
+    
+    def _check_calendar_version(self):
+        """Clear the calendar cache if another process changed connections"""
+        now = time.monotonic()
+        if now - self._calendar_version_checked_at < self.calendar_version_check:
+            return
+        
+        version = self._read_calendar_version()
+        with self._calendar_lock:
+            self._calendar_version_checked_at = now
+            if version != self._calendar_version:
+                self.calendar_cache.clear()
+                self._calendar_version = version
+    
+    def _after_calendar_write(self, user_id: str, new_version: int):
+        """Invalidate after a local write, keeping the cache if nobody else wrote"""
+        self.calendar_cache.pop(user_id)
+        with self._calendar_lock:
+            # Exactly one bump means the only change was ours; any gap means
+            # another process wrote too, and the next check clears the cache
+            if new_version == self._calendar_version + 1:
+                self._calendar_version = new_version
+    
     # ========================================================================
     # FEEDBACK METHODS (Ticket 026)
     # ========================================================================
@@ -233,48 +591,121 @@ class Database:
         """
         timestamp = int(datetime.utcnow().timestamp())
         
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connect() as conn:
             cursor = conn.cursor()
-            cursor.execute("""
-                INSERT OR REPLACE INTO user_feedback
-                (user_id, feedback_date, actual_outcome, severity, predicted_risk, timestamp, notes)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            """, (user_id, date, int(had_migraine), severity, predicted_prob, timestamp, notes))
+            cursor.execute(FEEDBACK_UPSERT_SQL, feedback_params({
+                'user_id': user_id,
+                'date': date,
+                'had_migraine': had_migraine,
+                'severity': severity,
+                'predicted_prob': predicted_prob,
+                'notes': notes
+            }, timestamp))
             conn.commit()
             feedback_id = cursor.lastrowid
         
         logger.info(f"Added feedback for user {user_id} on {date}: migraine={had_migraine}")
         return feedback_id
     
+    def add_feedback_batch(self, records: List[Dict]) -> List[int]:
+        """
+        Record several feedback entries in a single transaction.
+        
+        Each record uses the same keys as the `add_feedback` arguments
+        (user_id, date, had_migraine, severity, predicted_prob, notes) and
+        the same INSERT OR REPLACE semantics. The batch commits (and syncs
+        to disk) once; if any row fails, the whole batch is rolled back.
+        
+        Args:
+            records: List of feedback dicts
+            
+        Returns:
+            Feedback record IDs, in the same order as `records`
+        """
+        timestamp = int(datetime.utcnow().timestamp())
+        feedback_ids = []
+        
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            for record in records:
+                cursor.execute(FEEDBACK_UPSERT_SQL, feedback_params(record, timestamp))
+                feedback_ids.append(cursor.lastrowid)
+        
+        logger.info(f"Added feedback batch of {len(records)} records")
+        return feedback_ids
+    
+    def import_feedback_chunk(self, records: List[Dict]) -> int:
+        """
+        Bulk-insert validated feedback records with executemany.
+        
+        Uses the same INSERT OR REPLACE statement as `add_feedback`, inside
+        one transaction per call. Callers chunk large imports.
+        
+        Args:
+            records: List of feedback dicts (see `add_feedback_batch`)
+            
+        Returns:
+            Number of rows written
+        """
+        timestamp = int(datetime.utcnow().timestamp())
+        params = [feedback_params(record, timestamp) for record in records]
+        
+        with self._connect() as conn:
+            conn.executemany(FEEDBACK_UPSERT_SQL, params)
+        
+        return len(params)
+    
     def get_user_feedback_history(
         self,
         user_id: str,
-        limit: int = 30
+        limit: int = 30,
+        before: Optional[str] = None
     ) -> list:
         """
-        Retrieve recent feedback for a user.
+        Retrieve recent feedback for a user, newest first.
+        
+        Uses keyset pagination: pass the last `feedback_date` of a page as
+        `before` to get the next one. The query is answered entirely from
+        idx_user_feedback_history, so deep pages cost the same as the first.
         
         Args:
             user_id: User identifier
             limit: Maximum number of records to return
+            before: Only return records with feedback_date < before
             
         Returns:
-            List of feedback records
+            List of feedback records (feedback_date, predicted_risk,
+            actual_outcome, severity)
         """
-        with sqlite3.connect(self.db_path) as conn:
+        query, params = self._feedback_history_query(user_id, limit, before)
+        
+        with self._connect() as conn:
             conn.row_factory = sqlite3.Row
             cursor = conn.cursor()
-            cursor.execute("""
-                SELECT feedback_date, predicted_risk, actual_outcome, severity, notes, timestamp
-                FROM user_feedback
-                WHERE user_id = ?
-                ORDER BY feedback_date DESC
-                LIMIT ?
-            """, (user_id, limit))
+            cursor.execute(query, params)
             
             rows = cursor.fetchall()
             return [dict(row) for row in rows]
     
+    @staticmethod
+    def _feedback_history_query(user_id: str, limit: int, before: Optional[str]) -> tuple:
+        """SQL and parameters for one page of feedback history"""
+        query = """
+            SELECT feedback_date, predicted_risk, actual_outcome, severity
+            FROM user_feedback
+            WHERE user_id = ?
+        """
+        params = [user_id]
+        
+        if before is not None:
+            query += " AND feedback_date < ?"
+            params.append(before)
+        
+        query += " ORDER BY feedback_date DESC LIMIT ?"
+        params.append(limit)
+        
+        return query, tuple(params)
+    
     def get_user_accuracy(
         self,
         user_id: str,
@@ -283,37 +714,446 @@ class Database:
         """
         Calculate user's prediction accuracy over recent window.
         
+        Reads the daily aggregates, so the cost is at most `window_days`
+        small rows regardless of how much feedback the user has. The window
+        covers whole UTC days, starting with the day of the cutoff.
+        
         Args:
             user_id: User identifier
             window_days: Number of days to look back
             
         Returns:
-            Dict with 'accuracy' and 'num_predictions'
+            Dict with 'accuracy', 'num_predictions' and 'brier_score'
         """
-        cutoff_timestamp = int((datetime.utcnow().timestamp() - window_days * 86400))
+        cutoff_day = self._cutoff_day(window_days)
         
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connect() as conn:
             cursor = conn.cursor()
             cursor.execute("""
-                SELECT 
-                    AVG(CASE 
-                        WHEN (predicted_risk > 0.5 AND actual_outcome = 1) OR
-                             (predicted_risk <= 0.5 AND actual_outcome = 0)
-                        THEN 1.0 ELSE 0.0 
-                    END) as accuracy,
-                    COUNT(*) as num_predictions
-                FROM user_feedback
-                WHERE user_id = ?
-                AND timestamp >= ?
-                AND predicted_risk IS NOT NULL
-            """, (user_id, cutoff_timestamp))
+                SELECT SUM(num_correct), SUM(num_predictions), SUM(brier_sum)
+                FROM user_feedback_daily
+                WHERE user_id = ? AND day >= ?
+            """, (user_id, cutoff_day))
             
-            result = cursor.fetchone()
+            num_correct, num_predictions, brier_sum = cursor.fetchone()
+        
+        num_predictions = num_predictions or 0
+        return {
+            'accuracy': num_correct / num_predictions if num_predictions else 0.0,
+            'num_predictions': num_predictions,
+            'brier_score': brier_sum / num_predictions if num_predictions else None
+        }
+    
+    def get_user_calibration(
+        self,
+        user_id: str,
+        window_days: int = 30
+    ) -> list:
+        """
+        Calibration curve over recent window from the daily aggregates.
+        
+        Args:
+            user_id: User identifier
+            window_days: Number of days to look back
             
-            return {
-                'accuracy': result[0] if result[0] else 0.0,
-                'num_predictions': result[1] if result else 0
+        Returns:
+            List of non-empty bins with 'bin', 'count', 'mean_predicted'
+            and 'observed_rate'
+        """
+        cutoff_day = self._cutoff_day(window_days)
+        
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT bin, SUM(count), SUM(positives), SUM(predicted_sum)
+                FROM user_feedback_calibration
+                WHERE user_id = ? AND day >= ?
+                GROUP BY bin
+                HAVING SUM(count) > 0
+                ORDER BY bin
+            """, (user_id, cutoff_day))
+            rows = cursor.fetchall()
+        
+        return [
+            {
+                'bin': bin_index,
+                'count': count,
+                'mean_predicted': predicted_sum / count,
+                'observed_rate': positives / count
             }
+            for bin_index, count, positives, predicted_sum in rows
+        ]
+    
+    def rebuild_feedback_aggregates(self) -> None:
+        """Recompute all feedback aggregates from the raw user_feedback table."""
+        with self._connect() as conn:
+            self._rebuild_feedback_aggregates(conn)
+        
+        logger.info("Rebuilt feedback aggregates")
+    
+    def _rebuild_feedback_aggregates(self, conn: sqlite3.Connection):
+        """Replace aggregate contents with a full recomputation"""
+        day = f"timestamp / {SECONDS_PER_DAY}"
+        
+        conn.execute("DELETE FROM user_feedback_daily")
+        conn.execute("DELETE FROM user_feedback_calibration")
+        
+        conn.execute(f"""
+            INSERT INTO user_feedback_daily (user_id, day, num_predictions, num_correct, brier_sum)
+            SELECT user_id, {day}, COUNT(*),
+                   SUM(CASE WHEN (predicted_risk > 0.5 AND actual_outcome = 1) OR
+                                 (predicted_risk <= 0.5 AND actual_outcome = 0)
+                            THEN 1 ELSE 0 END),
+                   SUM((predicted_risk - actual_outcome) * (predicted_risk - actual_outcome))
+            FROM user_feedback
+            WHERE predicted_risk IS NOT NULL
+            GROUP BY user_id, {day}
+        """)
+        
+        conn.execute(f"""
+            INSERT INTO user_feedback_calibration (user_id, day, bin, count, positives, predicted_sum)
+            SELECT user_id, {day},
+                   MIN(CAST(predicted_risk * {CALIBRATION_BINS} AS INTEGER), {CALIBRATION_BINS - 1}) AS bin,
+                   COUNT(*), SUM(actual_outcome), SUM(predicted_risk)
+            FROM user_feedback
+            WHERE predicted_risk IS NOT NULL
+            GROUP BY user_id, {day}, bin
+        """)
+    
+    @staticmethod
+    def _cutoff_day(window_days: int) -> int:
+        """First aggregate day inside a `window_days` lookback"""
+        cutoff_timestamp = int(datetime.utcnow().timestamp() - window_days * SECONDS_PER_DAY)
+        return cutoff_timestamp // SECONDS_PER_DAY
+
+    
+    def record_user_location(self, user_id: str, lat: float, lon: float) -> None:
+        """
+        Store the user's latest location.
+        
+        Args:
+            user_id: User identifier
+            lat: Latitude
+            lon: Longitude
+        """
+        with self._connect() as conn:
+            conn.execute("""
+                INSERT OR REPLACE INTO user_locations (user_id, lat, lon, updated_at)
+                VALUES (?, ?, ?, ?)
+            """, (user_id, lat, lon, int(datetime.utcnow().timestamp())))
+    
+    def get_active_user_locations(self, active_days: int = 7) -> List[tuple]:
+        """
+        Locations of users seen within the last `active_days`.
+        
+        Args:
+            active_days: Activity window in days
+            
+        Returns:
+            List of (lat, lon) tuples, most recently active first
+        """
+        cutoff = int(datetime.utcnow().timestamp() - active_days * SECONDS_PER_DAY)
+        
+        with self._connect() as conn:
+            rows = conn.execute("""
+                SELECT lat, lon FROM user_locations
+                WHERE updated_at >= ?
+                ORDER BY updated_at DESC
+            """, (cutoff,)).fetchall()
+        
+        return [tuple(row) for row in rows]
+
+    
+    def create_job(self, job_id: str, kind: str, user_id: Optional[str], ttl: float) -> None:
+        """
+        Record a newly queued job.
+        
+        Args:
+            job_id: Job identifier
+            kind: Job type (e.g. 'generate-context')
+            user_id: Submitting user, if any
+            ttl: Seconds the record is kept
+        """
+        now = int(time.time())
+        with self._connect() as conn:
+            conn.execute("""
+                INSERT INTO jobs (id, kind, user_id, status, created_at, updated_at, expires_at)
+                VALUES (?, ?, ?, 'queued', ?, ?, ?)
+            """, (job_id, kind, user_id, now, now, now + int(ttl)))
+    
+    def update_job(
+        self,
+        job_id: str,
+        status: str,
+        result: Optional[Dict] = None,
+        error: Optional[str] = None,
+        ttl: Optional[float] = None
+    ) -> None:
+        """
+        Update a job's status (and outcome).
+        
+        Args:
+            job_id: Job identifier
+            status: 'running', 'succeeded' or 'failed'
+            result: JSON-serializable result of a succeeded job
+            error: Error message of a failed job
+            ttl: If given, keep the record this many seconds from now
+        """
+        now = int(time.time())
+        with self._connect() as conn:
+            conn.execute("""
+                UPDATE jobs
+                SET status = ?, result = ?, error = ?, updated_at = ?,
+                    expires_at = COALESCE(?, expires_at)
+                WHERE id = ?
+            """, (
+                status,
+                json.dumps(result) if result is not None else None,
+                error,
+                now,
+                now + int(ttl) if ttl is not None else None,
+                job_id
+            ))
+    
+    def get_job(self, job_id: str) -> Optional[Dict]:
+        """
+        Get an unexpired job record.
+        
+        Returns:
+            Dict with id, kind, user_id, status, result, error, created_at,
+            updated_at, or None if unknown or expired
+        """
+        with self._connect() as conn:
+            conn.row_factory = sqlite3.Row
+            row = conn.execute("""
+                SELECT id, kind, user_id, status, result, error, created_at, updated_at
+                FROM jobs WHERE id = ? AND expires_at > ?
+            """, (job_id, int(time.time()))).fetchone()
+        
+        if row is None:
+            return None
+        job = dict(row)
+        job['result'] = json.loads(job['result']) if job['result'] is not None else None
+        return job
+    
+    def purge_expired_jobs(self) -> int:
+        """Delete expired job records; returns the number removed."""
+        with self._connect() as conn:
+            cursor = conn.execute("DELETE FROM jobs WHERE expires_at <= ?", (int(time.time()),))
+            return cursor.rowcount
+
+    
+    def save_calendar_contexts(self, contexts: List[Dict]) -> None:
+        """
+        Store generated calendar contexts in one transaction.
+        
+        Args:
+            contexts: Dicts with user_id, date, posteriors, features, calendar_load
+        """
+        now = int(time.time())
+        with self._connect() as conn:
+            conn.executemany("""
+                INSERT OR REPLACE INTO calendar_contexts
+                (user_id, context_date, posteriors, features, calendar_load, generated_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, [
+                (
+                    context['user_id'],
+                    context['date'],
+                    json.dumps(context['posteriors']),
+                    json.dumps(context['features']),
+                    json.dumps(context.get('calendar_load')),
+                    now
+                )
+                for context in contexts
+            ])
+    
+    def get_calendar_context(self, user_id: str, context_date: str) -> Optional[Dict]:
+        """
+        Stored calendar context for a user and day.
+        
+        Returns:
+            Dict with posteriors, features, calendar_load and generated_at, or None
+        """
+        with self._connect() as conn:
+            row = conn.execute("""
+                SELECT posteriors, features, calendar_load, generated_at
+                FROM calendar_contexts WHERE user_id = ? AND context_date = ?
+            """, (user_id, context_date)).fetchone()
+        
+        if row is None:
+            return None
+        return {
+            'posteriors': json.loads(row[0]),
+            'features': json.loads(row[1]),
+            'calendar_load': json.loads(row[2]) if row[2] is not None else None,
+            'generated_at': row[3]
+        }
+    
+    def users_with_context(self, user_ids: List[str], context_date: str) -> set:
+        """Subset of `user_ids` that already have a context for `context_date`."""
+        if not user_ids:
+            return set()
+        placeholders = ','.join('?' * len(user_ids))
+        with self._connect() as conn:
+            rows = conn.execute(f"""
+                SELECT user_id FROM calendar_contexts
+                WHERE context_date = ? AND user_id IN ({placeholders})
+            """, (context_date, *user_ids)).fetchall()
+        return {row[0] for row in rows}
+    
+    def get_checkpoint(self, name: str) -> Optional[str]:
+        """Cursor saved by a batch run, or None."""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT cursor FROM batch_checkpoints WHERE name = ?", (name,)
+            ).fetchone()
+        return row[0] if row else None
+    
+    def set_checkpoint(self, name: str, cursor: Optional[str]) -> None:
+        """Save (or with None, clear) a batch run's cursor."""
+        with self._connect() as conn:
+            if cursor is None:
+                conn.execute("DELETE FROM batch_checkpoints WHERE name = ?", (name,))
+            else:
+                conn.execute("""
+                    INSERT OR REPLACE INTO batch_checkpoints (name, cursor, updated_at)
+                    VALUES (?, ?, ?)
+                """, (name, cursor, int(time.time())))
+
+    def save_hourly_features(self, user_id: str, hours: List[tuple]) -> int:
+        """
+        Store (or replace) a user's hourly model inputs in one transaction.
+
+        Cached sensitivity surfaces of the user's predictions whose window
+        the new hours may change are dropped in the same transaction.
+
+        Args:
+            user_id: User identifier
+            hours: (hour_start, features) pairs; hour_start in Unix seconds (UTC)
+
+        Returns:
+            Number of hours written
+        """
+        if not hours:
+            return 0
+        starts = [int(hour_start) for hour_start, _ in hours]
+        with self._connect() as conn:
+            conn.executemany("""
+                INSERT OR REPLACE INTO hourly_features (user_id, hour_start, features)
+                VALUES (?, ?, ?)
+            """, [(user_id, int(hour_start), json.dumps(list(features))) for hour_start, features in hours])
+            # A window holds the latest hours before the day starts
+            conn.execute("""
+                UPDATE risk_predictions SET sensitivity = NULL
+                WHERE user_id = ? AND sensitivity IS NOT NULL
+                  AND CAST(strftime('%s', prediction_date) AS INTEGER) > ?
+                  AND COALESCE(window_start, 0) <= ?
+            """, (user_id, min(starts), max(starts)))
+        return len(hours)
+
+    def list_feature_users(self, after: Optional[str] = None, limit: int = 500) -> List[str]:
+        """
+        Page through users with stored hourly features in user_id order (keyset pagination).
+
+        Args:
+            after: Last user_id of the previous page (None = start)
+            limit: Page size
+        """
+        with self._connect() as conn:
+            rows = conn.execute("""
+                SELECT DISTINCT user_id FROM hourly_features
+                WHERE user_id > ?
+                ORDER BY user_id
+                LIMIT ?
+            """, (after if after is not None else '', limit)).fetchall()
+        return [row[0] for row in rows]
+
+    def latest_feature_windows(self, user_ids: List[str], before: int, hours: int = 24) -> Dict[str, List[tuple]]:
+        """
+        Each user's stored hours in the window that ends at a cutoff, in one query.
+
+        Only hours within [before - hours * 3600, before) are read, so hours
+        from before a logging gap never fill in a stale window.
+
+        Args:
+            user_ids: Users to read
+            before: Cutoff in Unix seconds (exclusive)
+            hours: Hours per window
+
+        Returns:
+            {user_id: [(hour_start, features), ...]} oldest first; users with
+            no hours in the window are absent
+        """
+        if not user_ids:
+            return {}
+        placeholders = ','.join('?' * len(user_ids))
+        with self._connect() as conn:
+            rows = conn.execute(f"""
+                SELECT user_id, hour_start, features
+                FROM hourly_features
+                WHERE user_id IN ({placeholders}) AND hour_start >= ? AND hour_start < ?
+                ORDER BY user_id, hour_start
+            """, (*user_ids, int(before) - hours * 3600, int(before))).fetchall()
+
+        windows: Dict[str, List[tuple]] = {}
+        for user_id, hour_start, features in rows:
+            windows.setdefault(user_id, []).append((hour_start, json.loads(features)))
+        return windows
+
+    def save_risk_predictions(self, predictions: List[Dict]) -> None:
+        """
+        Store daily risk predictions in one transaction.
+
+        Args:
+            predictions: Dicts with user_id, date, mean_probability,
+                lower_bound, upper_bound, window_start, window_end and
+                optionally a sensitivity surface
+        """
+        now = int(time.time())
+        with self._connect() as conn:
+            conn.executemany("""
+                INSERT OR REPLACE INTO risk_predictions
+                (user_id, prediction_date, mean_probability, lower_bound, upper_bound,
+                 window_start, window_end, sensitivity, generated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, [
+                (
+                    prediction['user_id'],
+                    prediction['date'],
+                    prediction['mean_probability'],
+                    prediction['lower_bound'],
+                    prediction['upper_bound'],
+                    prediction.get('window_start'),
+                    prediction['window_end'],
+                    json.dumps(prediction['sensitivity']) if prediction.get('sensitivity') is not None else None,
+                    now
+                )
+                for prediction in predictions
+            ])
+
+    def get_risk_prediction(self, user_id: str, prediction_date: str) -> Optional[Dict]:
+        """
+        Stored risk prediction for a user and day.
+
+        Returns:
+            Dict with mean_probability, lower_bound, upper_bound,
+            window_start, window_end, sensitivity (None once invalidated)
+            and generated_at, or None
+        """
+        with self._connect() as conn:
+            conn.row_factory = sqlite3.Row
+            row = conn.execute("""
+                SELECT mean_probability, lower_bound, upper_bound, window_start, window_end,
+                       sensitivity, generated_at
+                FROM risk_predictions WHERE user_id = ? AND prediction_date = ?
+            """, (user_id, prediction_date)).fetchone()
+
+        if row is None:
+            return None
+        prediction = dict(row)
+        prediction['sensitivity'] = json.loads(row['sensitivity']) if row['sensitivity'] is not None else None
+        return prediction
 
 
 # Global database instance
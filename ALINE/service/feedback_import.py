@@ -0,0 +1,210 @@
+"""
+Bulk Feedback Import
+
+Shared import pipeline for backfilling historical feedback, used by both
+`POST /feedback/bulk` and `scripts/import_feedback.py`.
+
+Rows are validated one at a time and written with `executemany` in
+chunked transactions, using the same INSERT OR REPLACE semantics as
+`Database.add_feedback`. Invalid rows are reported individually and never
+block the rest of the import.
+
+Author: ALINE Team
+Date: 2025-11-16
+"""
+
+import json
+import logging
+from datetime import datetime
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+from pydantic import ValidationError
+
+from service.database import Database
+from service.schemas import FeedbackImportRow
+
+logger = logging.getLogger(__name__)
+
+
+def parse_feedback_row(raw: Dict) -> Dict:
+    """
+    Validate a raw import row and convert it to a feedback record.
+
+    Empty strings (as produced by CSV readers) are treated as missing.
+
+    Args:
+        raw: Row dict with user_id, date, had_migraine and optional
+             severity, predicted_risk, notes
+
+    Returns:
+        Feedback record dict accepted by `Database.import_feedback_chunk`
+
+    Raises:
+        ValueError: If the row is invalid
+    """
+    if not isinstance(raw, dict):
+        raise ValueError("Row must be an object")
+
+    cleaned = {key: (None if value == '' else value) for key, value in raw.items()}
+
+    try:
+        row = FeedbackImportRow.model_validate(cleaned)
+    except ValidationError as e:
+        details = "; ".join(
+            f"{'.'.join(str(loc) for loc in err['loc'])}: {err['msg']}"
+            for err in e.errors()
+        )
+        raise ValueError(details) from None
+
+    try:
+        datetime.strptime(row.date, '%Y-%m-%d')
+    except ValueError:
+        raise ValueError(f"date: expected YYYY-MM-DD, got {row.date!r}") from None
+
+    return {
+        'user_id': row.user_id,
+        'date': row.date,
+        'had_migraine': row.had_migraine,
+        'severity': row.severity,
+        'predicted_prob': row.predicted_risk,
+        'notes': row.notes
+    }
+
+
+class FeedbackImporter:
+    """
+    Incremental bulk importer.
+
+    Feed rows with `add()`; write a chunk with `flush()` whenever `full` is
+    True and once more at the end. Both return event dicts suitable for
+    streaming to the client:
+        {"type": "error", "row": 12, "error": "..."}
+        {"type": "progress", "processed": 5000, "imported": 4998, "failed": 2}
+    """
+
+    DEFAULT_CHUNK_SIZE = 5000
+
+    def __init__(self, database: Database, chunk_size: Optional[int] = None):
+        self.db = database
+        self.chunk_size = chunk_size or self.DEFAULT_CHUNK_SIZE
+
+        self.processed = 0
+        self.imported = 0
+        self.failed = 0
+
+        self._pending: List[Dict] = []
+        self._pending_rows: List[int] = []
+
+    @property
+    def full(self) -> bool:
+        """Whether the pending chunk should be flushed"""
+        return len(self._pending) >= self.chunk_size
+
+    def add(self, raw: Dict, row_number: Optional[int] = None) -> List[Dict]:
+        """
+        Validate a row and queue it for the next chunk.
+
+        Args:
+            raw: Raw row dict
+            row_number: Position reported in errors (default: running count)
+
+        Returns:
+            Error events for this row (empty if valid)
+        """
+        self.processed += 1
+        if row_number is None:
+            row_number = self.processed
+
+        try:
+            record = parse_feedback_row(raw)
+        except ValueError as e:
+            return [self._error(row_number, str(e))]
+
+        self._pending.append(record)
+        self._pending_rows.append(row_number)
+        return []
+
+    def add_error(self, row_number: int, error: str) -> List[Dict]:
+        """Record a row that failed before validation (e.g. malformed JSON)"""
+        self.processed += 1
+        return [self._error(row_number, error)]
+
+    def flush(self) -> List[Dict]:
+        """
+        Write the pending chunk in one transaction.
+
+        If the chunk fails as a whole, rows are retried individually so
+        the offending rows can be reported.
+
+        Returns:
+            Error events for rows that could not be written, followed by
+            a progress event
+        """
+        events = []
+        records, rows = self._pending, self._pending_rows
+        self._pending, self._pending_rows = [], []
+
+        if records:
+            try:
+                self.imported += self.db.import_feedback_chunk(records)
+            except Exception as e:
+                logger.warning(f"Import chunk of {len(records)} rows failed ({e}), retrying rows individually")
+                for record, row_number in zip(records, rows):
+                    try:
+                        self.imported += self.db.import_feedback_chunk([record])
+                    except Exception as row_error:
+                        events.append(self._error(row_number, str(row_error)))
+
+        events.append(self.progress())
+        return events
+
+    def progress(self) -> Dict:
+        """Current progress event"""
+        return {
+            'type': 'progress',
+            'processed': self.processed,
+            'imported': self.imported,
+            'failed': self.failed
+        }
+
+    def summary(self) -> Dict:
+        """Final summary event"""
+        return {**self.progress(), 'type': 'summary'}
+
+    def _error(self, row_number: int, error: str) -> Dict:
+        self.failed += 1
+        return {'type': 'error', 'row': row_number, 'error': error}
+
+
+async def iter_ndjson(chunks: AsyncIterator[bytes]) -> AsyncIterator[Tuple[int, Optional[Dict], Optional[str]]]:
+    """
+    Parse an NDJSON byte stream line by line as it arrives.
+
+    Args:
+        chunks: Async iterator of raw body chunks (e.g. `request.stream()`)
+
+    Yields:
+        (row_number, row, error) - `row` is None and `error` is set for
+        lines that are not valid JSON. Blank lines are skipped.
+    """
+    buffer = b''
+    row_number = 0
+
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b'\n')
+        for line in lines:
+            if line.strip():
+                row_number += 1
+                yield _parse_json_line(row_number, line)
+
+    if buffer.strip():
+        row_number += 1
+        yield _parse_json_line(row_number, buffer)
+
+
+def _parse_json_line(row_number: int, line: bytes) -> Tuple[int, Optional[Dict], Optional[str]]:
+    try:
+        return row_number, json.loads(line), None
+    except ValueError as e:
+        return row_number, None, f"Invalid JSON: {e}"
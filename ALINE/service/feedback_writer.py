@@ -0,0 +1,208 @@
+"""
+Feedback Batch Writer - Ticket 026
+
+Group-commit writer for feedback ingestion. Concurrent `POST /feedback`
+requests are coalesced into a single SQLite transaction (optionally
+waiting a short window for more rows), so a burst of N submissions costs
+one commit (and one fsync) instead of N.
+
+Durability guarantees:
+- A caller's future resolves with its row ID only after the transaction
+  containing that row has committed. With SQLite's default journal mode
+  and synchronous=FULL, a resolved future means the row is on disk.
+- If the process dies before a batch commits, none of its rows are
+  stored, and none of its callers have been acknowledged.
+- If a batch fails, it is rolled back and each row is retried in its own
+  transaction, so one bad row cannot fail unrelated submissions.
+- `close()` flushes everything queued before it was called. Submissions
+  that arrive while it is running are rejected with RuntimeError.
+- If the worker stops for any other reason (e.g. cancellation), every
+  record it has not committed fails instead of leaving its caller waiting.
+
+Author: ALINE Team
+Date: 2025-11-16
+"""
+
+import asyncio
+import os
+import logging
+from typing import Dict, List, Optional, Tuple
+
+from service.database import Database, db
+
+logger = logging.getLogger(__name__)
+
+
+class FeedbackBatchWriter:
+    """Coalesces concurrent feedback inserts into group commits"""
+
+    # Extra time the first queued row waits for companions (seconds).
+    # With 0, the worker commits as soon as it is free and rows arriving
+    # during a commit form the next batch, so a lone writer pays no delay.
+    BATCH_WINDOW = float(os.getenv("FEEDBACK_BATCH_WINDOW_MS", "0")) / 1000.0
+
+    # Maximum rows per transaction
+    MAX_BATCH_SIZE = int(os.getenv("FEEDBACK_MAX_BATCH_SIZE", "256"))
+
+    def __init__(
+        self,
+        database: Database,
+        batch_window: Optional[float] = None,
+        max_batch_size: Optional[int] = None
+    ):
+        """
+        Initialize the batch writer.
+
+        Args:
+            database: Database the batches are committed to
+            batch_window: Coalescing window in seconds (default: BATCH_WINDOW)
+            max_batch_size: Maximum rows per transaction (default: MAX_BATCH_SIZE)
+        """
+        self.db = database
+        self.batch_window = self.BATCH_WINDOW if batch_window is None else batch_window
+        self.max_batch_size = max_batch_size or self.MAX_BATCH_SIZE
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._closing = False
+
+        # Counters for monitoring and benchmarks
+        self.rows_written = 0
+        self.batches_committed = 0
+
+    def _ensure_worker(self):
+        """Start the background worker on the running event loop"""
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.create_task(self._run())
+
+    async def submit(
+        self,
+        user_id: str,
+        date: str,
+        had_migraine: bool,
+        severity: Optional[int] = None,
+        predicted_prob: Optional[float] = None,
+        notes: Optional[str] = None
+    ) -> int:
+        """
+        Queue a feedback record and wait until it is committed.
+
+        Args:
+            Same as `Database.add_feedback`
+
+        Returns:
+            Feedback record ID
+            
+        Raises:
+            RuntimeError: If the writer is shutting down
+        """
+        if self._closing:
+            raise RuntimeError("Feedback writer is closing")
+        self._ensure_worker()
+
+        record = {
+            'user_id': user_id,
+            'date': date,
+            'had_migraine': had_migraine,
+            'severity': severity,
+            'predicted_prob': predicted_prob,
+            'notes': notes
+        }
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((record, future))
+        return await future
+
+    async def _collect_batch(self, batch: List[Optional[Tuple[Dict, asyncio.Future]]]):
+        """Wait for one record, then gather more into `batch` until the window closes"""
+        loop = asyncio.get_running_loop()
+        batch.append(await self._queue.get())
+        if batch[0] is None:
+            return
+
+        deadline = loop.time() + self.batch_window
+        while len(batch) < self.max_batch_size:
+            # Take whatever is already queued without waiting
+            if not self._queue.empty():
+                item = self._queue.get_nowait()
+            else:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout=remaining)
+                except asyncio.TimeoutError:
+                    break
+            batch.append(item)
+            if item is None:
+                break
+
+    async def _run(self):
+        """Worker loop: collect a batch, commit it, resolve futures"""
+        batch = []
+        try:
+            while True:
+                batch = []
+                await self._collect_batch(batch)
+                stop = batch[-1] is None
+                items = [item for item in batch if item is not None]
+
+                if items:
+                    await self._commit(items)
+
+                if stop:
+                    return
+        finally:
+            self._fail_unresolved(batch)
+
+    def _fail_unresolved(self, batch: List[Optional[Tuple[Dict, asyncio.Future]]]):
+        """Fail the in-flight batch and anything still queued"""
+        while not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+
+        error = RuntimeError("Feedback writer stopped before the record was committed")
+        for item in batch:
+            if item is not None and not item[1].done():
+                item[1].set_exception(error)
+
+    async def _commit(self, items: List[Tuple[Dict, asyncio.Future]]):
+        """Commit a batch, falling back to per-row commits on failure"""
+        records = [record for record, _ in items]
+
+        try:
+            feedback_ids = await asyncio.to_thread(self.db.add_feedback_batch, records)
+        except Exception as e:
+            if len(items) == 1:
+                _, future = items[0]
+                if not future.done():
+                    future.set_exception(e)
+                return
+
+            logger.warning(f"Feedback batch of {len(items)} failed ({e}), retrying rows individually")
+            for item in items:
+                await self._commit([item])
+            return
+
+        self.rows_written += len(items)
+        self.batches_committed += 1
+
+        for (_, future), feedback_id in zip(items, feedback_ids):
+            if not future.done():
+                future.set_result(feedback_id)
+
+    async def close(self):
+        """Flush pending records and stop the worker."""
+        if self._worker is None or self._worker.done():
+            return
+
+        self._closing = True
+        try:
+            await self._queue.put(None)
+            await self._worker
+        finally:
+            self._worker = None
+            self._closing = False
+
+
+# Global writer instance
+feedback_writer = FeedbackBatchWriter(db)
@@ -0,0 +1,284 @@
+"""
+Background Job Queue
+
+Slow requests (context generation through n8n or a large calendar feed)
+are submitted as jobs: submission stores a job record and returns its id
+immediately, and a bounded pool of in-process workers runs the jobs. Each
+upstream gets its own queue and worker count, so a slow upstream cannot
+occupy workers needed by the others, and total concurrency is capped by a
+shared limit. Status and results are kept in the database for
+JOB_RESULT_TTL_S seconds, so any worker process can answer status reads.
+
+Jobs run in the process that accepted them; a job whose process stops
+before it finishes stays 'queued' or 'running' until its record expires.
+
+Author: ALINE Team
+Date: 2025-11-17
+"""
+
+import asyncio
+import logging
+import os
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from service.database import Database, db
+
+logger = logging.getLogger(__name__)
+
+JobHandler = Callable[[Dict[str, Any]], Awaitable[Dict[str, Any]]]
+
+# Statuses after which a job no longer changes
+TERMINAL_STATUSES = ('succeeded', 'failed')
+
+
+class JobQueueFullError(Exception):
+    """Raised on submission when the job backlog is at capacity."""
+
+
+def parse_upstream_limits(spec: str) -> Dict[str, int]:
+    """Parse 'n8n=4,calendar=16' into {'n8n': 4, 'calendar': 16}."""
+    limits = {}
+    for item in filter(None, (part.strip() for part in spec.split(','))):
+        name, _, value = item.partition('=')
+        limits[name.strip()] = max(1, int(value))
+    return limits
+
+
+class JobQueue:
+    """In-process job runner with per-upstream concurrency limits"""
+
+    # Jobs running at once across all upstreams
+    WORKERS = int(os.getenv("JOB_WORKERS", "16"))
+
+    # Concurrent jobs per upstream; unlisted upstreams get DEFAULT_UPSTREAM_LIMIT
+    UPSTREAM_LIMITS = parse_upstream_limits(os.getenv("JOB_UPSTREAM_LIMITS", "n8n=4,calendar=8"))
+    DEFAULT_UPSTREAM_LIMIT = int(os.getenv("JOB_DEFAULT_UPSTREAM_LIMIT", "4"))
+
+    # Queued (not yet running) jobs accepted before submissions are rejected
+    MAX_QUEUED = int(os.getenv("JOB_MAX_QUEUED", "1000"))
+
+    # Seconds a job record (and its result) is kept, and per-job run timeout
+    RESULT_TTL = float(os.getenv("JOB_RESULT_TTL_S", "3600"))
+    JOB_TIMEOUT = float(os.getenv("JOB_TIMEOUT_S", "60"))
+
+    # Poll interval for long-polls on jobs owned by another process
+    POLL_INTERVAL = 0.25
+
+    # Seconds between purges of expired job records
+    PURGE_INTERVAL = 60.0
+
+    def __init__(
+        self,
+        database: Database,
+        workers: Optional[int] = None,
+        upstream_limits: Optional[Dict[str, int]] = None,
+        max_queued: Optional[int] = None,
+        result_ttl: Optional[float] = None,
+        job_timeout: Optional[float] = None
+    ):
+        """
+        Initialize the queue.
+
+        Args:
+            database: Database holding job records
+            workers: Total concurrent jobs (default: WORKERS)
+            upstream_limits: Concurrent jobs per upstream (default: UPSTREAM_LIMITS)
+            max_queued: Backlog limit (default: MAX_QUEUED)
+            result_ttl: Seconds job records are kept (default: RESULT_TTL)
+            job_timeout: Seconds a job may run (default: JOB_TIMEOUT)
+        """
+        self.db = database
+        self.workers = workers or self.WORKERS
+        self.upstream_limits = dict(self.UPSTREAM_LIMITS if upstream_limits is None else upstream_limits)
+        self.max_queued = max_queued or self.MAX_QUEUED
+        self.result_ttl = self.RESULT_TTL if result_ttl is None else result_ttl
+        self.job_timeout = self.JOB_TIMEOUT if job_timeout is None else job_timeout
+
+        self._handlers: Dict[str, Tuple[JobHandler, str]] = {}
+        self._queues: Dict[str, asyncio.Queue] = {}
+        self._workers: Dict[str, list] = {}
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._done: Dict[str, asyncio.Event] = {}
+        self._queued = 0
+        self._running = 0
+        self._last_purge = 0.0
+
+        self.submitted = 0
+        self.succeeded = 0
+        self.failed = 0
+        self.rejected = 0
+
+    def register(self, kind: str, handler: JobHandler, upstream: str) -> None:
+        """
+        Register the coroutine that runs jobs of `kind`.
+
+        Args:
+            kind: Job type name
+            handler: Async callable taking the job params and returning a JSON-serializable dict
+            upstream: Upstream the handler calls, for its concurrency limit
+        """
+        self._handlers[kind] = (handler, upstream)
+
+    async def submit(self, kind: str, params: Dict[str, Any], user_id: Optional[str] = None) -> str:
+        """
+        Queue a job and return its id without waiting for it to run.
+
+        Raises:
+            KeyError: If no handler is registered for `kind`
+            JobQueueFullError: If MAX_QUEUED jobs are already waiting
+        """
+        handler, upstream = self._handlers[kind]
+        if self._queued >= self.max_queued:
+            self.rejected += 1
+            raise JobQueueFullError(f"Job queue is full ({self._queued} waiting)")
+
+        job_id = uuid.uuid4().hex
+        await asyncio.to_thread(self.db.create_job, job_id, kind, user_id, self.result_ttl)
+
+        self._done[job_id] = asyncio.Event()
+        self._queued += 1
+        self.submitted += 1
+        self._queue_for(upstream).put_nowait((job_id, handler, params))
+
+        if time.monotonic() - self._last_purge >= self.PURGE_INTERVAL:
+            self._last_purge = time.monotonic()
+            removed = await asyncio.to_thread(self.db.purge_expired_jobs)
+            if removed:
+                logger.info(f"Purged {removed} expired jobs")
+        return job_id
+
+    def _queue_for(self, upstream: str) -> asyncio.Queue:
+        """Queue for an upstream, starting its workers on first use."""
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.workers)
+        queue = self._queues.get(upstream)
+        if queue is None:
+            queue = self._queues[upstream] = asyncio.Queue()
+            limit = min(self.upstream_limits.get(upstream, self.DEFAULT_UPSTREAM_LIMIT), self.workers)
+            self._workers[upstream] = [
+                asyncio.create_task(self._worker(queue)) for _ in range(limit)
+            ]
+        return queue
+
+    async def _worker(self, queue: asyncio.Queue):
+        """Run jobs from one upstream's queue, holding a shared slot per job."""
+        while True:
+            job_id, handler, params = await queue.get()
+            started = False
+            try:
+                async with self._slots:
+                    started = True
+                    self._queued -= 1
+                    self._running += 1
+                    try:
+                        await self._run(job_id, handler, params)
+                    finally:
+                        self._running -= 1
+            except asyncio.CancelledError:
+                if not started:
+                    # Stopped while waiting for a slot: the job never ran
+                    await asyncio.to_thread(
+                        self.db.update_job, job_id, 'failed', None, "Service shut down before the job ran",
+                        self.result_ttl
+                    )
+                raise
+            finally:
+                queue.task_done()
+
+    async def _run(self, job_id: str, handler: JobHandler, params: Dict[str, Any]):
+        """Run one job and store its outcome."""
+        try:
+            await asyncio.to_thread(self.db.update_job, job_id, 'running')
+            result = await asyncio.wait_for(handler(params), self.job_timeout)
+        except asyncio.CancelledError:
+            await asyncio.to_thread(self.db.update_job, job_id, 'failed', None, "Job cancelled", self.result_ttl)
+            raise
+        except asyncio.TimeoutError:
+            self.failed += 1
+            await asyncio.to_thread(
+                self.db.update_job, job_id, 'failed', None,
+                f"Job timed out after {self.job_timeout:g}s", self.result_ttl
+            )
+        except Exception as e:
+            self.failed += 1
+            logger.warning(f"Job {job_id} failed: {e}")
+            await asyncio.to_thread(self.db.update_job, job_id, 'failed', None, str(e), self.result_ttl)
+        else:
+            self.succeeded += 1
+            await asyncio.to_thread(self.db.update_job, job_id, 'succeeded', result, None, self.result_ttl)
+        finally:
+            event = self._done.pop(job_id, None)
+            if event is not None:
+                event.set()
+
+    async def get(self, job_id: str, wait: float = 0.0) -> Optional[Dict]:
+        """
+        Current job record, optionally long-polling until it finishes.
+
+        Args:
+            job_id: Job identifier
+            wait: Seconds to wait for a terminal status (0 = return immediately)
+
+        Returns:
+            Job record from Database.get_job, or None if unknown or expired
+        """
+        job = await asyncio.to_thread(self.db.get_job, job_id)
+        if job is None or job['status'] in TERMINAL_STATUSES or wait <= 0:
+            return job
+
+        deadline = time.monotonic() + wait
+        event = self._done.get(job_id)
+        if event is not None:
+            # Owned by this process: wake as soon as it finishes
+            try:
+                await asyncio.wait_for(event.wait(), wait)
+            except asyncio.TimeoutError:
+                pass
+            return await asyncio.to_thread(self.db.get_job, job_id)
+
+        while time.monotonic() < deadline:
+            await asyncio.sleep(min(self.POLL_INTERVAL, max(deadline - time.monotonic(), 0)))
+            job = await asyncio.to_thread(self.db.get_job, job_id)
+            if job is None or job['status'] in TERMINAL_STATUSES:
+                break
+        return job
+
+    def stats(self) -> Dict:
+        """Queue depth and outcome counters."""
+        return {
+            'queued': self._queued,
+            'running': self._running,
+            'submitted': self.submitted,
+            'succeeded': self.succeeded,
+            'failed': self.failed,
+            'rejected': self.rejected
+        }
+
+    async def stop(self):
+        """Cancel the workers; running and still-queued jobs are recorded as failed."""
+        tasks = [task for workers in self._workers.values() for task in workers]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+        for queue in self._queues.values():
+            while not queue.empty():
+                job_id, _, _ = queue.get_nowait()
+                await asyncio.to_thread(
+                    self.db.update_job, job_id, 'failed', None, "Service shut down before the job ran",
+                    self.result_ttl
+                )
+        for event in self._done.values():
+            event.set()
+
+        self._queues.clear()
+        self._workers.clear()
+        self._done.clear()
+        self._slots = None
+        self._queued = 0
+
+
+# Global queue instance
+job_queue = JobQueue(db)
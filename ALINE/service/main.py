@@ -7,6 +7,10 @@ Provides endpoints for:
 - /risk/daily - Daily migraine risk prediction
 - /posterior/hourly - Hourly posterior distributions
 - /policy/topk - Top-k hour recommendations
+- /policy/feature-queries - Feature-level measurement nudges
+- /risk/what-if - Batched counterfactual risk
+- /features/hourly, /risk/daily/{user_id} - Stored features and batch-scored risk
+- /risk/sensitivity/{user_id} - Cached what-if sensitivity surface
 
 Author: ALINE Team
 Date: 2025-11-15
@@ -16,18 +20,28 @@ import sys
 from pathlib import Path
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
-from fastapi import FastAPI, HTTPException, Request
+from fastapi import FastAPI, HTTPException, Request, Query
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from contextlib import asynccontextmanager
+import asyncio
+import json
 import torch
 import yaml
 import logging
-from datetime import datetime
-from typing import List
+from datetime import date, datetime, timedelta, timezone
+from typing import List, Optional
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 
 from models.aline import SimpleALINE
-from models.policy_utils import compute_priority_scores, select_topk_hours
+from models.counterfactual import counterfactual_risk
+from models.policy_utils import (
+    compute_priority_scores,
+    feature_information_gain,
+    format_feature_queries,
+    rank_feature_queries,
+    select_topk_hours
+)
 from service.schemas import (
     HealthResponse,
     DailyRiskRequest,
@@ -38,11 +52,25 @@ from service.schemas import (
     PolicyRequest,
     PolicyResponse,
     SelectedHour,
+    FeatureQueryRequest,
+    FeatureQueryResponse,
+    TemporalQuery,
+    FeatureQuery,
+    WhatIfRequest,
+    WhatIfResponse,
+    WhatIfResult,
+    RiskEstimate,
+    HourlyFeaturesRequest,
+    HourlyFeaturesResponse,
+    StoredRiskResponse,
+    SensitivitySurfaceResponse,
     CalendarConnectionRequest,
     CalendarConnectionResponse,
     CalendarStatusResponse,
     ContextGenerationRequest,
     ContextGenerationResponse,
+    JobSubmitResponse,
+    JobStatusResponse,
     FeedbackRequest,
     FeedbackResponse,
     AccuracyResponse,
@@ -50,7 +78,12 @@ from service.schemas import (
     FeedbackHistoryResponse
 )
 from service.database import db
-from service.calendar import calendar_service
+from service.feedback_writer import feedback_writer
+from service.feedback_import import FeedbackImporter, iter_ndjson
+from service.calendar import CalendarFeedError, calendar_service
+from service.jobs import JobQueueFullError, job_queue
+from service.resilience import CircuitOpenError
+from service.risk_batch import RiskBatchScorer, SensitivityGrid, interpolate_surface
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -171,12 +204,23 @@ async def lifespan(app: FastAPI):
         logger.error(f"✗ Failed to load config: {e}", exc_info=True)
         raise
     
+    # Keep active users' weather warm (needs an API key to be useful)
+    if weather_service.API_KEY:
+        weather_prefetcher.start()
+    
     yield
     
     # Shutdown (cleanup if needed)
     logger.info("Shutting down ALINE service")
+    await job_queue.stop()
+    logger.info("✓ Job workers stopped")
+    await weather_prefetcher.stop()
     await weather_service.close()
     logger.info("✓ Weather service closed")
+    await calendar_service.close()
+    logger.info("✓ Calendar HTTP client closed")
+    await feedback_writer.close()
+    logger.info("✓ Feedback writer flushed")
 
 
 # Initialize FastAPI app with lifespan
@@ -430,6 +474,301 @@ async def policy_topk(request: PolicyRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def configured_feature_names(n_features: int) -> List[str]:
+    """Configured feature names, padded with Feature_i for inputs beyond them."""
+    names = (app_state['config'] or {}).get('features', {}).get('feature_names', [])[:n_features]
+    return names + [f"Feature_{i}" for i in range(len(names), n_features)]
+
+
+@app.post("/policy/feature-queries", response_model=FeatureQueryResponse)
+async def policy_feature_queries(request: FeatureQueryRequest):
+    """
+    Recommend which features to measure, and when, by information gain.
+
+    Gains are |∂risk/∂feature| × risk(1 - risk), restricted to missing
+    values when an availability mask is given.
+    """
+    ensure_model_loaded()
+
+    if not app_state['model_loaded']:
+        raise HTTPException(status_code=503, detail="Model not loaded")
+
+    model = app_state['model']
+    for name, rows in (('features', request.features), ('availability', request.availability)):
+        if rows is None:
+            continue
+        if len(rows) != 24:
+            raise HTTPException(status_code=400, detail=f"Expected 24 hours of {name}, got {len(rows)}")
+        for i, hour in enumerate(rows):
+            if len(hour) != model.in_dim:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Hour {i}: Expected {model.in_dim} {name} values, got {len(hour)}"
+                )
+
+    try:
+        x = torch.FloatTensor(request.features).unsqueeze(0).to(app_state['device'])
+        availability = None
+        if request.availability is not None:
+            availability = torch.FloatTensor(request.availability).unsqueeze(0).to(app_state['device'])
+
+        gains, risk = feature_information_gain(
+            model, x, app_state['migraine_weights'], app_state['migraine_bias'], availability
+        )
+        queries = format_feature_queries(
+            rank_feature_queries(gains, request.k_temporal, request.k_features),
+            configured_feature_names(model.in_dim)
+        )[0]
+    except Exception as e:
+        logger.error(f"Error in policy_feature_queries: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+    return FeatureQueryResponse(
+        user_id=request.user_id,
+        mean_probability=risk[0].item(),
+        temporal_queries=[TemporalQuery(**query) for query in queries['temporal_queries']],
+        feature_queries=[FeatureQuery(**query) for query in queries['feature_queries']],
+        timestamp=datetime.now().isoformat()
+    )
+
+
+def resolve_feature(feature, n_features: int) -> int:
+    """Feature index from an index or a configured feature name (400 if unknown)."""
+    if isinstance(feature, int):
+        index = feature
+    else:
+        names = (app_state['config'] or {}).get('features', {}).get('feature_names', [])
+        if feature not in names:
+            raise HTTPException(status_code=400, detail=f"Unknown feature '{feature}'")
+        index = names.index(feature)
+    if not 0 <= index < n_features:
+        raise HTTPException(status_code=400, detail=f"Feature index {index} is not in [0, {n_features})")
+    return index
+
+
+@app.post("/risk/what-if", response_model=WhatIfResponse)
+async def risk_what_if(request: WhatIfRequest):
+    """
+    Compare the daily risk of a base window with perturbed variants.
+
+    Each scenario's perturbations (set/scale/add on feature × hour ranges)
+    are applied in order; all variants are scored in one batched forward.
+    """
+    ensure_model_loaded()
+
+    if not app_state['model_loaded']:
+        raise HTTPException(status_code=503, detail="Model not loaded")
+
+    model = app_state['model']
+    if len(request.features) != 24:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Expected 24 hours of features, got {len(request.features)}"
+        )
+    for i, hour_features in enumerate(request.features):
+        if len(hour_features) != model.in_dim:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Hour {i}: Expected {model.in_dim} features, got {len(hour_features)}"
+            )
+
+    scenarios = []
+    for scenario in request.scenarios:
+        perturbations = []
+        for p in scenario.perturbations:
+            if p.hour_end <= p.hour_start:
+                raise HTTPException(status_code=400, detail="hour_end must be greater than hour_start")
+            features = [resolve_feature(f, model.in_dim) for f in p.features]
+            perturbations.append((p.op, features, p.hour_start, p.hour_end, p.value))
+        scenarios.append(perturbations)
+
+    try:
+        base = torch.FloatTensor(request.features).to(app_state['device'])
+        risk = counterfactual_risk(
+            model, base, scenarios, app_state['migraine_weights'], app_state['migraine_bias']
+        )
+        mean, lower, upper, delta = (risk[key].tolist() for key in ('mean', 'lower', 'upper', 'delta'))
+    except Exception as e:
+        logger.error(f"Error in risk_what_if: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+    return WhatIfResponse(
+        user_id=request.user_id,
+        baseline=RiskEstimate(mean_probability=mean[0], lower_bound=lower[0], upper_bound=upper[0]),
+        scenarios=[
+            WhatIfResult(
+                name=scenario.name,
+                mean_probability=mean[n + 1],
+                lower_bound=lower[n + 1],
+                upper_bound=upper[n + 1],
+                delta=delta[n]
+            )
+            for n, scenario in enumerate(request.scenarios)
+        ],
+        timestamp=datetime.now().isoformat()
+    )
+
+
+# ============================================================================
+# Stored Features and Batch-Scored Risk (scripts/score_risk.py)
+# ============================================================================
+
+@app.post("/features/hourly", response_model=HourlyFeaturesResponse)
+async def store_hourly_features(request: HourlyFeaturesRequest):
+    """
+    Store a user's hourly model inputs for the nightly batch scorer.
+
+    Hours already stored for the user are replaced.
+    """
+    widths = {len(row.features) for row in request.hours}
+    if len(widths) != 1:
+        raise HTTPException(status_code=400, detail="All hours must have the same number of features")
+    if app_state['model'] is not None and widths != {app_state['model'].in_dim}:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Expected {app_state['model'].in_dim} features per hour, got {widths.pop()}"
+        )
+
+    hours = []
+    for row in request.hours:
+        hour_start = row.hour_start if row.hour_start.tzinfo else row.hour_start.replace(tzinfo=timezone.utc)
+        if (hour_start.minute, hour_start.second, hour_start.microsecond) != (0, 0, 0):
+            raise HTTPException(status_code=400, detail=f"hour_start {row.hour_start.isoformat()} is not on the hour")
+        hours.append((int(hour_start.timestamp()), row.features))
+
+    try:
+        stored = db.save_hourly_features(request.user_id, hours)
+    except Exception as e:
+        logger.error(f"Error storing hourly features: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to store hourly features: {str(e)}")
+
+    return HourlyFeaturesResponse(user_id=request.user_id, stored=stored)
+
+
+def prediction_day(value: Optional[str]) -> date:
+    """Day of a stored prediction from a YYYY-MM-DD query value (default: tomorrow, UTC)."""
+    if not value:
+        return datetime.now(timezone.utc).date() + timedelta(days=1)
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="date must be in YYYY-MM-DD format")
+
+
+@app.get("/risk/daily/{user_id}", response_model=StoredRiskResponse)
+async def get_stored_risk(user_id: str, date: Optional[str] = None):
+    """
+    Read the daily risk written by the nightly batch scorer.
+
+    Args:
+        user_id: User identifier
+        date: Day of the prediction, YYYY-MM-DD (default: tomorrow, UTC)
+
+    Example:
+        GET /risk/daily/user123?date=2025-11-18
+    """
+    day = prediction_day(date)
+    try:
+        prediction = db.get_risk_prediction(user_id, day.isoformat())
+    except Exception as e:
+        logger.error(f"Error reading stored risk: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to read stored risk: {str(e)}")
+
+    if prediction is None:
+        raise HTTPException(status_code=404, detail=f"No stored risk for user {user_id} on {day.isoformat()}")
+
+    return StoredRiskResponse(
+        user_id=user_id,
+        date=day.isoformat(),
+        mean_probability=prediction['mean_probability'],
+        lower_bound=prediction['lower_bound'],
+        upper_bound=prediction['upper_bound'],
+        window_end=datetime.fromtimestamp(prediction['window_end'], timezone.utc).isoformat(),
+        generated_at=datetime.fromtimestamp(prediction['generated_at'], timezone.utc).isoformat()
+    )
+
+
+@app.get("/risk/sensitivity/{user_id}", response_model=SensitivitySurfaceResponse)
+async def get_sensitivity_surface(
+    user_id: str,
+    date: Optional[str] = None,
+    feature: Optional[str] = None,
+    value: Optional[float] = None
+):
+    """
+    What-if sensitivity surface for a user and day, for interactive sliders.
+
+    Served from the surface stored with the day's prediction. If there is
+    none (not scored yet, or dropped because new hourly features arrived),
+    the prediction and surface are recomputed from the stored features in
+    one batched forward and stored again.
+
+    Args:
+        user_id: User identifier
+        date: Day of the prediction, YYYY-MM-DD (default: tomorrow, UTC)
+        feature, value: Optionally also return the risk interpolated at
+            `value` of `feature`
+
+    Example:
+        GET /risk/sensitivity/user123?date=2025-11-18&feature=Caffeine%20Intake%20(mg)&value=-0.4
+    """
+    day = prediction_day(date)
+    if (feature is None) != (value is None):
+        raise HTTPException(status_code=400, detail="feature and value must be given together")
+
+    prediction = db.get_risk_prediction(user_id, day.isoformat())
+    cached = prediction is not None and prediction['sensitivity'] is not None
+    if not cached:
+        ensure_model_loaded()
+        if not app_state['model_loaded']:
+            raise HTTPException(status_code=503, detail="Model not loaded")
+        grid = SensitivityGrid.from_config(app_state['config'])
+        if grid is None:
+            raise HTTPException(status_code=404, detail="Sensitivity surfaces are not configured")
+
+        try:
+            scorer = RiskBatchScorer(
+                db, app_state['model'], app_state['migraine_weights'], app_state['migraine_bias'], day,
+                sensitivity=grid
+            )
+            predictions = scorer.score_users([user_id])
+            if predictions:
+                db.save_risk_predictions(predictions)
+        except Exception as e:
+            logger.error(f"Error computing sensitivity surface: {e}")
+            raise HTTPException(status_code=500, detail=f"Failed to compute sensitivity surface: {str(e)}")
+
+        if not predictions:
+            raise HTTPException(
+                status_code=404,
+                detail=f"No full 24-hour window of stored features for user {user_id} before {day.isoformat()}"
+            )
+        prediction = predictions[0]
+
+    surface = prediction['sensitivity']
+    lookup = None
+    if feature is not None:
+        try:
+            lookup = interpolate_surface(surface, feature, value)
+        except KeyError:
+            raise HTTPException(status_code=400, detail=f"The surface does not cover feature '{feature}'")
+
+    return SensitivitySurfaceResponse(
+        user_id=user_id,
+        date=day.isoformat(),
+        baseline=RiskEstimate(
+            mean_probability=prediction['mean_probability'],
+            lower_bound=prediction['lower_bound'],
+            upper_bound=prediction['upper_bound']
+        ),
+        features=surface['features'],
+        grid=surface['grid'],
+        risk=surface['risk'],
+        cached=cached,
+        lookup=lookup
+    )
+
+
 # ============================================================================
 # Calendar Integration Endpoints (Ticket 019)
 # ============================================================================
@@ -520,24 +859,31 @@ async def delete_calendar_connection(user_id: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@app.post("/aline/generate-context", response_model=ContextGenerationResponse)
-async def generate_context(request: ContextGenerationRequest):
+async def build_context(request: ContextGenerationRequest) -> ContextGenerationResponse:
     """
     Generate context posteriors from calendar and priors
     
-    Sends calendar URL and prior distributions to n8n workflow,
-    which analyzes calendar events and returns updated posteriors.
+    By default the calendar is analysed in-process: the feed's parsed event
+    index is cached, the requested day is bucketed into hourly load
+    features, and the priors are updated from them. With
+    CALENDAR_CONTEXT_ENGINE=n8n the calendar URL and priors are sent to the
+    n8n workflow instead.
+    
+    Raises:
+        HTTPException: For missing connections and invalid input
+        CircuitOpenError: If n8n is short-circuited
+        CalendarFeedError: If the feed cannot be fetched
     """
-    try:
-        # Get user's calendar connection
-        connection = db.get_calendar_connection(request.userId)
-        
-        if not connection:
-            raise HTTPException(
-                status_code=404,
-                detail="No calendar connected for this user"
-            )
-        
+    # Get user's calendar connection
+    connection = db.get_calendar_connection(request.userId)
+    
+    if not connection:
+        raise HTTPException(
+            status_code=404,
+            detail="No calendar connected for this user"
+        )
+    
+    if calendar_service.CONTEXT_ENGINE == 'n8n':
         # Get n8n webhook URL from config
         n8n_url = app_state['config'].get('n8n', {}).get('webhook_url')
         if not n8n_url:
@@ -553,31 +899,148 @@ async def generate_context(request: ContextGenerationRequest):
             priors=request.priors,
             n8n_webhook_url=n8n_url
         )
+    else:
+        try:
+            tz = ZoneInfo(request.timezone) if request.timezone else timezone.utc
+            day = date.fromisoformat(request.date) if request.date else None
+        except (ZoneInfoNotFoundError, ValueError) as e:
+            raise HTTPException(status_code=400, detail=f"Invalid date or timezone: {e}")
         
-        # Update verification timestamp
-        db.update_verification_time(request.userId)
-        
-        return ContextGenerationResponse(
-            userId=request.userId,
-            posteriors=result.get('posteriors', {}),
-            features=result.get('features', []),
-            timestamp=datetime.now().isoformat()
+        result = await calendar_service.generate_context_local(
+            user_id=request.userId,
+            calendar_url=connection['normalizedUrl'],
+            priors=request.priors,
+            day=day,
+            tz=tz
         )
     
+    # Update verification timestamp
+    db.update_verification_time(request.userId)
+    
+    return ContextGenerationResponse(
+        userId=request.userId,
+        posteriors=result.get('posteriors', {}),
+        features=result.get('features', []),
+        calendarLoad=result.get('calendarLoad'),
+        timestamp=datetime.now().isoformat()
+    )
+
+
+@app.post("/aline/generate-context", response_model=ContextGenerationResponse)
+async def generate_context(request: ContextGenerationRequest):
+    """
+    Generate context posteriors from calendar and priors (synchronous)
+    
+    Prefer POST /aline/generate-context/jobs when the n8n engine is used,
+    so the request does not wait on the workflow.
+    """
+    try:
+        return await build_context(request)
+    
     except HTTPException:
         raise
+    except CircuitOpenError:
+        raise HTTPException(
+            status_code=503,
+            detail="Context generation is temporarily unavailable, please retry shortly"
+        )
+    except CalendarFeedError as e:
+        raise HTTPException(status_code=502, detail=str(e))
     except Exception as e:
         logger.error(f"Error generating context: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+async def run_context_job(params: dict) -> dict:
+    """Job handler for 'generate-context': same work as the endpoint, result as a dict."""
+    try:
+        response = await build_context(ContextGenerationRequest(**params))
+    except HTTPException as e:
+        raise RuntimeError(e.detail)
+    except CircuitOpenError:
+        raise RuntimeError("Context generation is temporarily unavailable, please retry shortly")
+    return response.model_dump()
+
+
+job_queue.register(
+    'generate-context',
+    run_context_job,
+    upstream='n8n' if calendar_service.CONTEXT_ENGINE == 'n8n' else 'calendar'
+)
+
+
+@app.post("/aline/generate-context/jobs", response_model=JobSubmitResponse, status_code=202)
+async def submit_context_job(request: ContextGenerationRequest):
+    """
+    Queue context generation and return a job id immediately
+    
+    Poll GET /aline/jobs/{job_id} (optionally with `wait` to long-poll)
+    for the result, which has the same shape as /aline/generate-context.
+    """
+    try:
+        if not db.get_calendar_connection(request.userId):
+            raise HTTPException(status_code=404, detail="No calendar connected for this user")
+        
+        job_id = await job_queue.submit('generate-context', request.model_dump(), user_id=request.userId)
+        return JobSubmitResponse(jobId=job_id, status='queued', statusUrl=f"/aline/jobs/{job_id}")
+    
+    except HTTPException:
+        raise
+    except JobQueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+    except Exception as e:
+        logger.error(f"Error submitting context job: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/aline/jobs/{job_id}", response_model=JobStatusResponse)
+async def get_job_status(
+    job_id: str,
+    wait: float = Query(0.0, ge=0.0, le=30.0, description="Seconds to long-poll for completion")
+):
+    """
+    Get a job's status, and its result once it has finished
+    """
+    try:
+        job = await job_queue.get(job_id, wait=wait)
+    except Exception as e:
+        logger.error(f"Error reading job {job_id}: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found or expired")
+    
+    return JobStatusResponse(
+        jobId=job['id'],
+        kind=job['kind'],
+        status=job['status'],
+        result=job['result'],
+        error=job['error'],
+        createdAt=datetime.fromtimestamp(job['created_at']).isoformat(),
+        updatedAt=datetime.fromtimestamp(job['updated_at']).isoformat()
+    )
+
+
 # ============================================================================
 # Weather Endpoints (Ticket 023)
 # ============================================================================
 
 from service.weather import weather_service
+from service.weather_prefetch import WeatherPrefetcher
 from pydantic import BaseModel, Field
 
+weather_prefetcher = WeatherPrefetcher(weather_service, db)
+
+
+def record_user_location(user_id: Optional[str], lat: float, lon: float):
+    """Remember where a user asked for weather so the prefetcher can warm it."""
+    if not user_id:
+        return
+    try:
+        db.record_user_location(user_id, lat, lon)
+    except Exception as e:
+        logger.warning(f"Failed to record location for {user_id}: {e}")
+
 
 class WeatherResponse(BaseModel):
     """Current weather conditions response"""
@@ -590,9 +1053,9 @@ class WeatherResponse(BaseModel):
 
 class PressureChangeResponse(BaseModel):
     """Barometric pressure change response"""
-    pressure_change: float = Field(..., description="Pressure change in hPa")
-    trend: str = Field(..., description="Trend: rising/falling/stable")
-    significance: str = Field(..., description="Significance: low/moderate/high")
+    pressure_change: Optional[float] = Field(..., description="Pressure change in hPa (null until enough history)")
+    trend: str = Field(..., description="Trend: rising/falling/stable/unknown")
+    significance: str = Field(..., description="Significance: low/moderate/high/unknown")
 
 
 class ForecastResponse(BaseModel):
@@ -601,13 +1064,14 @@ class ForecastResponse(BaseModel):
 
 
 @app.get("/weather/current", response_model=WeatherResponse)
-async def get_current_weather(lat: float, lon: float):
+async def get_current_weather(lat: float, lon: float, user_id: Optional[str] = None):
     """
     Get current weather conditions for location.
     
     Args:
         lat: Latitude (-90 to 90)
         lon: Longitude (-180 to 180)
+        user_id: Optional user identifier; enables scheduled prefetch for this location
     
     Returns:
         Current weather data including pressure, temperature, humidity, and AQI
@@ -615,6 +1079,7 @@ async def get_current_weather(lat: float, lon: float):
     Example:
         GET /weather/current?lat=40.7128&lon=-74.0060
     """
+    record_user_location(user_id, lat, lon)
     try:
         weather = await weather_service.get_current_weather(lat, lon)
         return WeatherResponse(
@@ -627,7 +1092,12 @@ async def get_current_weather(lat: float, lon: float):
 
 
 @app.get("/weather/pressure_change", response_model=PressureChangeResponse)
-async def get_pressure_change(lat: float, lon: float, hours_ago: int = 3):
+async def get_pressure_change(
+    lat: float,
+    lon: float,
+    hours_ago: int = 3,
+    user_id: Optional[str] = None
+):
     """
     Get barometric pressure change over last N hours.
     
@@ -635,6 +1105,7 @@ async def get_pressure_change(lat: float, lon: float, hours_ago: int = 3):
         lat: Latitude
         lon: Longitude
         hours_ago: Number of hours to look back (default: 3)
+        user_id: Optional user identifier; enables scheduled prefetch for this location
     
     Returns:
         Pressure change data with trend and significance
@@ -642,11 +1113,14 @@ async def get_pressure_change(lat: float, lon: float, hours_ago: int = 3):
     Example:
         GET /weather/pressure_change?lat=40.7128&lon=-74.0060&hours_ago=3
     """
+    record_user_location(user_id, lat, lon)
     try:
         delta = await weather_service.get_pressure_change(lat, lon, hours_ago)
         
         # Classify trend and significance
-        if abs(delta) < 1:
+        if delta is None:
+            trend, significance = "unknown", "unknown"
+        elif abs(delta) < 1:
             trend, significance = "stable", "low"
         elif abs(delta) < 3:
             trend = "rising" if delta > 0 else "falling"
@@ -666,7 +1140,12 @@ async def get_pressure_change(lat: float, lon: float, hours_ago: int = 3):
 
 
 @app.get("/weather/forecast", response_model=ForecastResponse)
-async def get_weather_forecast(lat: float, lon: float, hours: int = 24):
+async def get_weather_forecast(
+    lat: float,
+    lon: float,
+    hours: int = 24,
+    user_id: Optional[str] = None
+):
     """
     Get hourly weather forecast.
     
@@ -674,6 +1153,7 @@ async def get_weather_forecast(lat: float, lon: float, hours: int = 24):
         lat: Latitude
         lon: Longitude
         hours: Number of hours to forecast (default: 24, max: 48)
+        user_id: Optional user identifier; enables scheduled prefetch for this location
     
     Returns:
         Hourly forecast data
@@ -681,6 +1161,7 @@ async def get_weather_forecast(lat: float, lon: float, hours: int = 24):
     Example:
         GET /weather/forecast?lat=40.7128&lon=-74.0060&hours=24
     """
+    record_user_location(user_id, lat, lon)
     try:
         hours = min(hours, 48)  # Cap at 48 hours
         forecast = await weather_service.get_forecast(lat, lon, hours)
@@ -690,6 +1171,52 @@ async def get_weather_forecast(lat: float, lon: float, hours: int = 24):
         raise HTTPException(status_code=500, detail=f"Failed to fetch forecast: {str(e)}")
 
 
+@app.get("/weather/features")
+async def get_environment_features(lat: float, lon: float, user_id: Optional[str] = None):
+    """
+    Get environment model features for a location.
+    
+    Args:
+        lat: Latitude
+        lon: Longitude
+        user_id: Optional user identifier; enables scheduled prefetch for this location
+    
+    Returns:
+        Feature values keyed by model feature name ("Barometric Pressure
+        Change", "Air Quality Index") plus the observed pressure history
+    
+    Example:
+        GET /weather/features?lat=40.7128&lon=-74.0060
+    """
+    record_user_location(user_id, lat, lon)
+    try:
+        features = await weather_service.get_environment_features(lat, lon)
+        return {
+            "features": features,
+            "pressure_history": weather_service.get_pressure_history(lat, lon)
+        }
+    except Exception as e:
+        logger.error(f"Error computing environment features: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to compute features: {str(e)}")
+
+
+@app.get("/weather/cache_stats")
+async def get_weather_cache_stats():
+    """
+    Get weather cache metrics.
+    
+    Returns:
+        Cache size, hit rate, evictions/expirations, upstream call counters
+        and the last prefetch run summary
+    
+    Example:
+        GET /weather/cache_stats
+    """
+    stats = weather_service.cache_stats()
+    stats['last_prefetch'] = weather_prefetcher.last_run
+    return stats
+
+
 # ============================================================================
 # FEEDBACK ENDPOINTS (Ticket 026)
 # ============================================================================
@@ -718,8 +1245,8 @@ async def submit_feedback(request: FeedbackRequest):
         # TODO: Retrieve prediction for that date if exists
         predicted_prob = None  # Would query from prediction history
         
-        # Store feedback
-        feedback_id = db.add_feedback(
+        # Store feedback (group-committed with concurrent submissions)
+        feedback_id = await feedback_writer.submit(
             user_id=request.user_id,
             date=request.date,
             had_migraine=request.had_migraine,
@@ -744,6 +1271,78 @@ async def submit_feedback(request: FeedbackRequest):
         raise HTTPException(status_code=500, detail=f"Failed to submit feedback: {str(e)}")
 
 
+@app.post("/feedback/bulk")
+async def bulk_import_feedback(
+    request: Request,
+    chunk_size: int = Query(FeedbackImporter.DEFAULT_CHUNK_SIZE, ge=1, le=50_000)
+):
+    """
+    Bulk-import historical feedback.
+    
+    Accepts either a JSON array of rows or an NDJSON stream
+    (Content-Type: application/x-ndjson), with the same fields as
+    POST /feedback plus an optional predicted_risk. Rows are written in
+    chunked transactions with INSERT OR REPLACE semantics.
+    
+    Returns:
+        NDJSON stream of events: one "error" event per rejected row,
+        a "progress" event after each chunk, and a final "summary"
+    
+    Example:
+        POST /feedback/bulk
+        {"user_id": "user123", "date": "2025-11-14", "had_migraine": false}
+        {"user_id": "user123", "date": "2025-11-15", "had_migraine": true, "severity": 7}
+    """
+    importer = FeedbackImporter(db, chunk_size=chunk_size)
+    content_type = request.headers.get('content-type', '').lower()
+    
+    if 'ndjson' in content_type or 'jsonlines' in content_type:
+        # Read the body before returning: once StreamingResponse starts, its
+        # disconnect listener owns receive() and the body would never arrive
+        ndjson_rows = [row async for row in iter_ndjson(request.stream())]
+        
+        async def iter_lines():
+            for row in ndjson_rows:
+                yield row
+        
+        rows = iter_lines()
+    else:
+        try:
+            payload = json.loads(await request.body())
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Body must be a JSON array or NDJSON stream")
+        if not isinstance(payload, list):
+            raise HTTPException(status_code=400, detail="Body must be a JSON array or NDJSON stream")
+        
+        async def iter_array():
+            for row_number, raw in enumerate(payload, start=1):
+                yield row_number, raw, None
+        
+        rows = iter_array()
+    
+    async def events():
+        async for row_number, raw, error in rows:
+            if error:
+                row_events = importer.add_error(row_number, error)
+            else:
+                row_events = importer.add(raw, row_number)
+            for event in row_events:
+                yield json.dumps(event) + "\n"
+            
+            if importer.full:
+                for event in await asyncio.to_thread(importer.flush):
+                    yield json.dumps(event) + "\n"
+        
+        for event in await asyncio.to_thread(importer.flush):
+            yield json.dumps(event) + "\n"
+        
+        summary = importer.summary()
+        logger.info(f"Bulk feedback import finished: {summary}")
+        yield json.dumps(summary) + "\n"
+    
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
+
 @app.get("/user/{user_id}/accuracy", response_model=AccuracyResponse)
 async def get_user_accuracy(user_id: str, window_days: int = 30):
     """
@@ -783,22 +1382,39 @@ async def get_user_accuracy(user_id: str, window_days: int = 30):
 
 
 @app.get("/user/{user_id}/feedback_history", response_model=FeedbackHistoryResponse)
-async def get_feedback_history(user_id: str, limit: int = 30):
+async def get_feedback_history(
+    user_id: str,
+    limit: int = Query(30, ge=1, le=365),
+    cursor: Optional[str] = None
+):
     """
     Get user's feedback history with predictions vs. outcomes.
     
     Args:
         user_id: User identifier
         limit: Maximum number of records to return (default: 30)
+        cursor: `next_cursor` from the previous page (a feedback_date);
+                omit for the most recent page
     
     Returns:
-        FeedbackHistoryResponse with list of feedback items
+        FeedbackHistoryResponse with list of feedback items and the
+        cursor for the next page (null on the last page)
     
     Example:
         GET /user/user123/feedback_history?limit=30
+        GET /user/user123/feedback_history?limit=30&cursor=2025-10-17
     """
+    if cursor is not None:
+        try:
+            datetime.strptime(cursor, '%Y-%m-%d')
+        except ValueError:
+            raise HTTPException(status_code=400, detail="cursor must be a date in YYYY-MM-DD format")
+    
     try:
-        history = db.get_user_feedback_history(user_id, limit)
+        # Fetch one extra row to know whether another page exists
+        history = db.get_user_feedback_history(user_id, limit + 1, before=cursor)
+        has_more = len(history) > limit
+        history = history[:limit]
         
         formatted_history = []
         for record in history:
@@ -818,7 +1434,10 @@ async def get_feedback_history(user_id: str, limit: int = 30):
                 correct=correct
             ))
         
-        return FeedbackHistoryResponse(history=formatted_history)
+        return FeedbackHistoryResponse(
+            history=formatted_history,
+            next_cursor=history[-1]['feedback_date'] if has_more else None
+        )
     except Exception as e:
         logger.error(f"Error getting feedback history: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to get feedback history: {str(e)}")
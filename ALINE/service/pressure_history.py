@@ -0,0 +1,202 @@
+"""
+Barometric Pressure History
+
+Per-location ring buffers of observed pressure, one slot per hour, filled
+from every weather payload the service sees. N-hour changes are computed
+locally in O(1) instead of costing an upstream call, and use real past
+observations rather than forecast values.
+
+PressureStore persists the observations to SQLite (next to the weather
+payload tier), so a restarted or newly started worker rebuilds the
+history instead of waiting hours for it to refill.
+
+Author: ALINE Team
+Date: 2025-11-17
+"""
+
+import logging
+import sqlite3
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Hashable, List, Optional, Tuple
+
+from service.cache import MISSING, LRUCache
+
+logger = logging.getLogger(__name__)
+
+SECONDS_PER_HOUR = 3600
+
+
+class PressureRingBuffer:
+    """Fixed-size hourly pressure series for one location."""
+
+    def __init__(self, hours: int):
+        self.size = hours
+        self.slot_hours: List[Optional[int]] = [None] * hours
+        self.pressures: List[float] = [0.0] * hours
+        self.latest_hour: Optional[int] = None
+
+    def record(self, hour: int, pressure: float) -> None:
+        """Store the observation for `hour` (later readings in the same hour win)."""
+        slot = hour % self.size
+        self.slot_hours[slot] = hour
+        self.pressures[slot] = pressure
+        if self.latest_hour is None or hour > self.latest_hour:
+            self.latest_hour = hour
+
+    def at(self, hour: int) -> Optional[float]:
+        """Pressure observed during `hour`, or None if that hour was not seen."""
+        slot = hour % self.size
+        return self.pressures[slot] if self.slot_hours[slot] == hour else None
+
+    def series(self) -> List[Tuple[int, float]]:
+        """Recorded `(hour, pressure)` pairs, oldest first."""
+        return sorted(
+            (hour, pressure) for hour, pressure in zip(self.slot_hours, self.pressures)
+            if hour is not None
+        )
+
+
+class PressureHistory:
+    """
+    Bounded set of pressure ring buffers keyed by location (weather grid cell).
+
+    Lookups tolerate a missing reading at the exact past hour by using the
+    neighbouring hour, which keeps deltas available when traffic (and so
+    fetches) skipped an hour.
+    """
+
+    def __init__(self, hours: int = 72, max_locations: int = 4096):
+        """
+        Initialize the history.
+
+        Args:
+            hours: Hours of history kept per location
+            max_locations: Locations tracked before the least recently used is dropped
+        """
+        self.hours = hours
+        self._buffers = LRUCache(max_locations)
+
+    def record(self, key: Hashable, timestamp: float, pressure: float) -> None:
+        """
+        Record an observation.
+
+        Args:
+            key: Location key
+            timestamp: Observation time (Unix seconds)
+            pressure: Pressure in hPa
+        """
+        buffer = self._buffers.get(key)
+        if buffer is MISSING:
+            buffer = PressureRingBuffer(self.hours)
+            self._buffers.set(key, buffer)
+        buffer.record(int(timestamp) // SECONDS_PER_HOUR, pressure)
+
+    def delta(self, key: Hashable, hours_ago: int) -> Optional[float]:
+        """
+        Pressure change from `hours_ago` hours before the latest reading to the latest reading.
+
+        Returns:
+            Delta in hPa (positive = rising), or None without enough history
+        """
+        buffer = self._buffers.get(key)
+        if buffer is MISSING or buffer.latest_hour is None or not 0 < hours_ago < self.hours:
+            return None
+
+        latest = buffer.at(buffer.latest_hour)
+        target = buffer.latest_hour - hours_ago
+        for hour in (target, target - 1, target + 1):
+            past = buffer.at(hour)
+            if past is not None and hour < buffer.latest_hour:
+                return latest - past
+        return None
+
+    def series(self, key: Hashable) -> List[Tuple[int, float]]:
+        """Recorded `(unix_hour_start, pressure)` pairs for a location, oldest first."""
+        buffer = self._buffers.get(key)
+        if buffer is MISSING:
+            return []
+        return [(hour * SECONDS_PER_HOUR, pressure) for hour, pressure in buffer.series()]
+
+    def __len__(self) -> int:
+        return len(self._buffers)
+
+
+class PressureStore:
+    """
+    Hourly pressure observations in SQLite, shared by all workers on a host.
+
+    Like DiskCache, the store is best-effort: SQLite errors are logged and
+    treated as empty reads or dropped writes.
+    """
+
+    def __init__(self, path: str, table: str = "pressure_observations"):
+        """
+        Initialize the store, creating the file and table if needed.
+
+        Args:
+            path: SQLite file path (may be shared with a DiskCache)
+            table: Table name
+        """
+        self.path = path
+        self.table = table
+
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute(f"""
+                CREATE TABLE IF NOT EXISTS {table} (
+                    key TEXT NOT NULL,
+                    hour_start INTEGER NOT NULL,
+                    pressure REAL NOT NULL,
+                    PRIMARY KEY (key, hour_start)
+                ) WITHOUT ROWID
+            """)
+            conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_hour ON {table}(hour_start)")
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=5.0)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def record(self, key: str, timestamp: float, pressure: float) -> None:
+        """Store an observation (later readings in the same hour win)."""
+        hour_start = int(timestamp) // SECONDS_PER_HOUR * SECONDS_PER_HOUR
+        try:
+            with self._connect() as conn:
+                conn.execute(
+                    f"INSERT OR REPLACE INTO {self.table} (key, hour_start, pressure) VALUES (?, ?, ?)",
+                    (key, hour_start, pressure)
+                )
+        except sqlite3.Error as e:
+            logger.warning(f"Pressure history write failed for {key}: {e}")
+
+    def load(self, since: float, key: Optional[str] = None) -> List[Tuple[str, int, float]]:
+        """`(key, hour_start, pressure)` observations from `since` on (for one key or all), oldest first."""
+        query = f"SELECT key, hour_start, pressure FROM {self.table} WHERE hour_start >= ?"
+        params: tuple = (int(since),)
+        if key is not None:
+            query += " AND key = ?"
+            params += (key,)
+        try:
+            with self._connect() as conn:
+                return conn.execute(query + " ORDER BY hour_start", params).fetchall()
+        except sqlite3.Error as e:
+            logger.warning(f"Pressure history read failed: {e}")
+            return []
+
+    def prune(self, before: float) -> int:
+        """Delete observations older than `before`; return how many were removed."""
+        try:
+            with self._connect() as conn:
+                return conn.execute(
+                    f"DELETE FROM {self.table} WHERE hour_start < ?", (int(before),)
+                ).rowcount
+        except sqlite3.Error as e:
+            logger.warning(f"Pressure history prune failed: {e}")
+            return 0
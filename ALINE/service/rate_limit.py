@@ -0,0 +1,153 @@
+"""
+Rate Limiting for Upstream APIs
+
+Token-bucket limiter used to keep outbound calls within a provider quota.
+The bucket lives in process memory by default; pointing it at a SQLite
+file makes every worker process on the host draw from one global budget.
+
+Author: ALINE Team
+Date: 2025-11-17
+"""
+
+import asyncio
+import logging
+import sqlite3
+import time
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimiter:
+    """
+    Token bucket allowing `max_calls` per `period` seconds.
+
+    The bucket holds at most `max_calls` tokens and refills continuously, so
+    bursts up to the full budget are allowed and the long-run rate never
+    exceeds it. Waiters queue on an asyncio.Lock, which wakes them in FIFO
+    order; the head of the queue sleeps just long enough for one token.
+    """
+
+    def __init__(
+        self,
+        max_calls: int,
+        period: float,
+        state_path: Optional[str] = None,
+        name: str = "default"
+    ):
+        """
+        Initialize rate limiter.
+
+        Args:
+            max_calls: Maximum number of calls allowed
+            period: Time period in seconds
+            state_path: SQLite file holding the shared bucket (None = per-process)
+            name: Bucket name within `state_path`, one per upstream quota
+        """
+        if max_calls < 1 or period <= 0:
+            raise ValueError("max_calls must be >= 1 and period > 0")
+
+        self.max_calls = max_calls
+        self.period = period  # seconds
+        self.rate = max_calls / period  # tokens per second
+        self.state_path = state_path
+        self.name = name
+
+        self.tokens = float(max_calls)
+        self.updated_at = time.monotonic()
+        self.acquired = 0
+        self.waited_seconds = 0.0
+        self._lock = asyncio.Lock()
+
+        if state_path:
+            self._init_shared_state()
+
+    async def acquire(self):
+        """Wait until a token is available, then consume it."""
+        async with self._lock:
+            while True:
+                wait_time = self._take_shared() if self.state_path else self._take_local()
+                if wait_time <= 0:
+                    self.acquired += 1
+                    return
+                logger.info(f"Rate limit reached, waiting {wait_time:.2f}s")
+                self.waited_seconds += wait_time
+                await asyncio.sleep(wait_time)
+
+    def _refill(self, tokens: float, elapsed: float) -> float:
+        return min(float(self.max_calls), tokens + max(elapsed, 0.0) * self.rate)
+
+    def _take_local(self) -> float:
+        """Consume a token from the in-process bucket; return seconds to wait if empty."""
+        now = time.monotonic()
+        self.tokens = self._refill(self.tokens, now - self.updated_at)
+        self.updated_at = now
+
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    # ------------------------------------------------------------------
+    # Shared bucket (one row per limiter name in a SQLite file)
+    # ------------------------------------------------------------------
+
+    def _connect(self) -> sqlite3.Connection:
+        # Autocommit mode so the transaction is controlled explicitly below
+        return sqlite3.connect(self.state_path, timeout=5.0, isolation_level=None)
+
+    def _init_shared_state(self):
+        conn = self._connect()
+        try:
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS rate_limits (
+                    name TEXT PRIMARY KEY,
+                    tokens REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            """)
+            conn.execute(
+                "INSERT OR IGNORE INTO rate_limits (name, tokens, updated_at) VALUES (?, ?, ?)",
+                (self.name, float(self.max_calls), time.time())
+            )
+        finally:
+            conn.close()
+
+    def _take_shared(self) -> float:
+        """
+        Consume a token from the shared bucket; return seconds to wait if empty.
+
+        BEGIN IMMEDIATE takes the database write lock before reading, so
+        concurrent workers serialize on the read-refill-update step.
+        """
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute(
+                    "SELECT tokens, updated_at FROM rate_limits WHERE name = ?",
+                    (self.name,)
+                ).fetchone()
+                now = time.time()
+                tokens = self._refill(row[0], now - row[1]) if row else float(self.max_calls)
+
+                wait_time = 0.0
+                if tokens >= 1:
+                    tokens -= 1
+                else:
+                    wait_time = (1 - tokens) / self.rate
+
+                conn.execute(
+                    "INSERT OR REPLACE INTO rate_limits (name, tokens, updated_at) VALUES (?, ?, ?)",
+                    (self.name, tokens, now)
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        finally:
+            conn.close()
+
+        self.tokens = tokens
+        return wait_time
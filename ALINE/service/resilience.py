@@ -0,0 +1,274 @@
+"""
+Resilience for Upstream HTTP Dependencies
+
+Per-upstream circuit breakers, jittered retries bounded by a latency
+budget, and hedged requests for idempotent GETs. When an upstream is
+failing, callers get a CircuitOpenError immediately instead of waiting out
+the HTTP timeout, and fall back to defaults or cached data.
+
+Author: ALINE Team
+Date: 2025-11-17
+"""
+
+import asyncio
+import logging
+import random
+import time
+from typing import Awaitable, Callable, Dict, Optional
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# Status codes worth retrying (and counted as upstream failures)
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+
+class CircuitOpenError(Exception):
+    """Raised without contacting the upstream while its circuit is open."""
+
+
+class UpstreamError(Exception):
+    """The upstream kept failing until the retry budget ran out."""
+
+
+class CircuitBreaker:
+    """
+    Closed -> open after `failure_threshold` consecutive failures; after
+    `reset_timeout` seconds one probe request is let through (half-open),
+    and its outcome closes or re-opens the circuit.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        """
+        Initialize the breaker.
+
+        Args:
+            name: Upstream name (for logs and stats)
+            failure_threshold: Consecutive failures that open the circuit
+            reset_timeout: Seconds to stay open before probing
+            clock: Monotonic time source
+        """
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+
+        self.rejected = 0
+        self.times_opened = 0
+
+    def allow(self) -> bool:
+        """Whether a request may be sent now (claims the probe slot when half-open)."""
+        if self.state == "open" and self.clock() - self.opened_at >= self.reset_timeout:
+            self.state = "half_open"
+            self._probing = False
+
+        if self.state == "closed":
+            return True
+        if self.state == "half_open" and not self._probing:
+            self._probing = True
+            return True
+
+        self.rejected += 1
+        return False
+
+    def record_success(self):
+        if self.state != "closed":
+            logger.info(f"Circuit '{self.name}' closed")
+        self.state = "closed"
+        self.failures = 0
+        self._probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == "half_open" or self.failures >= self.failure_threshold:
+            if self.state != "open":
+                self.times_opened += 1
+                logger.warning(f"Circuit '{self.name}' opened after {self.failures} failures")
+            self.state = "open"
+            self.opened_at = self.clock()
+            self._probing = False
+
+    def release_probe(self):
+        """Give back a half-open probe slot whose request ended without an outcome."""
+        self._probing = False
+
+    def stats(self) -> Dict:
+        return {
+            'state': self.state,
+            'consecutive_failures': self.failures,
+            'times_opened': self.times_opened,
+            'rejected': self.rejected
+        }
+
+
+class Upstream:
+    """
+    Resilience policy for one upstream dependency.
+
+    Every call gets `latency_budget` seconds in total: attempts use the
+    remaining budget as their timeout and retries (with full-jitter
+    exponential backoff) stop once the budget is spent. Idempotent GETs
+    may be hedged: if the first attempt has not answered after
+    `hedge_delay` seconds, a second identical request races it.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        latency_budget: float = 5.0,
+        max_attempts: int = 3,
+        backoff: float = 0.1,
+        hedge_delay: Optional[float] = None,
+        breaker: Optional[CircuitBreaker] = None,
+        before_attempt: Optional[Callable[[], Awaitable[None]]] = None
+    ):
+        """
+        Initialize the policy.
+
+        Args:
+            name: Upstream name
+            latency_budget: Total seconds a call may take, retries included
+            max_attempts: Attempts per call (1 = no retries)
+            backoff: Base backoff in seconds (doubles per retry, full jitter)
+            hedge_delay: Seconds before hedging a GET (None = never hedge)
+            breaker: Circuit breaker (default: one with standard thresholds)
+            before_attempt: Awaited before every request sent, e.g. a rate limiter
+        """
+        self.name = name
+        self.latency_budget = latency_budget
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.hedge_delay = hedge_delay
+        self.breaker = breaker or CircuitBreaker(name)
+        self.before_attempt = before_attempt
+
+        self.calls = 0
+        self.retries = 0
+        self.hedges = 0
+        self.failures = 0
+
+    async def get(self, client: httpx.AsyncClient, url: str, **kwargs) -> httpx.Response:
+        """Idempotent GET: retried and hedged."""
+        return await self._call(client, "GET", url, idempotent=True, **kwargs)
+
+    async def post(self, client: httpx.AsyncClient, url: str, **kwargs) -> httpx.Response:
+        """
+        Non-idempotent POST: only retried when the request never reached the
+        upstream (connection failures), and never hedged.
+        """
+        return await self._call(client, "POST", url, idempotent=False, **kwargs)
+
+    async def _call(
+        self,
+        client: httpx.AsyncClient,
+        method: str,
+        url: str,
+        idempotent: bool,
+        **kwargs
+    ) -> httpx.Response:
+        if not self.breaker.allow():
+            raise CircuitOpenError(f"{self.name} circuit is open")
+
+        self.calls += 1
+        deadline = time.monotonic() + self.latency_budget
+
+        async def send() -> httpx.Response:
+            if self.before_attempt is not None:
+                await self.before_attempt()
+            # Time spent waiting above counts against the budget. httpx
+            # timeouts apply per phase (connect/read/...), so the whole
+            # request is also bounded here.
+            timeout = max(deadline - time.monotonic(), 0.001)
+            try:
+                return await asyncio.wait_for(
+                    client.request(method, url, timeout=timeout, **kwargs), timeout
+                )
+            except asyncio.TimeoutError:
+                raise httpx.TimeoutException(f"{self.name} latency budget exceeded")
+
+        settled = False
+        try:
+            last_error: Optional[Exception] = None
+            for attempt in range(self.max_attempts):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+
+                try:
+                    if idempotent and self.hedge_delay is not None and self.hedge_delay < remaining:
+                        response = await self._hedged(send)
+                    else:
+                        response = await send()
+                except httpx.TransportError as e:
+                    last_error = e
+                    retryable = idempotent or isinstance(e, (httpx.ConnectError, httpx.ConnectTimeout))
+                else:
+                    if response.status_code not in RETRYABLE_STATUS:
+                        self.breaker.record_success()
+                        settled = True
+                        return response
+                    last_error = UpstreamError(f"{self.name} returned HTTP {response.status_code}")
+                    retryable = idempotent
+
+                if not retryable or attempt == self.max_attempts - 1:
+                    break
+                delay = random.uniform(0, self.backoff * 2 ** attempt)
+                if time.monotonic() + delay >= deadline:
+                    break
+                self.retries += 1
+                await asyncio.sleep(delay)
+
+            self.failures += 1
+            self.breaker.record_failure()
+            settled = True
+            raise last_error or UpstreamError(f"{self.name} latency budget exhausted")
+        finally:
+            if not settled:
+                # Cancelled or unexpected error: neither outcome, free a half-open probe
+                self.breaker.release_probe()
+
+    async def _hedged(self, send: Callable[[], Awaitable[httpx.Response]]) -> httpx.Response:
+        """Race a second request against a slow first one; first good answer wins."""
+        first = asyncio.ensure_future(send())
+        done, _ = await asyncio.wait({first}, timeout=self.hedge_delay)
+        if done:
+            return first.result()
+
+        self.hedges += 1
+        second = asyncio.ensure_future(send())
+        pending = {first, second}
+        outcome = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None and task.result().status_code not in RETRYABLE_STATUS:
+                        return task.result()
+                    outcome = task
+            # Both failed: surface the last outcome (exception or bad response)
+            return outcome.result()
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def stats(self) -> Dict:
+        stats = self.breaker.stats()
+        stats.update({
+            'calls': self.calls,
+            'retries': self.retries,
+            'hedges': self.hedges,
+            'failures': self.failures
+        })
+        return stats
@@ -0,0 +1,360 @@
+"""
+Batch Risk Scoring
+
+Scores one day's migraine risk for every user with stored hourly features
+and writes it to the risk_predictions table, so tomorrow's-risk
+notifications (ticket 028) and the home screen read one indexed row
+instead of running the model when the app is opened.
+
+Each user's window is the 24 hours before the start of the day (UTC); users
+missing any of them (a logging gap, or no recent logging at all) are skipped. Users are paged in user_id order; each page's windows are
+read in one query, scored in large SimpleALINE batches with the analytic
+risk head (models/risk_head.py) and committed in one transaction, after
+which the page's last user_id is checkpointed so an interrupted run
+resumes where it stopped. Work is split across processes by a stable hash
+of the user_id: each shard pages the same user list, scores only its own
+users and keeps its own checkpoint.
+
+With a SensitivityGrid, each prediction also stores the user's what-if
+sensitivity surface (risk as each actionable feature is set to each grid
+value), computed in the same batched forward. Slider interactions then
+interpolate the stored surface instead of running the model; storing new
+hourly features for the user drops the surface (Database.save_hourly_features).
+
+Author: ALINE Team
+Date: 2025-11-17
+"""
+
+import logging
+import os
+import time
+import zlib
+from datetime import date, datetime, time as dt_time, timezone
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import torch
+import yaml
+
+from models.aline import SimpleALINE
+from models.counterfactual import sensitivity_surfaces
+from models.risk_head import analytic_risk
+from service.database import Database
+
+logger = logging.getLogger(__name__)
+
+# Hours per scored window
+WINDOW_HOURS = 24
+
+
+def shard_of(user_id: str, num_shards: int) -> int:
+    """Stable shard index of a user (independent of the interpreter's hash seed)."""
+    return zlib.crc32(user_id.encode('utf-8')) % num_shards
+
+
+def load_service_config(service_config_path: Optional[Path] = None) -> Dict:
+    """Read configs/service.yaml (or the given file)."""
+    with open(service_config_path or Path(__file__).parent.parent / 'configs' / 'service.yaml') as f:
+        return yaml.safe_load(f)
+
+
+def load_scoring_model(
+    service_config: Optional[Dict] = None,
+    device: Optional[torch.device] = None
+) -> Tuple[SimpleALINE, torch.Tensor, float]:
+    """
+    Load the model checkpoint and migraine head named in the service config.
+
+    Returns:
+        model (eval mode), migraine_weights, migraine_bias
+
+    Raises:
+        FileNotFoundError: If the checkpoint does not exist
+    """
+    root = Path(__file__).parent.parent
+    service_config = service_config or load_service_config()
+    with open(root / service_config['model']['config_path']) as f:
+        model_config = yaml.safe_load(f)
+    device = device or torch.device('cpu')
+
+    checkpoint_path = root / service_config['model']['checkpoint_path']
+    if not checkpoint_path.exists():
+        raise FileNotFoundError(f"Model checkpoint not found at {checkpoint_path}")
+    checkpoint = torch.load(checkpoint_path, map_location=device, weights_only=False)
+
+    model = SimpleALINE(
+        in_dim=model_config['in_dim'],
+        z_dim=model_config['z_dim'],
+        d_model=model_config['d_model'],
+        nhead=model_config['nhead'],
+        nlayers=model_config['nlayers']
+    )
+    model.load_state_dict(checkpoint['model_state_dict'])
+    model.to(device)
+    model.eval()
+
+    weights = torch.tensor(service_config['migraine_model']['weights'], device=device)
+    return model, weights, float(service_config['migraine_model']['bias'])
+
+
+class SensitivityGrid:
+    """Actionable features and the grid values a sensitivity surface covers"""
+
+    def __init__(self, features: List[str], indices: List[int], grid: List[float]):
+        """
+        Args:
+            features: Feature names (as reported to clients)
+            indices: Model input index of each feature
+            grid: Increasing values each feature is set to (normalized units)
+        """
+        if len(features) != len(indices):
+            raise ValueError("Each sensitivity feature needs one index")
+        if len(grid) < 2 or any(b <= a for a, b in zip(grid, grid[1:])):
+            raise ValueError("The sensitivity grid needs at least two increasing values")
+        self.features = list(features)
+        self.indices = list(indices)
+        self.grid = [float(value) for value in grid]
+
+    @classmethod
+    def from_config(cls, service_config: Dict) -> Optional['SensitivityGrid']:
+        """Grid from the `sensitivity` section, or None if it is absent."""
+        section = service_config.get('sensitivity')
+        if not section:
+            return None
+        names = service_config['features']['feature_names']
+        unknown = [name for name in section['features'] if name not in names]
+        if unknown:
+            raise ValueError(f"Unknown sensitivity features: {', '.join(unknown)}")
+        return cls(section['features'], [names.index(name) for name in section['features']], section['grid'])
+
+    def surface(self, risk: List[List[float]]) -> Dict:
+        """JSON form of one user's [K, G] surface."""
+        return {'features': self.features, 'grid': self.grid, 'risk': risk}
+
+
+def interpolate_surface(surface: Dict, feature: str, value: float) -> float:
+    """
+    Risk at `value` of `feature`, linearly interpolated on a stored surface
+    (clamped to the grid's ends).
+
+    Raises:
+        KeyError: If the surface does not cover `feature`
+    """
+    if feature not in surface['features']:
+        raise KeyError(feature)
+    risk = surface['risk'][surface['features'].index(feature)]
+    return float(np.interp(value, surface['grid'], risk))
+
+
+class RiskBatchScorer:
+    """Resumable, sharded scoring of stored daily risk predictions"""
+
+    # Users read (and predictions committed) per page
+    PAGE_SIZE = int(os.getenv("RISK_BATCH_PAGE_SIZE", "2000"))
+
+    # Windows per model forward
+    BATCH_SIZE = int(os.getenv("RISK_BATCH_SIZE", "512"))
+
+    def __init__(
+        self,
+        database: Database,
+        model: SimpleALINE,
+        migraine_weights: torch.Tensor,
+        migraine_bias: float,
+        day: date,
+        shard: int = 0,
+        num_shards: int = 1,
+        page_size: Optional[int] = None,
+        batch_size: Optional[int] = None,
+        sensitivity: Optional[SensitivityGrid] = None,
+        on_page: Optional[Callable[[Dict], None]] = None
+    ):
+        """
+        Initialize the scorer.
+
+        Args:
+            database: Database with hourly features and the prediction table
+            model: SimpleALINE in eval mode
+            migraine_weights: Weights for migraine prediction [z_dim]
+            migraine_bias: Bias for migraine prediction
+            day: Day the predictions are for; windows end at its start (UTC)
+            shard: Index of the shard this scorer handles
+            num_shards: Total number of shards
+            page_size: Users per page (default: PAGE_SIZE)
+            batch_size: Windows per forward (default: BATCH_SIZE)
+            sensitivity: Also store each user's sensitivity surface on this grid
+            on_page: Called with the running summary after each page
+        """
+        if not 0 <= shard < num_shards:
+            raise ValueError(f"Shard {shard} is not in [0, {num_shards})")
+
+        self.db = database
+        self.model = model
+        self.device = next(model.parameters()).device
+        self.migraine_weights = migraine_weights.to(self.device)
+        self.migraine_bias = migraine_bias
+        self.day = day
+        self.shard = shard
+        self.num_shards = num_shards
+        self.page_size = page_size or self.PAGE_SIZE
+        self.batch_size = batch_size or self.BATCH_SIZE
+        self.sensitivity = sensitivity
+        self.on_page = on_page
+        self.cutoff = int(datetime.combine(day, dt_time(), tzinfo=timezone.utc).timestamp())
+
+        self.scored = 0
+        self.skipped = 0
+        self.pages = 0
+        self._started = 0.0
+
+    @property
+    def checkpoint_name(self) -> str:
+        return f"risk_predictions:{self.day.isoformat()}:{self.shard}/{self.num_shards}"
+
+    def run(self, restart: bool = False, max_pages: Optional[int] = None) -> Dict:
+        """
+        Score all users of this shard, resuming from the checkpoint.
+
+        Args:
+            restart: Ignore (and overwrite) a saved checkpoint
+            max_pages: Stop after this many pages (the checkpoint allows resuming)
+
+        Returns:
+            summary()
+        """
+        self._started = time.perf_counter()
+        cursor = None if restart else self.db.get_checkpoint(self.checkpoint_name)
+        if cursor is not None:
+            logger.info(f"Resuming {self.checkpoint_name} after user {cursor}")
+
+        while max_pages is None or self.pages < max_pages:
+            users = self.db.list_feature_users(cursor, self.page_size)
+            if not users:
+                break
+
+            mine = [user_id for user_id in users if shard_of(user_id, self.num_shards) == self.shard]
+            predictions = self.score_users(mine)
+            if predictions:
+                self.db.save_risk_predictions(predictions)
+
+            cursor = users[-1]
+            self.db.set_checkpoint(self.checkpoint_name, cursor)
+            self.pages += 1
+            if self.on_page is not None:
+                self.on_page(self.summary())
+
+        if max_pages is None or self.pages < max_pages:
+            # Completed: a later run for the same day starts over
+            self.db.set_checkpoint(self.checkpoint_name, None)
+        return self.summary()
+
+    def score_users(self, user_ids: List[str]) -> List[Dict]:
+        """
+        Read and score the windows of `user_ids`. Users without a full window
+        (every hour of the 24 before the cutoff, each of the model's width)
+        are skipped.
+        """
+        windows = self.db.latest_feature_windows(user_ids, self.cutoff, WINDOW_HOURS)
+
+        expected = [self.cutoff - (WINDOW_HOURS - i) * 3600 for i in range(WINDOW_HOURS)]
+        scorable = [
+            (user_id, hours) for user_id, hours in windows.items()
+            if [hour_start for hour_start, _ in hours] == expected
+            and all(len(features) == self.model.in_dim for _, features in hours)
+        ]
+        self.skipped += len(user_ids) - len(scorable)
+        if not scorable:
+            return []
+
+        x = torch.tensor(
+            [[features for _, features in hours] for _, hours in scorable],
+            dtype=torch.float32
+        )  # [N, 24, in_dim]
+        if self.sensitivity is None:
+            (mean, lower, upper), surfaces = self.score(x), None
+        else:
+            mean, lower, upper, surfaces = self.score_with_surfaces(x)
+
+        self.scored += len(scorable)
+        return [
+            {
+                'user_id': user_id,
+                'date': self.day.isoformat(),
+                'mean_probability': mean[i],
+                'lower_bound': lower[i],
+                'upper_bound': upper[i],
+                'window_start': hours[0][0],
+                'window_end': hours[-1][0] + 3600,
+                'sensitivity': self.sensitivity.surface(surfaces[i]) if surfaces is not None else None
+            }
+            for i, (user_id, hours) in enumerate(scorable)
+        ]
+
+    def score(self, x: torch.Tensor) -> Tuple[List[float], List[float], List[float]]:
+        """
+        Risk of the last hour of each window, in forwards of `batch_size`.
+
+        Args:
+            x: Windows [N, 24, in_dim]
+
+        Returns:
+            mean_probability, lower_bound, upper_bound: Lists of length N
+        """
+        results = []
+        with torch.inference_mode():
+            for batch in x.split(self.batch_size):
+                posterior, _ = self.model(batch.to(self.device))
+                risk = analytic_risk(
+                    posterior.mean[:, -1, :],
+                    posterior.stddev[:, -1, :],
+                    self.migraine_weights,
+                    self.migraine_bias
+                )
+                results.append(torch.stack(risk, dim=1).cpu())
+
+        mean, lower, upper = torch.cat(results).T.tolist()
+        return mean, lower, upper
+
+    def score_with_surfaces(self, x: torch.Tensor) -> Tuple[List[float], List[float], List[float], List]:
+        """
+        Like score(), plus each window's [K, G] sensitivity surface. Each
+        forward covers as many windows as fit, with all their variants, in
+        `batch_size` sequences.
+
+        Returns:
+            mean_probability, lower_bound, upper_bound: Lists of length N
+            surfaces: N nested [K][G] lists
+        """
+        variants = len(self.sensitivity.indices) * len(self.sensitivity.grid)
+        windows_per_forward = max(1, self.batch_size // (variants + 1))
+
+        mean, lower, upper, surfaces = [], [], [], []
+        for batch in x.split(windows_per_forward):
+            risk = sensitivity_surfaces(
+                self.model,
+                batch.to(self.device),
+                self.sensitivity.indices,
+                self.sensitivity.grid,
+                self.migraine_weights,
+                self.migraine_bias
+            )
+            mean += risk['mean'].tolist()
+            lower += risk['lower'].tolist()
+            upper += risk['upper'].tolist()
+            surfaces += risk['surface'].tolist()
+        return mean, lower, upper, surfaces
+
+    def summary(self) -> Dict:
+        """Counters and throughput so far."""
+        elapsed = time.perf_counter() - self._started if self._started else 0.0
+        return {
+            'date': self.day.isoformat(),
+            'shard': self.shard,
+            'num_shards': self.num_shards,
+            'scored': self.scored,
+            'skipped': self.skipped,
+            'pages': self.pages,
+            'elapsed_s': round(elapsed, 3),
+            'users_per_s': round(self.scored / elapsed, 2) if elapsed > 0 else 0.0
+        }
@@ -9,7 +9,7 @@ Date: 2025-11-15
 """
 
 from pydantic import BaseModel, Field
-from typing import List, Optional
+from typing import List, Literal, Optional, Union
 from datetime import datetime
 
 
@@ -80,6 +80,127 @@ class PolicyResponse(BaseModel):
     timestamp: str
 
 
+# Feature-level measurement nudges
+class FeatureQueryRequest(BaseModel):
+    """Request for the most informative hours and features to measure"""
+    user_id: str
+    features: List[List[float]] = Field(..., description="24 hours of features")
+    availability: Optional[List[List[float]]] = Field(
+        None, description="24 × n_features mask, 1 = measured, 0 = missing (default: all missing)"
+    )
+    k_temporal: int = Field(3, ge=1, le=24, description="Number of hours to recommend")
+    k_features: int = Field(5, ge=1, description="Number of features to recommend")
+
+
+class TemporalQuery(BaseModel):
+    """An hour worth measuring and its most informative features"""
+    hour: int
+    score: float
+    features: List[str]
+
+
+class FeatureQuery(BaseModel):
+    """A feature worth measuring and its most informative hour"""
+    feature: str
+    score: float
+    best_hour: int
+
+
+class FeatureQueryResponse(BaseModel):
+    """Measurement nudges ranked by information gain"""
+    user_id: str
+    mean_probability: float
+    temporal_queries: List[TemporalQuery]
+    feature_queries: List[FeatureQuery]
+    timestamp: str
+
+
+# What-if (counterfactual) risk endpoint
+class WhatIfPerturbation(BaseModel):
+    """One change to the base window, on a range of features × hours"""
+    op: Literal['set', 'scale', 'add'] = Field(..., description="set to, multiply by, or add `value`")
+    features: List[Union[int, str]] = Field(..., min_length=1, description="Feature indices or configured feature names")
+    hour_start: int = Field(0, ge=0, le=23, description="First hour affected")
+    hour_end: int = Field(24, ge=1, le=24, description="Hour after the last one affected")
+    value: float = Field(..., description="Value in the model's (normalized) feature units")
+
+
+class WhatIfScenario(BaseModel):
+    """Perturbations applied together, in order"""
+    name: Optional[str] = None
+    perturbations: List[WhatIfPerturbation] = Field(..., min_length=1)
+
+
+class WhatIfRequest(BaseModel):
+    """Base window and the scenarios to compare against it"""
+    user_id: str
+    features: List[List[float]] = Field(..., description="24 hours of features")
+    scenarios: List[WhatIfScenario] = Field(..., min_length=1, max_length=256)
+
+
+class RiskEstimate(BaseModel):
+    """Risk of one window"""
+    mean_probability: float
+    lower_bound: float = Field(..., description="5th percentile")
+    upper_bound: float = Field(..., description="95th percentile")
+
+
+class WhatIfResult(RiskEstimate):
+    """Risk of one scenario"""
+    name: Optional[str] = None
+    delta: float = Field(..., description="mean_probability minus the baseline's")
+
+
+class WhatIfResponse(BaseModel):
+    """Baseline risk and every scenario's risk and delta"""
+    user_id: str
+    baseline: RiskEstimate
+    scenarios: List[WhatIfResult]
+    timestamp: str
+
+
+# Stored hourly features and batch-scored risk
+class HourlyFeatureRow(BaseModel):
+    """Model inputs for one hour"""
+    hour_start: datetime = Field(..., description="Start of the hour, ISO 8601 (no offset = UTC)")
+    features: List[float] = Field(..., description="Features for the hour [n_features]")
+
+
+class HourlyFeaturesRequest(BaseModel):
+    """Hourly features to store for batch scoring"""
+    user_id: str
+    hours: List[HourlyFeatureRow] = Field(..., min_length=1, max_length=24 * 31)
+
+
+class HourlyFeaturesResponse(BaseModel):
+    """Response after storing hourly features"""
+    user_id: str
+    stored: int
+
+
+class StoredRiskResponse(BaseModel):
+    """Daily risk written by the nightly batch scorer"""
+    user_id: str
+    date: str
+    mean_probability: float = Field(..., description="Mean migraine probability")
+    lower_bound: float = Field(..., description="5th percentile")
+    upper_bound: float = Field(..., description="95th percentile")
+    window_end: str = Field(..., description="End of the scored 24-hour window")
+    generated_at: str
+
+
+class SensitivitySurfaceResponse(BaseModel):
+    """Risk as each actionable feature is set to each grid value for the whole day"""
+    user_id: str
+    date: str
+    baseline: RiskEstimate
+    features: List[str] = Field(..., description="Actionable features (K)")
+    grid: List[float] = Field(..., description="Feature values, normalized units (G)")
+    risk: List[List[float]] = Field(..., description="Mean risk [K][G]; interpolate linearly between grid values")
+    cached: bool = Field(..., description="Served from the stored surface without running the model")
+    lookup: Optional[float] = Field(None, description="Interpolated risk at `value` of `feature`, if requested")
+
+
 # Calendar integration endpoints (Ticket 019)
 class CalendarConnectionRequest(BaseModel):
     """Request to save calendar connection"""
@@ -106,6 +227,8 @@ class ContextGenerationRequest(BaseModel):
     """Request for generating context from calendar"""
     userId: str = Field(..., description="User ID")
     priors: dict = Field(..., description="Prior distributions for features")
+    date: Optional[str] = Field(None, description="Day to analyse, YYYY-MM-DD (default: tomorrow)")
+    timezone: Optional[str] = Field(None, description="IANA time zone of the user (default: UTC)")
 
 
 class ContextGenerationResponse(BaseModel):
@@ -113,9 +236,27 @@ class ContextGenerationResponse(BaseModel):
     userId: str
     posteriors: dict = Field(..., description="Updated posterior distributions")
     features: List[dict] = Field(..., description="Feature details with prior/posterior")
+    calendarLoad: Optional[dict] = Field(None, description="Hourly calendar-load features (local engine)")
     timestamp: str
 
 
+class JobSubmitResponse(BaseModel):
+    """Response after queueing a background job"""
+    jobId: str
+    status: str = Field(..., description="Initial status ('queued')")
+    statusUrl: str = Field(..., description="Where to poll for the outcome")
+
+
+class JobStatusResponse(BaseModel):
+    """Status and outcome of a background job"""
+    jobId: str
+    kind: str
+    status: str = Field(..., description="queued, running, succeeded or failed")
+    result: Optional[dict] = Field(None, description="Result once succeeded")
+    error: Optional[str] = Field(None, description="Error message once failed")
+    createdAt: str
+    updatedAt: str
+
 # ============================================================================
 # FEEDBACK LOOP SCHEMAS (Ticket 026)
 # ============================================================================
@@ -157,3 +298,10 @@ class FeedbackHistoryItem(BaseModel):
 class FeedbackHistoryResponse(BaseModel):
     """Response with feedback history"""
     history: List[FeedbackHistoryItem]
+    next_cursor: Optional[str] = Field(None, description="Pass as `cursor` to fetch the next (older) page")
+
+
+class FeedbackImportRow(FeedbackRequest):
+    """Single row of a bulk feedback import (JSON array, NDJSON or CSV)"""
+    severity: Optional[int] = Field(None, ge=1, le=10, description="Severity 1-10 if migraine occurred")
+    predicted_risk: Optional[float] = Field(None, ge=0, le=1, description="Prediction shown to the user, if known")
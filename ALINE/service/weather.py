@@ -7,65 +7,323 @@ Automatically fetches real-time weather data to populate environmental features
 """
 
 import httpx
+import math
 import os
-from datetime import datetime, timedelta
-from typing import Optional, Dict, List
+import time
+from pathlib import Path
+from typing import Optional, Dict, List, Tuple
 import logging
 import asyncio
 
+from service.cache import DiskCache, TTLCache
+from service.pressure_history import PressureHistory, PressureStore
+from service.rate_limit import RateLimiter
+from service.resilience import CircuitBreaker, Upstream
+
 logger = logging.getLogger(__name__)
 
 
-class RateLimiter:
-    """Simple rate limiter for API calls."""
+class WeatherService:
+    """
+    OpenWeather API client for fetching environmental data.
+    
+    Current conditions, pressure change and forecast are all derived from
+    one cached One Call payload per grid cell, so a client loading the
+    weather panel costs a single upstream call and nearby users share it.
     
-    def __init__(self, max_calls: int, period: int):
+    Expired payloads are served stale (up to MAX_STALE) while a background
+    task refreshes them, and entries read in the last part of their TTL are
+    refreshed ahead of expiry, so requests rarely wait on the upstream.
+    
+    Upstream calls go through a circuit breaker with retries bounded by a
+    latency budget and hedging. While OpenWeather is failing, any cached
+    payload is served regardless of age before falling back to defaults.
+    
+    Payloads are also written to an on-disk SQLite tier shared by all
+    workers on the host, which warms the in-memory cache at startup and
+    lets a worker reuse another worker's recent fetch. Observed pressures
+    are persisted to the same file, so pressure history survives restarts
+    and is shared with new workers.
+    
+    API Documentation: https://openweathermap.org/api/one-call-3
+    """
+    
+    BASE_URL = "https://api.openweathermap.org/data/3.0/onecall"
+    API_KEY = os.getenv("OPENWEATHER_API_KEY", "")
+    CACHE_TTL = int(os.getenv("OPENWEATHER_CACHE_TTL", "3600"))  # 1 hour default
+    CACHE_SIZE = int(os.getenv("OPENWEATHER_CACHE_SIZE", "4096"))  # grid cells kept in memory
+    GRID_RESOLUTION = float(os.getenv("OPENWEATHER_GRID_RESOLUTION", "0.1"))  # degrees (~11 km)
+    MAX_STALE = int(os.getenv("OPENWEATHER_MAX_STALE", "10800"))  # serve stale up to 3h, then block
+    REFRESH_AHEAD = float(os.getenv("OPENWEATHER_REFRESH_AHEAD", "0.8"))  # fraction of TTL
+    MAX_REFRESHES = int(os.getenv("OPENWEATHER_MAX_REFRESHES", "4"))  # concurrent background refreshes
+    # Persistent payload tier shared by workers and restarts ("" = memory only)
+    DISK_CACHE_PATH = os.getenv(
+        "OPENWEATHER_DISK_CACHE", str(Path(__file__).parent.parent / 'data' / 'weather_cache.db')
+    )
+    PRESSURE_HISTORY_HOURS = int(os.getenv("PRESSURE_HISTORY_HOURS", "72"))  # per grid cell
+    RATE_LIMIT = int(os.getenv("OPENWEATHER_RATE_LIMIT", "60"))  # calls per minute
+    # SQLite file shared by all workers on the host so they draw from one budget ("" = per-process)
+    RATE_LIMIT_STATE = os.getenv("OPENWEATHER_RATE_LIMIT_STATE", "")
+    LATENCY_BUDGET = float(os.getenv("OPENWEATHER_LATENCY_BUDGET_S", "4.0"))  # per fetch, retries included
+    HEDGE_DELAY = float(os.getenv("OPENWEATHER_HEDGE_DELAY_S", "1.0"))  # 0 disables hedging
+    BREAKER_FAILURES = int(os.getenv("OPENWEATHER_BREAKER_FAILURES", "5"))
+    BREAKER_RESET = float(os.getenv("OPENWEATHER_BREAKER_RESET_S", "30"))
+    
+    def __init__(
+        self,
+        client: Optional[httpx.AsyncClient] = None,
+        cache_size: Optional[int] = None,
+        grid_resolution: Optional[float] = None,
+        disk_cache_path: Optional[str] = None
+    ):
         """
-        Initialize rate limiter.
+        Initialize weather service with caching and rate limiting.
         
         Args:
-            max_calls: Maximum number of calls allowed
-            period: Time period in seconds
+            client: HTTP client to use (default: new client with 10s timeout)
+            cache_size: Max grid cells cached (default: CACHE_SIZE)
+            grid_resolution: Grid cell size in degrees (default: GRID_RESOLUTION)
+            disk_cache_path: SQLite file for the persistent tier (default:
+                DISK_CACHE_PATH, "" disables it)
         """
-        self.max_calls = max_calls
-        self.period = period  # seconds
-        self.calls = []
+        self.grid_resolution = grid_resolution or self.GRID_RESOLUTION
+        # {grid cell: onecall_payload}, LRU-bounded with TTL expiry
+        self.cache = TTLCache(maxsize=cache_size or self.CACHE_SIZE, ttl=self.CACHE_TTL)
+        # Observed pressure per grid cell, recorded from every payload we see
+        self.pressure_history = PressureHistory(
+            hours=self.PRESSURE_HISTORY_HOURS, max_locations=self.cache.maxsize
+        )
+        self.client = client or httpx.AsyncClient(timeout=10.0)
+        self.rate_limiter = RateLimiter(
+            max_calls=self.RATE_LIMIT,
+            period=60,
+            state_path=self.RATE_LIMIT_STATE or None,
+            name="openweather"
+        )
+        self.upstream = Upstream(
+            "openweather",
+            latency_budget=self.LATENCY_BUDGET,
+            hedge_delay=self.HEDGE_DELAY or None,
+            breaker=CircuitBreaker(
+                "openweather",
+                failure_threshold=self.BREAKER_FAILURES,
+                reset_timeout=self.BREAKER_RESET
+            ),
+            before_attempt=self.rate_limiter.acquire
+        )
+        self._inflight: Dict[Tuple[int, int], asyncio.Future] = {}  # Singleflight: one fetch per location
+        self._refreshing = 0
+        self.upstream_calls = 0
+        self.coalesced_requests = 0
+        self.stale_hits = 0
+        self.background_refreshes = 0
+        self.refreshes_skipped = 0
+        self.stale_fallbacks = 0
+        
+        path = self.DISK_CACHE_PATH if disk_cache_path is None else disk_cache_path
+        self.disk_cache = DiskCache(path, table="onecall_payloads") if path else None
+        self.pressure_store = PressureStore(path) if path else None
+        self.warm_from_disk()
+    
+    def grid_cell(self, lat: float, lon: float) -> Tuple[int, int]:
+        """Grid cell containing a location (integer row/column indices)."""
+        # Round before flooring so e.g. 0.3 / 0.1 = 2.9999999999999996 lands in cell 3
+        return (
+            math.floor(round(lat / self.grid_resolution, 9)),
+            math.floor(round(lon / self.grid_resolution, 9))
+        )
+    
+    def cell_center(self, cell: Tuple[int, int]) -> Tuple[float, float]:
+        """Coordinates used to fetch weather for a grid cell."""
+        return (
+            round((cell[0] + 0.5) * self.grid_resolution, 6),
+            round((cell[1] + 0.5) * self.grid_resolution, 6)
+        )
+    
+    def _disk_key(self, cell: Tuple[int, int]) -> str:
+        # Resolution is part of the key so a config change never mixes grids
+        return f"{self.grid_resolution}:{cell[0]}:{cell[1]}"
     
-    async def acquire(self):
-        """Wait if rate limit exceeded."""
-        now = datetime.now()
+    def warm_from_disk(self) -> int:
+        """
+        Load the most recent persisted payloads and pressure history into memory.
         
-        # Remove old calls
-        self.calls = [t for t in self.calls if (now - t).total_seconds() < self.period]
+        Returns:
+            Number of grid cells loaded
+        """
+        if self.disk_cache is None:
+            return 0
         
-        # Wait if at limit
-        if len(self.calls) >= self.max_calls:
-            wait_time = self.period - (now - self.calls[0]).total_seconds()
-            if wait_time > 0:
-                logger.info(f"Rate limit reached, waiting {wait_time:.1f}s")
-                await asyncio.sleep(wait_time)
-                self.calls = []
+        if self.pressure_store is not None:
+            history_start = time.time() - self.PRESSURE_HISTORY_HOURS * 3600
+            self.pressure_store.prune(history_start)
+            self._load_pressure(self.pressure_store.load(history_start))
         
-        self.calls.append(now)
-
-
-class WeatherService:
-    """
-    OpenWeather API client for fetching environmental data.
+        self.disk_cache.prune(self.MAX_STALE)
+        loaded = 0
+        # Oldest first, so the newest entries end up most recently used
+        for key, payload, stored_at in reversed(self.disk_cache.recent(self.cache.maxsize, self.MAX_STALE)):
+            resolution, row, col = key.split(':')
+            if float(resolution) == self.grid_resolution:
+                cell = (int(row), int(col))
+                self.cache.set(cell, payload, stored_at=stored_at)
+                self._record_pressure(cell, payload)
+                loaded += 1
+        
+        logger.info(f"Weather cache warmed with {loaded} grid cells from disk")
+        return loaded
     
-    API Documentation: https://openweathermap.org/api/one-call-3
-    """
+    def _load_from_disk(self, cache_key: Tuple[int, int]) -> Optional[Tuple[Dict, float]]:
+        """Promote a persisted payload into memory; return `(payload, age)` or None."""
+        if self.disk_cache is None:
+            return None
+        stored = self.disk_cache.get(self._disk_key(cache_key))
+        if stored is None:
+            return None
+        payload, stored_at = stored
+        self.cache.set(cache_key, payload, stored_at=stored_at)
+        self._record_pressure(cache_key, payload)
+        return payload, time.time() - stored_at
     
-    BASE_URL = "https://api.openweathermap.org/data/3.0/onecall"
-    API_KEY = os.getenv("OPENWEATHER_API_KEY", "")
-    CACHE_TTL = int(os.getenv("OPENWEATHER_CACHE_TTL", "3600"))  # 1 hour default
+    def _record_pressure(self, cache_key: Tuple[int, int], payload: Dict, persist: bool = False):
+        """Add the payload's observed (current) pressure to the cell's history."""
+        current = payload.get('current', {})
+        if 'pressure' in current and 'dt' in current:
+            self.pressure_history.record(cache_key, current['dt'], current['pressure'])
+            if persist and self.pressure_store is not None:
+                self.pressure_store.record(self._disk_key(cache_key), current['dt'], current['pressure'])
+    
+    def _load_pressure(self, observations: List[Tuple[str, int, float]]) -> int:
+        """Record persisted `(disk key, hour_start, pressure)` observations of this grid."""
+        loaded = 0
+        for key, hour_start, pressure in observations:
+            resolution, row, col = key.split(':')
+            if float(resolution) == self.grid_resolution:
+                self.pressure_history.record((int(row), int(col)), hour_start, pressure)
+                loaded += 1
+        return loaded
+    
+    async def _get_onecall(self, lat: float, lon: float) -> Dict:
+        """
+        Get the One Call payload (current + hourly) for a location.
+        
+        Served from cache while fresh; cache hits do not consume rate
+        limiter slots. Entries past CACHE_TTL but within MAX_STALE are
+        returned immediately and refreshed in the background. Concurrent
+        misses for the same grid cell share a single upstream request.
+        If that request fails, an older cached payload is still preferred
+        over an error.
+        
+        Raises:
+            httpx.HTTPError, UpstreamError, CircuitOpenError: If the upstream
+                request fails and nothing is cached
+        """
+        cache_key = self.grid_cell(lat, lon)
+        entry = self.cache.get_entry(cache_key) or self._load_from_disk(cache_key)
+        if entry is not None:
+            payload, age = entry
+            if age < self.CACHE_TTL:
+                logger.info(f"Weather cache hit for {cache_key}")
+                if age >= self.CACHE_TTL * self.REFRESH_AHEAD:
+                    self._schedule_refresh(cache_key)
+                return payload
+            if age < self.MAX_STALE:
+                self.stale_hits += 1
+                logger.info(f"Serving stale weather for {cache_key} ({age:.0f}s old)")
+                self._schedule_refresh(cache_key)
+                return payload
+        
+        fetch = self._inflight.get(cache_key)
+        if fetch is None:
+            fetch = self._start_fetch(cache_key)
+        else:
+            self.coalesced_requests += 1
+            logger.info(f"Joining in-flight weather fetch for {cache_key}")
+        
+        try:
+            # Shield so one cancelled caller does not cancel the fetch for the others
+            return await asyncio.shield(fetch)
+        except Exception as e:
+            if entry is None:
+                raise
+            self.stale_fallbacks += 1
+            logger.warning(f"Weather fetch failed ({e}); serving cached data for {cache_key}")
+            return entry[0]
+    
+    def _start_fetch(self, cache_key: Tuple[int, int]) -> asyncio.Future:
+        """Start the single in-flight fetch for a grid cell."""
+        fetch = asyncio.ensure_future(self._fetch_onecall(cache_key))
+        self._inflight[cache_key] = fetch
+        fetch.add_done_callback(lambda _: self._inflight.pop(cache_key, None))
+        return fetch
     
-    def __init__(self):
-        """Initialize weather service with caching and rate limiting."""
-        self.cache = {}  # Simple in-memory cache {(lat, lon): (timestamp, data)}
-        self.client = httpx.AsyncClient(timeout=10.0)
-        self.rate_limiter = RateLimiter(max_calls=60, period=60)  # 60/min for free tier
+    def _schedule_refresh(self, cache_key: Tuple[int, int]):
+        """Refresh a cached grid cell in the background, within MAX_REFRESHES."""
+        if cache_key in self._inflight:
+            return
+        if self._refreshing >= self.MAX_REFRESHES:
+            self.refreshes_skipped += 1
+            return
+        
+        self._refreshing += 1
+        self.background_refreshes += 1
+        fetch = self._start_fetch(cache_key)
+        fetch.add_done_callback(self._refresh_done)
+    
+    async def refresh_cell(self, cache_key: Tuple[int, int]) -> bool:
+        """
+        Fetch a grid cell now (joining any in-flight fetch), bypassing freshness checks.
+        
+        Returns:
+            True if the cell was fetched successfully
+        """
+        fetch = self._inflight.get(cache_key) or self._start_fetch(cache_key)
+        try:
+            await asyncio.shield(fetch)
+            return True
+        except Exception as e:
+            logger.warning(f"Weather refresh for {cache_key} failed: {e}")
+            return False
+    
+    def _refresh_done(self, fetch: asyncio.Future):
+        self._refreshing -= 1
+        if not fetch.cancelled() and fetch.exception() is not None:
+            # Keep serving the stale entry; the next read retries
+            logger.warning(f"Background weather refresh failed: {fetch.exception()}")
+    
+    async def _fetch_onecall(self, cache_key: Tuple[int, int]) -> Dict:
+        """Fetch the One Call payload for a grid cell from upstream and cache it."""
+        # Another worker may have refreshed this cell since we last looked
+        shared = self._load_from_disk(cache_key)
+        if shared is not None and shared[1] < self.CACHE_TTL * self.REFRESH_AHEAD:
+            logger.info(f"Using weather fetched by another worker for {cache_key}")
+            return shared[0]
+        
+        lat, lon = self.cell_center(cache_key)
+        
+        self.upstream_calls += 1
+        response = await self.upstream.get(
+            self.client,
+            self.BASE_URL,
+            params={
+                "lat": lat,
+                "lon": lon,
+                "appid": self.API_KEY,
+                "units": "metric",
+                "exclude": "minutely,daily,alerts"  # Only need current + hourly
+            }
+        )
+        response.raise_for_status()
+        payload = response.json()
         
+        fetched_at = time.time()
+        self.cache.set(cache_key, payload, stored_at=fetched_at)
+        self._record_pressure(cache_key, payload, persist=True)
+        if self.disk_cache is not None:
+            self.disk_cache.set(self._disk_key(cache_key), payload, stored_at=fetched_at)
+        logger.info(f"One Call payload fetched for {cache_key}")
+        return payload
+    
     async def get_current_weather(
         self, 
         lat: float, 
@@ -87,102 +345,87 @@ class WeatherService:
                 "aqi": 45  # Air Quality Index (if available)
             }
         """
-        # Check cache
-        cache_key = (round(lat, 2), round(lon, 2))
-        if cache_key in self.cache:
-            timestamp, data = self.cache[cache_key]
-            if datetime.now() - timestamp < timedelta(seconds=self.CACHE_TTL):
-                logger.info(f"Weather cache hit for {cache_key}")
-                return data
-        
-        # Fetch from API
         try:
-            await self.rate_limiter.acquire()
-            
-            response = await self.client.get(
-                self.BASE_URL,
-                params={
-                    "lat": lat,
-                    "lon": lon,
-                    "appid": self.API_KEY,
-                    "units": "metric",
-                    "exclude": "minutely,daily,alerts"  # Only need current + hourly
-                }
-            )
-            response.raise_for_status()
-            data = response.json()
-            
-            # Parse response
-            current = data.get('current', {})
-            weather_data = {
-                "pressure": current.get('pressure', 1013.25),  # hPa
-                "temperature": current.get('temp', 20.0),  # °C
-                "humidity": current.get('humidity', 50),  # %
-                "aqi": 50  # Default AQI, OpenWeather Air Pollution API is separate
-            }
-            
-            # Cache result
-            self.cache[cache_key] = (datetime.now(), weather_data)
-            logger.info(f"Weather fetched for {cache_key}: {weather_data}")
-            
-            return weather_data
-            
+            payload = await self._get_onecall(lat, lon)
         except httpx.HTTPError as e:
             logger.error(f"OpenWeather API error: {e}")
             return self._get_default_weather()
         except Exception as e:
             logger.error(f"Unexpected error fetching weather: {e}")
             return self._get_default_weather()
+        
+        current = payload.get('current', {})
+        return {
+            "pressure": current.get('pressure', 1013.25),  # hPa
+            "temperature": current.get('temp', 20.0),  # °C
+            "humidity": current.get('humidity', 50),  # %
+            "aqi": 50  # Default AQI, OpenWeather Air Pollution API is separate
+        }
     
     async def get_pressure_change(
         self, 
         lat: float, 
         lon: float,
         hours_ago: int = 3
-    ) -> float:
+    ) -> Optional[float]:
         """
         Calculate barometric pressure change over last N hours.
         
+        Uses the observed pressure history for the location's grid cell;
+        the upstream is only contacted (through the cache) to keep the
+        latest reading current. Without enough history in memory, the
+        cell's persisted history (possibly recorded by another worker) is
+        reloaded first.
+        
         Args:
             lat: Latitude
             lon: Longitude
             hours_ago: Number of hours to look back (default: 3)
         
         Returns:
-            Pressure delta in hPa (positive = rising, negative = falling)
+            Pressure delta in hPa (positive = rising, negative = falling),
+            or None until enough history has been observed
         """
         try:
-            await self.rate_limiter.acquire()
-            
-            response = await self.client.get(
-                self.BASE_URL,
-                params={
-                    "lat": lat,
-                    "lon": lon,
-                    "appid": self.API_KEY,
-                    "units": "metric",
-                    "exclude": "minutely,daily,alerts"
-                }
-            )
-            response.raise_for_status()
-            data = response.json()
-            
-            current_pressure = data.get('current', {}).get('pressure', 1013.25)
-            hourly = data.get('hourly', [])
-            
-            # Find pressure N hours ago
-            if len(hourly) >= hours_ago:
-                past_pressure = hourly[hours_ago - 1].get('pressure', current_pressure)
-                delta = current_pressure - past_pressure
-                logger.info(f"Pressure change ({hours_ago}h): {delta:.2f} hPa")
-                return delta
-            else:
-                logger.warning(f"Not enough hourly data for {hours_ago}h pressure change")
-                return 0.0
-                
+            await self._get_onecall(lat, lon)
         except Exception as e:
-            logger.error(f"Error calculating pressure change: {e}")
-            return 0.0
+            logger.error(f"Error refreshing weather for pressure change: {e}")
+        
+        cell = self.grid_cell(lat, lon)
+        delta = self.pressure_history.delta(cell, hours_ago)
+        if delta is None and self.pressure_store is not None:
+            since = time.time() - self.PRESSURE_HISTORY_HOURS * 3600
+            if self._load_pressure(self.pressure_store.load(since, key=self._disk_key(cell))):
+                delta = self.pressure_history.delta(cell, hours_ago)
+        if delta is None:
+            logger.warning(f"Not enough pressure history for {hours_ago}h pressure change")
+            return None
+        
+        logger.info(f"Pressure change ({hours_ago}h): {delta:.2f} hPa")
+        return delta
+    
+    def get_pressure_history(self, lat: float, lon: float) -> List[Dict]:
+        """Observed hourly pressure for a location's grid cell, oldest first."""
+        return [
+            {"timestamp": timestamp, "pressure": pressure}
+            for timestamp, pressure in self.pressure_history.series(self.grid_cell(lat, lon))
+        ]
+    
+    async def get_environment_features(self, lat: float, lon: float) -> Dict[str, float]:
+        """
+        Environment model features for a location, keyed by feature name.
+        
+        "Barometric Pressure Change" is the magnitude of the observed 3-hour
+        change, matching its prior (non-negative, hPa). It is left out until
+        3 hours of history exist, so it is imputed rather than reported as
+        "no change".
+        """
+        weather = await self.get_current_weather(lat, lon)
+        delta = await self.get_pressure_change(lat, lon, hours_ago=3)
+        features = {"Air Quality Index": weather["aqi"]}
+        if delta is not None:
+            features["Barometric Pressure Change"] = abs(delta)
+        return features
     
     async def get_forecast(
         self, 
@@ -202,37 +445,39 @@ class WeatherService:
             List of dicts with pressure, temp, humidity for each hour
         """
         try:
-            await self.rate_limiter.acquire()
-            
-            response = await self.client.get(
-                self.BASE_URL,
-                params={
-                    "lat": lat,
-                    "lon": lon,
-                    "appid": self.API_KEY,
-                    "units": "metric",
-                    "exclude": "minutely,daily,alerts"
-                }
-            )
-            response.raise_for_status()
-            data = response.json()
-            
-            forecast = []
-            hourly_data = data.get('hourly', [])
-            for hour_data in hourly_data[:min(hours, len(hourly_data))]:
-                forecast.append({
-                    "timestamp": hour_data.get('dt', 0),
-                    "pressure": hour_data.get('pressure', 1013.25),
-                    "temperature": hour_data.get('temp', 20.0),
-                    "humidity": hour_data.get('humidity', 50)
-                })
-            
-            logger.info(f"Forecast fetched: {len(forecast)} hours")
-            return forecast
-            
+            payload = await self._get_onecall(lat, lon)
         except Exception as e:
             logger.error(f"Error fetching forecast: {e}")
             return []
+        
+        forecast = []
+        hourly_data = payload.get('hourly', [])
+        for hour_data in hourly_data[:min(hours, len(hourly_data))]:
+            forecast.append({
+                "timestamp": hour_data.get('dt', 0),
+                "pressure": hour_data.get('pressure', 1013.25),
+                "temperature": hour_data.get('temp', 20.0),
+                "humidity": hour_data.get('humidity', 50)
+            })
+        
+        logger.info(f"Forecast derived: {len(forecast)} hours")
+        return forecast
+    
+    def cache_stats(self) -> Dict[str, float]:
+        """Cache size/hit-rate metrics plus upstream call counters."""
+        stats = self.cache.stats()
+        stats['grid_resolution'] = self.grid_resolution
+        stats['upstream_calls'] = self.upstream_calls
+        stats['coalesced_requests'] = self.coalesced_requests
+        stats['stale_hits'] = self.stale_hits
+        stats['background_refreshes'] = self.background_refreshes
+        stats['refreshes_skipped'] = self.refreshes_skipped
+        stats['stale_fallbacks'] = self.stale_fallbacks
+        stats['upstream'] = self.upstream.stats()
+        if self.disk_cache is not None:
+            for name, value in self.disk_cache.stats().items():
+                stats[f'disk_{name}'] = value
+        return stats
     
     def _get_default_weather(self) -> Dict[str, float]:
         """Fallback values if API unavailable."""
@@ -266,7 +511,9 @@ class WeatherService:
         return await self.get_forecast(lat, lon, hours)
     
     async def close(self):
-        """Close HTTP client."""
+        """Cancel in-flight fetches and close HTTP client."""
+        for fetch in list(self._inflight.values()):
+            fetch.cancel()
         await self.client.aclose()
 
 
@@ -0,0 +1,146 @@
+"""
+Scheduled Weather Prefetch
+
+Periodically refreshes weather for the grid cells where active users are,
+so user-facing requests are served from cache instead of waiting on
+OpenWeather. Each run spends at most a fixed share of the API quota and
+goes through the weather service's rate limiter and singleflight fetch.
+
+Author: ALINE Team
+Date: 2025-11-17
+"""
+
+import asyncio
+import logging
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class WeatherPrefetcher:
+    """Background loop that keeps active users' weather cells fresh."""
+
+    # Seconds between runs (0 disables the scheduler)
+    INTERVAL = float(os.getenv("WEATHER_PREFETCH_INTERVAL_S", "900"))
+
+    # Concurrent upstream fetches per run
+    CONCURRENCY = int(os.getenv("WEATHER_PREFETCH_CONCURRENCY", "4"))
+
+    # Users seen within this many days count as active
+    ACTIVE_DAYS = int(os.getenv("WEATHER_PREFETCH_ACTIVE_DAYS", "7"))
+
+    # Share of the API quota the prefetcher may spend, leaving the rest for requests
+    QUOTA_FRACTION = float(os.getenv("WEATHER_PREFETCH_QUOTA_FRACTION", "0.5"))
+
+    # Provider calls per day (OpenWeather free tier: 1,000)
+    DAILY_QUOTA = int(os.getenv("OPENWEATHER_DAILY_QUOTA", "1000"))
+
+    def __init__(
+        self,
+        weather_service,
+        database,
+        interval: Optional[float] = None,
+        concurrency: Optional[int] = None,
+        active_days: Optional[int] = None
+    ):
+        """
+        Initialize the prefetcher.
+
+        Args:
+            weather_service: WeatherService whose cache is populated
+            database: Database holding user locations
+            interval: Seconds between runs (default: INTERVAL)
+            concurrency: Concurrent fetches (default: CONCURRENCY)
+            active_days: Activity window in days (default: ACTIVE_DAYS)
+        """
+        self.weather_service = weather_service
+        self.database = database
+        self.interval = self.INTERVAL if interval is None else interval
+        self.concurrency = concurrency or self.CONCURRENCY
+        self.active_days = active_days or self.ACTIVE_DAYS
+
+        self._task: Optional[asyncio.Task] = None
+        self.last_run: Optional[Dict] = None
+
+    def budget_per_run(self) -> int:
+        """Upstream calls one run may spend under both the per-minute and daily quotas."""
+        per_minute = self.weather_service.rate_limiter.max_calls * self.interval / 60
+        per_day = self.DAILY_QUOTA * self.interval / 86400
+        return int(self.QUOTA_FRACTION * min(per_minute, per_day))
+
+    def due_cells(self) -> List[Tuple[int, int]]:
+        """
+        Active cells that will be missing or expired before the next run.
+
+        Missing cells come first, then the oldest entries.
+        """
+        service = self.weather_service
+        ages = {}
+        for lat, lon in self.database.get_active_user_locations(self.active_days):
+            cell = service.grid_cell(lat, lon)
+            if cell not in ages:
+                ages[cell] = service.cache.age(cell)
+
+        due = [
+            (cell, age) for cell, age in ages.items()
+            if age is None or age + self.interval >= service.CACHE_TTL
+        ]
+        due.sort(key=lambda item: float('inf') if item[1] is None else item[1], reverse=True)
+        return [cell for cell, _ in due]
+
+    async def run_once(self) -> Dict:
+        """
+        Prefetch due cells within this run's budget.
+
+        Returns:
+            Summary with counts of due, fetched, failed and deferred cells
+        """
+        start = time.monotonic()
+        due = self.due_cells()
+        batch = due[:self.budget_per_run()]
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def prefetch(cell):
+            async with semaphore:
+                return await self.weather_service.refresh_cell(cell)
+
+        results = await asyncio.gather(*[prefetch(cell) for cell in batch])
+
+        summary = {
+            'due': len(due),
+            'fetched': sum(results),
+            'failed': len(results) - sum(results),
+            'deferred': len(due) - len(batch),
+            'duration_s': round(time.monotonic() - start, 3)
+        }
+        self.last_run = summary
+        logger.info(f"Weather prefetch: {summary}")
+        return summary
+
+    async def _loop(self):
+        while True:
+            try:
+                await self.run_once()
+            except Exception as e:
+                logger.error(f"Weather prefetch run failed: {e}", exc_info=True)
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        """Start the background loop (no-op if disabled or already running)."""
+        if self.interval <= 0 or self._task is not None:
+            return
+        self._task = asyncio.create_task(self._loop())
+        logger.info(f"Weather prefetch scheduled every {self.interval:.0f}s")
+
+    async def stop(self):
+        """Cancel the background loop."""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
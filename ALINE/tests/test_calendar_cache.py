@@ -0,0 +1,123 @@
+"""
+Tests for the calendar connection read-through cache
+
+Author: ALINE Team
+Date: 2025-11-16
+"""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+# Add project root to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from service.cache import LRUCache, MISSING
+from service.database import Database
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / 'calendar.db')
+
+
+def count_queries(database, monkeypatch):
+    """Count connections opened by `database`"""
+    calls = {'n': 0}
+    original = database._connect
+
+    def counting_connect():
+        calls['n'] += 1
+        return original()
+
+    monkeypatch.setattr(database, '_connect', counting_connect)
+    return calls
+
+
+class TestLRUCache:
+    """Bounded LRU mapping"""
+
+    def test_evicts_least_recently_used(self):
+        cache = LRUCache(maxsize=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+
+        assert 'a' in cache and 'c' in cache
+        assert 'b' not in cache
+        assert cache.stats()['evictions'] == 1
+
+    def test_cached_none_is_not_a_miss(self):
+        cache = LRUCache()
+        cache.set('a', None)
+
+        assert cache.get('a') is None
+        assert cache.get('b') is MISSING
+
+
+class TestCalendarConnectionCache:
+    """Database-level read-through caching"""
+
+    def test_repeated_reads_hit_cache(self, db_path, monkeypatch):
+        database = Database(db_path, calendar_version_check=3600)
+        database.save_calendar_connection('u1', 'webcal://a/cal.ics', 'https://a/cal.ics')
+        calls = count_queries(database, monkeypatch)
+
+        for _ in range(5):
+            assert database.get_calendar_connection('u1')['normalizedUrl'] == 'https://a/cal.ics'
+            assert database.get_calendar_connection('missing') is None
+
+        assert calls['n'] == 2
+
+    def test_returned_dict_is_a_copy(self, db_path):
+        database = Database(db_path)
+        database.save_calendar_connection('u1', 'https://a/cal.ics', 'https://a/cal.ics')
+
+        database.get_calendar_connection('u1')['normalizedUrl'] = 'mutated'
+        assert database.get_calendar_connection('u1')['normalizedUrl'] == 'https://a/cal.ics'
+
+    def test_local_writes_invalidate(self, db_path):
+        database = Database(db_path, calendar_version_check=3600)
+        assert database.get_calendar_connection('u1') is None
+
+        database.save_calendar_connection('u1', 'https://a/cal.ics', 'https://a/cal.ics')
+        first = database.get_calendar_connection('u1')
+        assert first['normalizedUrl'] == 'https://a/cal.ics'
+        assert first['lastVerifiedAt'] is None
+
+        database.update_verification_time('u1')
+        verified = database.get_calendar_connection('u1')
+        assert verified['lastVerifiedAt'] is not None
+
+        database.save_calendar_connection('u1', 'https://b/cal.ics', 'https://b/cal.ics')
+        assert database.get_calendar_connection('u1')['normalizedUrl'] == 'https://b/cal.ics'
+
+        database.delete_calendar_connection('u1')
+        assert database.get_calendar_connection('u1') is None
+
+    def test_local_write_keeps_other_entries(self, db_path):
+        database = Database(db_path, calendar_version_check=0)
+        database.save_calendar_connection('u1', 'https://a/cal.ics', 'https://a/cal.ics')
+        database.get_calendar_connection('u1')
+
+        database.save_calendar_connection('u2', 'https://b/cal.ics', 'https://b/cal.ics')
+        assert 'u1' in database.calendar_cache
+
+    def test_writes_from_other_process_invalidate(self, db_path):
+        reader = Database(db_path, calendar_version_check=0)
+        writer = Database(db_path)
+
+        writer.save_calendar_connection('u1', 'https://a/cal.ics', 'https://a/cal.ics')
+        assert reader.get_calendar_connection('u1')['normalizedUrl'] == 'https://a/cal.ics'
+
+        writer.save_calendar_connection('u1', 'https://b/cal.ics', 'https://b/cal.ics')
+        assert reader.get_calendar_connection('u1')['normalizedUrl'] == 'https://b/cal.ics'
+
+        writer.delete_calendar_connection('u1')
+        assert reader.get_calendar_connection('u1') is None
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "--tb=short"])
@@ -0,0 +1,525 @@
+"""
+Tests for CalendarService HTTP usage against fake calendar hosts
+
+Author: ALINE Team
+Date: 2025-11-17
+"""
+
+import asyncio
+import sys
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+from zoneinfo import ZoneInfo
+
+import httpx
+import pytest
+
+# Add project root to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import service.calendar as calendar_module
+from service.calendar import CalendarService, EventIndex, hourly_load, parse_ics, update_priors
+
+ICS_FEED = (
+    "BEGIN:VCALENDAR\r\nVERSION:2.0\r\n"
+    "BEGIN:VEVENT\r\nUID:1\r\nDTSTART:20251117T090000Z\r\nDTEND:20251117T100000Z\r\n"
+    "SUMMARY:Standup\r\nEND:VEVENT\r\nEND:VCALENDAR\r\n"
+)
+
+
+class FakeCalendarHost:
+    """Mock transport handler serving an ICS feed"""
+
+    def __init__(self, body=ICS_FEED, status_code=200):
+        self.body = body
+        self.status_code = status_code
+        self.requests = []
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request)
+        return httpx.Response(
+            self.status_code, text=self.body, headers={'content-type': 'text/calendar'}
+        )
+
+
+@pytest.fixture
+def host():
+    return FakeCalendarHost()
+
+
+@pytest.fixture
+def counting_client(host, monkeypatch):
+    """Patch httpx.AsyncClient so every client the service creates is counted and served by `host`"""
+
+    class CountingClient(httpx.AsyncClient):
+        created = []
+
+        def __init__(self, **kwargs):
+            CountingClient.created.append(kwargs)
+            kwargs['transport'] = httpx.MockTransport(host)
+            super().__init__(**kwargs)
+
+    monkeypatch.setattr(calendar_module.httpx, 'AsyncClient', CountingClient)
+    return CountingClient
+
+
+class TestPooledClient:
+    """One long-lived client for all calendar traffic"""
+
+    @pytest.mark.asyncio
+    async def test_client_is_reused_across_calls(self, host, counting_client):
+        service = CalendarService()
+
+        for _ in range(5):
+            assert await service.verify_ics_feed('https://cal.test/a.ics') == (True, None)
+
+        assert len(counting_client.created) == 1
+        assert len(host.requests) == 5
+        await service.close()
+
+    @pytest.mark.asyncio
+    async def test_pool_limits_are_configured(self, counting_client):
+        service = CalendarService()
+        service.client
+
+        limits = counting_client.created[0]['limits']
+        assert limits.max_connections == CalendarService.MAX_CONNECTIONS
+        assert limits.max_keepalive_connections == CalendarService.MAX_KEEPALIVE_CONNECTIONS
+        assert counting_client.created[0]['http2'] == CalendarService.HTTP2
+        await service.close()
+
+    @pytest.mark.asyncio
+    async def test_close_releases_and_next_use_recreates(self, counting_client):
+        service = CalendarService()
+        first = service.client
+
+        await service.close()
+        assert first.is_closed
+
+        assert service.client is not first
+        assert len(counting_client.created) == 2
+        await service.close()
+
+    def test_lifespan_closes_client(self, monkeypatch):
+        from fastapi.testclient import TestClient
+        import service.main as main
+
+        service = CalendarService(client=httpx.AsyncClient(transport=httpx.MockTransport(FakeCalendarHost())))
+        client = service.client
+        monkeypatch.setattr(main, 'calendar_service', service)
+        # The lifespan also closes the weather client; keep the shared one usable
+        from service.weather import WeatherService
+        monkeypatch.setattr(main, 'weather_service', WeatherService(disk_cache_path=''))
+
+        with TestClient(main.app):
+            pass
+
+        assert client.is_closed
+
+
+
+class StreamingCalendarHost:
+    """Serves a large feed in chunks and records how much of it was read"""
+
+    def __init__(self, head: bytes, total_bytes: int, chunk_size: int = 1024):
+        self.head = head
+        self.total_bytes = total_bytes
+        self.chunk_size = chunk_size
+        self.bytes_sent = 0
+
+    async def body(self):
+        data = self.head
+        while self.bytes_sent < self.total_bytes:
+            chunk = data[:self.chunk_size] or b'X' * self.chunk_size
+            data = data[self.chunk_size:]
+            self.bytes_sent += len(chunk)
+            yield chunk
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, content=self.body(), headers={'content-type': 'text/calendar'})
+
+
+def service_for(handler) -> CalendarService:
+    return CalendarService(client=httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+
+
+class TestStreamingVerification:
+    """Verification reads only the start of the feed"""
+
+    @pytest.mark.asyncio
+    async def test_stops_after_markers(self):
+        host = StreamingCalendarHost(ICS_FEED.encode(), total_bytes=5_000_000)
+
+        assert await service_for(host).verify_ics_feed('https://cal.test/big.ics') == (True, None)
+        assert host.bytes_sent <= 2048
+
+    @pytest.mark.asyncio
+    async def test_stops_at_byte_cap(self):
+        head = b'BEGIN:VCALENDAR\r\n' + b'BEGIN:VTIMEZONE\r\n' * 2000
+        host = StreamingCalendarHost(head, total_bytes=5_000_000)
+        service = service_for(host)
+
+        assert await service.verify_ics_feed('https://cal.test/tz.ics') == (True, None)
+        assert host.bytes_sent <= service.VERIFY_MAX_BYTES + host.chunk_size
+
+    @pytest.mark.asyncio
+    async def test_non_calendar_rejected_within_cap(self):
+        host = StreamingCalendarHost(b'<html>', total_bytes=5_000_000)
+        service = service_for(host)
+
+        valid, error = await service.verify_ics_feed('https://cal.test/page')
+
+        assert not valid
+        assert 'VCALENDAR' in error
+        assert host.bytes_sent <= service.VERIFY_MAX_BYTES + host.chunk_size
+
+    @pytest.mark.asyncio
+    async def test_marker_split_across_chunks(self):
+        host = StreamingCalendarHost(ICS_FEED.encode(), total_bytes=len(ICS_FEED), chunk_size=7)
+
+        assert await service_for(host).verify_ics_feed('https://cal.test/a.ics') == (True, None)
+
+    @pytest.mark.asyncio
+    async def test_http_error(self):
+        service = service_for(FakeCalendarHost(status_code=404))
+
+        valid, error = await service.verify_ics_feed('https://cal.test/missing.ics')
+        assert not valid
+        assert '404' in error
+
+
+def calendar(*events: str) -> str:
+    return "BEGIN:VCALENDAR\r\nVERSION:2.0\r\n" + "".join(events) + "END:VCALENDAR\r\n"
+
+
+def vevent(uid: str, *lines: str) -> str:
+    return "BEGIN:VEVENT\r\nUID:" + uid + "\r\n" + "".join(l + "\r\n" for l in lines) + "END:VEVENT\r\n"
+
+
+def day_hours(text: str, day: date, tz=timezone.utc):
+    """Local (start_hour, end_hour) floats of the busy intervals on `day`"""
+    start = datetime(day.year, day.month, day.day, tzinfo=tz)
+    occurrences = EventIndex.from_ics(text).occurrences(start, start + timedelta(days=1), tz)
+    return [
+        ((s.astimezone(tz) - start).total_seconds() / 3600, (e.astimezone(tz) - start).total_seconds() / 3600)
+        for s, e in occurrences
+    ]
+
+
+class TestICSParsing:
+    """VEVENT parsing"""
+
+    def test_folding_timezones_and_duration(self):
+        text = calendar(
+            vevent('a', 'DTSTART;TZID="Europe/Berlin":20251117T090000', 'DURATION:PT1H30M',
+                   'SUMMARY:Long', ' folded'),
+            vevent('b', 'DTSTART:20251117T120000Z', 'DTEND:20251117T123000Z'),
+        )
+
+        assert day_hours(text, date(2025, 11, 17)) == [(8.0, 9.5), (12.0, 12.5)]
+
+    def test_free_cancelled_and_all_day_events_are_not_busy(self):
+        text = calendar(
+            vevent('a', 'DTSTART;VALUE=DATE:20251117', 'DTEND;VALUE=DATE:20251118'),
+            vevent('b', 'DTSTART:20251117T090000Z', 'DTEND:20251117T100000Z', 'TRANSP:TRANSPARENT'),
+            vevent('c', 'DTSTART:20251117T110000Z', 'DTEND:20251117T120000Z', 'STATUS:CANCELLED'),
+        )
+
+        assert len(parse_ics(text)) == 3
+        assert day_hours(text, date(2025, 11, 17)) == []
+
+    def test_nested_components_and_malformed_events(self):
+        text = calendar(
+            vevent('a', 'DTSTART:20251117T090000Z', 'DTEND:20251117T100000Z',
+                   'BEGIN:VALARM', 'TRIGGER:-PT15M', 'END:VALARM'),
+            vevent('b', 'DTSTART:not-a-date'),
+        )
+
+        assert [e.uid for e in parse_ics(text)] == ['a']
+
+    def test_floating_times_use_user_timezone(self):
+        tz = ZoneInfo('America/New_York')
+        text = calendar(vevent('a', 'DTSTART:20251117T090000', 'DTEND:20251117T100000'))
+
+        assert day_hours(text, date(2025, 11, 17), tz) == [(9.0, 10.0)]
+
+
+class TestRecurrence:
+    """Horizon-limited recurrence expansion"""
+
+    def test_weekly_series_started_years_ago(self):
+        text = calendar(vevent(
+            'a', 'DTSTART:20150105T090000Z', 'DTEND:20150105T093000Z', 'RRULE:FREQ=WEEKLY;BYDAY=MO,WE'
+        ))
+
+        assert day_hours(text, date(2025, 11, 17)) == [(9.0, 9.5)]  # Monday
+        assert day_hours(text, date(2025, 11, 18)) == []            # Tuesday
+        assert day_hours(text, date(2025, 11, 19)) == [(9.0, 9.5)]  # Wednesday
+
+    def test_count_until_and_interval(self):
+        text = calendar(
+            vevent('a', 'DTSTART:20251101T080000Z', 'DTEND:20251101T090000Z', 'RRULE:FREQ=DAILY;COUNT=5'),
+            vevent('b', 'DTSTART:20251101T100000Z', 'DTEND:20251101T110000Z',
+                   'RRULE:FREQ=DAILY;UNTIL=20251110T235959Z'),
+            vevent('c', 'DTSTART:20251101T120000Z', 'DTEND:20251101T130000Z', 'RRULE:FREQ=DAILY;INTERVAL=2'),
+        )
+
+        assert day_hours(text, date(2025, 11, 5)) == [(8.0, 9.0), (10.0, 11.0), (12.0, 13.0)]
+        assert day_hours(text, date(2025, 11, 6)) == [(10.0, 11.0)]
+        assert day_hours(text, date(2025, 11, 17)) == [(12.0, 13.0)]
+        assert day_hours(text, date(2025, 11, 18)) == []
+
+    def test_exdate_and_moved_instance(self):
+        text = calendar(
+            vevent('a', 'DTSTART:20251103T090000Z', 'DTEND:20251103T100000Z', 'RRULE:FREQ=DAILY',
+                   'EXDATE:20251105T090000Z'),
+            vevent('a', 'RECURRENCE-ID:20251106T090000Z', 'DTSTART:20251106T150000Z', 'DTEND:20251106T160000Z'),
+            vevent('a', 'RECURRENCE-ID:20251107T090000Z', 'DTSTART:20251107T090000Z',
+                   'DTEND:20251107T100000Z', 'STATUS:CANCELLED'),
+        )
+
+        assert day_hours(text, date(2025, 11, 4)) == [(9.0, 10.0)]
+        assert day_hours(text, date(2025, 11, 5)) == []
+        assert day_hours(text, date(2025, 11, 6)) == [(15.0, 16.0)]
+        assert day_hours(text, date(2025, 11, 7)) == []
+
+    def test_monthly_nth_weekday(self):
+        text = calendar(vevent(
+            'a', 'DTSTART:20250114T160000Z', 'DTEND:20250114T170000Z', 'RRULE:FREQ=MONTHLY;BYDAY=2TU'
+        ))
+
+        assert day_hours(text, date(2025, 11, 11)) == [(16.0, 17.0)]
+        assert day_hours(text, date(2025, 11, 18)) == []
+
+    def test_wall_clock_kept_across_dst(self):
+        tz = ZoneInfo('Europe/Berlin')
+        text = calendar(vevent(
+            'a', 'DTSTART;TZID=Europe/Berlin:20250901T090000',
+            'DTEND;TZID=Europe/Berlin:20250901T100000', 'RRULE:FREQ=WEEKLY'
+        ))
+
+        assert day_hours(text, date(2025, 11, 17), tz) == [(9.0, 10.0)]
+
+
+class TestHourlyLoad:
+    """Bucketing into 24 local hourly windows"""
+
+    def load(self, *intervals, day=date(2025, 11, 17), tz=timezone.utc):
+        occurrences = [
+            (datetime(2025, 11, 17, tzinfo=tz) + timedelta(hours=s), datetime(2025, 11, 17, tzinfo=tz) + timedelta(hours=e))
+            for s, e in intervals
+        ]
+        return hourly_load(sorted(occurrences), day, tz)
+
+    def test_meetings_back_to_back_and_after_hours(self):
+        load = self.load((9, 10), (10, 11), (11.5, 12), (19, 20.5))
+        hourly = load['hourly']
+
+        assert len(hourly['meeting_count']) == 24
+        assert hourly['meeting_count'][9:13] == [1, 1, 1, 0]
+        assert hourly['back_to_back'][10] == 1
+        assert sum(hourly['back_to_back']) == 1
+        assert hourly['busy_fraction'][11] == 0.5
+        assert hourly['after_hours'][19:21] == [1.0, 0.5]
+        assert sum(hourly['after_hours'][:19]) == 0
+        assert load['summary'] == {'meetings': 4, 'busy_hours': 4.0, 'back_to_back': 1, 'after_hours': 1.5}
+
+    def test_double_booking_is_not_double_counted(self):
+        load = self.load((14, 15), (14.5, 15.5))
+
+        assert load['hourly']['meeting_count'][14] == 2
+        assert load['summary']['busy_hours'] == 1.5
+        assert load['summary']['back_to_back'] == 1
+
+    def test_weekend_counts_as_after_hours(self):
+        day = date(2025, 11, 22)
+        occurrences = [(datetime(2025, 11, 22, 10, tzinfo=timezone.utc), datetime(2025, 11, 22, 11, tzinfo=timezone.utc))]
+
+        assert hourly_load(occurrences, day, timezone.utc)['summary']['after_hours'] == 1.0
+
+    def test_priors_follow_load(self):
+        busy = {'meetings': 8, 'busy_hours': 8.0, 'back_to_back': 5, 'after_hours': 2.0}
+        priors = {'stress_level': {'a': 2, 'b': 2}, 'sleep_quality': {'a': 2, 'b': 2}, 'hormonal': {'a': 1, 'b': 3}}
+
+        posteriors, features = update_priors(priors, busy, weight=4)
+
+        assert posteriors['stress_level'] == {'a': 6.0, 'b': 2.0}
+        assert posteriors['sleep_quality'] == {'a': 2.0, 'b': 6.0}
+        assert posteriors['hormonal'] == {'a': 1.0, 'b': 3.0}
+        assert [f['feature'] for f in features] == list(priors)
+        assert features[0]['meanPosterior'] == 0.75
+
+
+def busy_day_feed() -> str:
+    return calendar(
+        vevent('standup', 'DTSTART:20250106T090000Z', 'DTEND:20250106T091500Z', 'RRULE:FREQ=DAILY'),
+        vevent('review', 'DTSTART:20251118T091500Z', 'DTEND:20251118T103000Z'),
+    )
+
+
+class TestLocalContext:
+    """In-process context generation"""
+
+    @pytest.mark.asyncio
+    async def test_event_index_is_cached_per_feed(self):
+        host = FakeCalendarHost(body=busy_day_feed())
+        service = service_for(host)
+
+        for _ in range(3):
+            load = await service.calendar_load('https://cal.test/a.ics', date(2025, 11, 18), timezone.utc)
+        await service.calendar_load('https://cal.test/b.ics', date(2025, 11, 18), timezone.utc)
+
+        assert load['summary']['meetings'] == 2
+        assert load['summary']['back_to_back'] == 1
+        assert len(host.requests) == 2
+
+    @pytest.mark.asyncio
+    async def test_oversized_feed_is_rejected(self):
+        host = StreamingCalendarHost(ICS_FEED.encode(), total_bytes=5_000_000)
+        service = service_for(host)
+        service.FEED_MAX_BYTES = 64 * 1024
+
+        with pytest.raises(calendar_module.CalendarFeedError):
+            await service.get_event_index('https://cal.test/big.ics')
+        assert host.bytes_sent <= service.FEED_MAX_BYTES + host.chunk_size
+
+    def test_endpoint_answers_locally(self, tmp_path, monkeypatch):
+        from fastapi.testclient import TestClient
+        import service.main as main
+        from service.database import Database
+
+        database = Database(str(tmp_path / 'calendar.db'))
+        database.save_calendar_connection('u1', 'https://cal.test/a.ics', 'https://cal.test/a.ics')
+        host = FakeCalendarHost(body=busy_day_feed())
+        monkeypatch.setattr(main, 'db', database)
+        monkeypatch.setattr(main, 'calendar_service', service_for(host))
+
+        response = TestClient(main.app).post('/aline/generate-context', json={
+            'userId': 'u1',
+            'priors': {'stress_level': {'a': 2, 'b': 2}},
+            'date': '2025-11-18',
+            'timezone': 'UTC'
+        })
+
+        assert response.status_code == 200
+        body = response.json()
+        assert body['calendarLoad']['hourly']['meeting_count'][9] == 2
+        assert body['posteriors']['stress_level']['a'] > 2
+        assert len(host.requests) == 1
+
+    def test_endpoint_rejects_bad_timezone(self, tmp_path, monkeypatch):
+        from fastapi.testclient import TestClient
+        import service.main as main
+        from service.database import Database
+
+        database = Database(str(tmp_path / 'calendar.db'))
+        database.save_calendar_connection('u1', 'https://cal.test/a.ics', 'https://cal.test/a.ics')
+        monkeypatch.setattr(main, 'db', database)
+
+        response = TestClient(main.app).post('/aline/generate-context', json={
+            'userId': 'u1', 'priors': {}, 'timezone': 'Mars/Olympus'
+        })
+
+        assert response.status_code == 400
+
+
+class ValidatingCalendarHost:
+    """Serves a mutable feed with ETag/Last-Modified and honours conditional requests"""
+
+    def __init__(self, body: str, validators: bool = True):
+        self.body = body
+        self.validators = validators
+        self.version = 1
+        self.statuses = []
+        self.delay = 0.0
+
+    def publish(self, body: str):
+        self.body = body
+        self.version += 1
+
+    async def __call__(self, request: httpx.Request) -> httpx.Response:
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        etag = f'"v{self.version}"'
+        headers = {'content-type': 'text/calendar'}
+        if self.validators:
+            headers.update({'etag': etag, 'last-modified': f'Mon, 17 Nov 2025 0{self.version}:00:00 GMT'})
+            if request.headers.get('if-none-match') == etag:
+                self.statuses.append(304)
+                return httpx.Response(304, headers=headers)
+        self.statuses.append(200)
+        return httpx.Response(200, text=self.body, headers=headers)
+
+
+def revalidating_service(host) -> CalendarService:
+    service = service_for(host)
+    service.INDEX_TTL = 0  # revalidate on every lookup
+    return service
+
+
+class TestConditionalRefresh:
+    """Revalidation with validators and incremental re-indexing"""
+
+    @pytest.mark.asyncio
+    async def test_unchanged_feed_costs_a_304(self):
+        host = ValidatingCalendarHost(busy_day_feed())
+        service = revalidating_service(host)
+
+        first = await service.get_event_index('https://cal.test/a.ics')
+        second = await service.get_event_index('https://cal.test/a.ics')
+
+        assert second is first
+        assert host.statuses == [200, 304]
+        assert (service.not_modified, service.reindexed) == (1, 1)
+
+    @pytest.mark.asyncio
+    async def test_same_body_without_validators_is_not_reparsed(self):
+        host = ValidatingCalendarHost(busy_day_feed(), validators=False)
+        service = revalidating_service(host)
+
+        first = await service.get_event_index('https://cal.test/a.ics')
+        second = await service.get_event_index('https://cal.test/a.ics')
+
+        assert second is first
+        assert host.statuses == [200, 200]
+        assert service.unchanged_bodies == 1
+
+    @pytest.mark.asyncio
+    async def test_changed_feed_reparses_changed_uids_only(self):
+        events = [vevent(f'e{i}', f'DTSTART:202511{10 + i}T090000Z', f'DTEND:202511{10 + i}T100000Z') for i in range(5)]
+        host = ValidatingCalendarHost(calendar(*events))
+        service = revalidating_service(host)
+        await service.get_event_index('https://cal.test/a.ics')
+
+        events[2] = vevent('e2', 'DTSTART:20251112T140000Z', 'DTEND:20251112T150000Z')
+        host.publish(calendar(*events, vevent('new', 'DTSTART:20251118T090000Z', 'DTEND:20251118T100000Z')))
+        index = await service.get_event_index('https://cal.test/a.ics')
+
+        assert (index.reparsed, index.reused) == (2, 4)
+        start = datetime(2025, 11, 12, tzinfo=timezone.utc)
+        assert index.occurrences(start, start + timedelta(days=1), timezone.utc)[0][0].hour == 14
+
+    @pytest.mark.asyncio
+    async def test_failed_revalidation_serves_cached_index(self):
+        host = ValidatingCalendarHost(busy_day_feed())
+        service = revalidating_service(host)
+        first = await service.get_event_index('https://cal.test/a.ics')
+
+        host.validators = False
+        host.body = '<html>maintenance</html>'
+        assert await service.get_event_index('https://cal.test/a.ics') is first
+
+    @pytest.mark.asyncio
+    async def test_concurrent_revalidations_are_coalesced(self):
+        host = ValidatingCalendarHost(busy_day_feed())
+        host.delay = 0.05
+        service = revalidating_service(host)
+
+        indexes = await asyncio.gather(*(service.get_event_index('https://cal.test/a.ics') for _ in range(5)))
+
+        assert len(host.statuses) == 1
+        assert all(index is indexes[0] for index in indexes)
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "--tb=short"])
@@ -0,0 +1,122 @@
+"""
+Tests for bulk calendar context regeneration
+
+Author: ALINE Team
+Date: 2025-11-17
+"""
+
+import asyncio
+import sys
+from datetime import date
+from pathlib import Path
+
+import httpx
+import pytest
+
+# Add project root to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from service.calendar import CalendarService
+from service.context_batch import ContextBatchRunner
+from service.database import Database
+
+DAY = date(2025, 11, 18)
+
+FEED = (
+    "BEGIN:VCALENDAR\r\nBEGIN:VEVENT\r\nUID:1\r\nDTSTART:20251118T090000Z\r\n"
+    "DTEND:20251118T100000Z\r\nEND:VEVENT\r\nEND:VCALENDAR\r\n"
+)
+
+
+class CalendarHosts:
+    """Serves feeds for several hosts, tracking per-host concurrency"""
+
+    def __init__(self, delay=0.01, broken=()):
+        self.delay = delay
+        self.broken = set(broken)
+        self.requests = []
+        self.active = {}
+        self.peak = {}
+
+    async def __call__(self, request: httpx.Request) -> httpx.Response:
+        host = request.url.host
+        self.requests.append(request.url.path)
+        self.active[host] = self.active.get(host, 0) + 1
+        self.peak[host] = max(self.peak.get(host, 0), self.active[host])
+        await asyncio.sleep(self.delay)
+        self.active[host] -= 1
+        if request.url.path in self.broken:
+            return httpx.Response(404)
+        return httpx.Response(200, text=FEED)
+
+
+@pytest.fixture
+def database(tmp_path):
+    database = Database(str(tmp_path / 'batch.db'))
+    for i in range(12):
+        host = 'a.cal.test' if i % 3 else 'b.cal.test'
+        url = f'https://{host}/u{i:02d}.ics'
+        database.save_calendar_connection(f'u{i:02d}', url, url)
+    return database
+
+
+def make_runner(database, hosts, **kwargs):
+    calendar = CalendarService(client=httpx.AsyncClient(transport=httpx.MockTransport(hosts)))
+    options = dict(page_size=5, concurrency=8, host_concurrency=2, host_rate=1000)
+    options.update(kwargs)
+    return ContextBatchRunner(database, calendar, DAY, **options)
+
+
+class TestContextBatch:
+    """Paged, bounded, resumable regeneration"""
+
+    @pytest.mark.asyncio
+    async def test_all_users_get_a_context(self, database):
+        hosts = CalendarHosts()
+
+        summary = await make_runner(database, hosts).run()
+
+        assert (summary['succeeded'], summary['failed'], summary['pages']) == (12, 0, 3)
+        assert summary['users_per_s'] > 0
+        context = database.get_calendar_context('u04', DAY.isoformat())
+        assert context['calendar_load']['summary']['meetings'] == 1
+        assert context['posteriors']['stress_level']['a'] > 2
+        assert database.get_checkpoint(f"calendar_contexts:{DAY.isoformat()}") is None
+
+    @pytest.mark.asyncio
+    async def test_per_host_concurrency(self, database):
+        hosts = CalendarHosts(delay=0.03)
+
+        await make_runner(database, hosts, page_size=100, host_concurrency=2).run()
+
+        assert hosts.peak == {'a.cal.test': 2, 'b.cal.test': 2}
+
+    @pytest.mark.asyncio
+    async def test_interrupted_run_resumes(self, database):
+        hosts = CalendarHosts()
+
+        first = await make_runner(database, hosts).run(max_pages=1)
+        assert first['processed'] == 5
+
+        second = await make_runner(database, hosts).run()
+
+        assert second['processed'] == 7
+        assert len(hosts.requests) == 12
+
+    @pytest.mark.asyncio
+    async def test_failures_are_counted_and_retried_next_run(self, database):
+        hosts = CalendarHosts(broken={'/u03.ics'})
+        runner = make_runner(database, hosts)
+
+        summary = await runner.run()
+        assert (summary['succeeded'], summary['failed']) == (11, 1)
+        assert runner.errors[0][0] == 'u03'
+        assert database.get_calendar_context('u03', DAY.isoformat()) is None
+
+        hosts.broken.clear()
+        rerun = await make_runner(database, hosts).run()
+        assert (rerun['succeeded'], rerun['skipped']) == (1, 11)
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "--tb=short"])
@@ -0,0 +1,125 @@
+"""
+Tests for incrementally maintained feedback accuracy/calibration aggregates
+
+Author: ALINE Team
+Date: 2025-11-16
+"""
+
+import random
+import sqlite3
+import sys
+from pathlib import Path
+
+import pytest
+
+# Add project root to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from service.database import Database
+
+
+@pytest.fixture
+def database(tmp_path):
+    """Isolated database per test"""
+    return Database(str(tmp_path / 'aggregates.db'))
+
+
+def raw_accuracy(database, user_id):
+    """Reference accuracy computed by scanning user_feedback"""
+    with sqlite3.connect(database.db_path) as conn:
+        return conn.execute("""
+            SELECT
+                AVG(CASE
+                    WHEN (predicted_risk > 0.5 AND actual_outcome = 1) OR
+                         (predicted_risk <= 0.5 AND actual_outcome = 0)
+                    THEN 1.0 ELSE 0.0
+                END),
+                COUNT(*),
+                AVG((predicted_risk - actual_outcome) * (predicted_risk - actual_outcome))
+            FROM user_feedback
+            WHERE user_id = ? AND predicted_risk IS NOT NULL
+        """, (user_id,)).fetchone()
+
+
+def aggregate_rows(database):
+    with sqlite3.connect(database.db_path) as conn:
+        daily = conn.execute(
+            "SELECT user_id, day, num_predictions, num_correct, ROUND(brier_sum, 9) "
+            "FROM user_feedback_daily ORDER BY user_id, day"
+        ).fetchall()
+        calibration = conn.execute(
+            "SELECT user_id, day, bin, count, positives, ROUND(predicted_sum, 9) "
+            "FROM user_feedback_calibration ORDER BY user_id, day, bin"
+        ).fetchall()
+    return daily, calibration
+
+
+class TestFeedbackAggregates:
+    """Aggregates stay consistent with the raw feedback table"""
+
+    def test_matches_raw_scan_across_write_paths(self, database):
+        rng = random.Random(0)
+
+        for i in range(60):
+            database.add_feedback(
+                'u1', f'2025-10-{1 + i % 30:02d}',  # dates repeat -> REPLACE
+                had_migraine=rng.random() < 0.3,
+                predicted_prob=rng.choice([None, rng.random()])
+            )
+        database.add_feedback_batch([
+            {'user_id': 'u1', 'date': f'2025-11-{d:02d}', 'had_migraine': d % 3 == 0, 'predicted_prob': d / 30}
+            for d in range(1, 16)
+        ])
+        database.import_feedback_chunk([
+            {'user_id': 'u1', 'date': f'2025-11-{d:02d}', 'had_migraine': True, 'predicted_prob': 0.9}
+            for d in range(10, 21)
+        ])
+
+        stats = database.get_user_accuracy('u1')
+        accuracy, count, brier = raw_accuracy(database, 'u1')
+
+        assert stats['num_predictions'] == count
+        assert stats['accuracy'] == pytest.approx(accuracy)
+        assert stats['brier_score'] == pytest.approx(brier)
+
+        calibration = database.get_user_calibration('u1')
+        assert sum(b['count'] for b in calibration) == count
+        assert all(0 <= b['bin'] < 10 for b in calibration)
+
+    def test_rebuild_matches_incremental(self, database):
+        for d in range(1, 11):
+            database.add_feedback('u1', f'2025-11-{d:02d}', d % 2 == 0, predicted_prob=d / 10)
+            database.add_feedback('u2', f'2025-11-{d:02d}', d % 3 == 0, predicted_prob=1 - d / 10)
+        database.add_feedback('u1', '2025-11-05', True, predicted_prob=0.95)
+
+        incremental = aggregate_rows(database)
+        database.rebuild_feedback_aggregates()
+
+        assert aggregate_rows(database) == incremental
+
+    def test_rows_without_prediction_are_ignored(self, database):
+        database.add_feedback('u1', '2025-11-01', True)
+
+        assert database.get_user_accuracy('u1') == {
+            'accuracy': 0.0, 'num_predictions': 0, 'brier_score': None
+        }
+
+    def test_window_excludes_old_buckets(self, database):
+        database.add_feedback('u1', '2025-11-01', True, predicted_prob=0.8)
+        with sqlite3.connect(database.db_path) as conn:
+            conn.execute("UPDATE user_feedback SET timestamp = timestamp - 40 * 86400")
+
+        assert database.get_user_accuracy('u1', window_days=30)['num_predictions'] == 0
+        assert database.get_user_accuracy('u1', window_days=60)['num_predictions'] == 1
+
+    def test_existing_database_is_backfilled(self, tmp_path):
+        db_path = tmp_path / 'legacy.db'
+        Database(str(db_path)).add_feedback('u1', '2025-11-01', True, predicted_prob=0.8)
+        with sqlite3.connect(db_path) as conn:
+            conn.execute("DROP TABLE user_feedback_daily")
+
+        assert Database(str(db_path)).get_user_accuracy('u1')['num_predictions'] == 1
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "--tb=short"])
@@ -0,0 +1,98 @@
+"""
+Tests for keyset-paginated feedback history
+
+Author: ALINE Team
+Date: 2025-11-16
+"""
+
+import sqlite3
+import sys
+from pathlib import Path
+
+import pytest
+
+# Add project root to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from service.database import Database
+
+
+@pytest.fixture
+def database(tmp_path):
+    """Database with 50 days of feedback for one user and noise for others"""
+    database = Database(str(tmp_path / 'history.db'))
+    database.import_feedback_chunk([
+        {'user_id': user_id, 'date': f'2025-{m:02d}-{d:02d}', 'had_migraine': d % 5 == 0,
+         'predicted_prob': d / 31, 'notes': 'long note ' * 20}
+        for user_id in ('u1', 'u2')
+        for m in (10, 11)
+        for d in range(1, 26)
+    ])
+    return database
+
+
+class TestFeedbackHistoryQuery:
+    """Database-level pagination"""
+
+    @pytest.mark.parametrize('before', [None, '2025-11-01'])
+    def test_query_plan_uses_covering_index(self, database, before):
+        query, params = Database._feedback_history_query('u1', 30, before)
+
+        with sqlite3.connect(database.db_path) as conn:
+            plan = " ".join(row[-1] for row in conn.execute(f"EXPLAIN QUERY PLAN {query}", params))
+
+        assert 'USING COVERING INDEX idx_user_feedback_history' in plan
+        assert 'TEMP B-TREE' not in plan, "ORDER BY should be satisfied by the index"
+
+    def test_pages_cover_history_without_overlap(self, database):
+        pages, before = [], None
+        while True:
+            page = database.get_user_feedback_history('u1', limit=7, before=before)
+            if not page:
+                break
+            pages.append(page)
+            before = page[-1]['feedback_date']
+
+        dates = [row['feedback_date'] for page in pages for row in page]
+        assert len(dates) == 50
+        assert dates == sorted(dates, reverse=True)
+        assert len(set(dates)) == 50
+
+    def test_notes_not_selected(self, database):
+        row = database.get_user_feedback_history('u1', limit=1)[0]
+        assert set(row) == {'feedback_date', 'predicted_risk', 'actual_outcome', 'severity'}
+
+
+class TestFeedbackHistoryEndpoint:
+    """GET /user/{user_id}/feedback_history"""
+
+    @pytest.fixture
+    def client(self, database, monkeypatch):
+        from fastapi.testclient import TestClient
+        import service.main as main
+
+        monkeypatch.setattr(main, 'db', database)
+        return TestClient(main.app)
+
+    def test_cursor_walks_all_pages(self, client):
+        dates, cursor = [], None
+        while True:
+            params = {'limit': 20}
+            if cursor:
+                params['cursor'] = cursor
+            body = client.get('/user/u1/feedback_history', params=params).json()
+            dates += [item['feedback_date'] for item in body['history']]
+            cursor = body['next_cursor']
+            if cursor is None:
+                break
+
+        assert len(dates) == 50
+        assert len(set(dates)) == 50
+
+    def test_invalid_cursor(self, client):
+        response = client.get('/user/u1/feedback_history', params={'cursor': 'yesterday'})
+        assert response.status_code == 400
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "--tb=short"])
@@ -0,0 +1,134 @@
+"""
+Tests for bulk feedback import
+
+Author: ALINE Team
+Date: 2025-11-16
+"""
+
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+# Add project root to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from service.database import Database
+from service.feedback_import import FeedbackImporter, parse_feedback_row
+
+
+@pytest.fixture
+def database(tmp_path):
+    """Isolated database per test"""
+    return Database(str(tmp_path / 'import.db'))
+
+
+class TestParseFeedbackRow:
+    """Row validation"""
+
+    def test_csv_strings_are_coerced(self):
+        record = parse_feedback_row({
+            'user_id': 'u1', 'date': '2025-11-01', 'had_migraine': 'true',
+            'severity': '7', 'predicted_risk': '', 'notes': ''
+        })
+        assert record['had_migraine'] is True
+        assert record['severity'] == 7
+        assert record['predicted_prob'] is None
+        assert record['notes'] is None
+
+    @pytest.mark.parametrize('raw', [
+        {'user_id': 'u1', 'date': '11/01/2025', 'had_migraine': True},
+        {'user_id': 'u1', 'date': '2025-11-01', 'had_migraine': 'maybe'},
+        {'user_id': 'u1', 'date': '2025-11-01', 'had_migraine': True, 'severity': 11},
+        {'date': '2025-11-01', 'had_migraine': True},
+        ['u1', '2025-11-01', True],
+    ])
+    def test_invalid_rows_raise(self, raw):
+        with pytest.raises(ValueError):
+            parse_feedback_row(raw)
+
+
+class TestFeedbackImporter:
+    """Chunked executemany import"""
+
+    def test_chunks_and_reports_errors(self, database):
+        importer = FeedbackImporter(database, chunk_size=10)
+        events = []
+
+        for i in range(25):
+            raw = {'user_id': 'u1', 'date': f'2025-{1 + i // 28:02d}-{1 + i % 28:02d}', 'had_migraine': i % 4 == 0}
+            if i == 7:
+                raw['date'] = 'not-a-date'
+            events += importer.add(raw)
+            if importer.full:
+                events += importer.flush()
+        events += importer.flush()
+
+        errors = [e for e in events if e['type'] == 'error']
+        progress = [e for e in events if e['type'] == 'progress']
+
+        assert [e['row'] for e in errors] == [8]
+        assert len(progress) == 3
+        assert importer.summary() == {'type': 'summary', 'processed': 25, 'imported': 24, 'failed': 1}
+        assert len(database.get_user_feedback_history('u1', limit=100)) == 24
+
+    def test_replace_semantics(self, database):
+        database.add_feedback('u1', '2025-11-01', had_migraine=False)
+
+        importer = FeedbackImporter(database)
+        importer.add({'user_id': 'u1', 'date': '2025-11-01', 'had_migraine': True})
+        importer.flush()
+
+        history = database.get_user_feedback_history('u1')
+        assert len(history) == 1
+        assert history[0]['actual_outcome'] == 1
+
+
+class TestBulkImportEndpoint:
+    """POST /feedback/bulk"""
+
+    @pytest.fixture
+    def client(self, database, monkeypatch):
+        from fastapi.testclient import TestClient
+        import service.main as main
+
+        monkeypatch.setattr(main, 'db', database)
+        return TestClient(main.app)
+
+    def test_ndjson_stream(self, client, database):
+        lines = [
+            json.dumps({'user_id': 'u1', 'date': '2025-11-01', 'had_migraine': True}),
+            '{not json',
+            json.dumps({'user_id': 'u1', 'date': '2025-11-02', 'had_migraine': False}),
+        ]
+        response = client.post(
+            '/feedback/bulk',
+            content='\n'.join(lines),
+            headers={'Content-Type': 'application/x-ndjson'}
+        )
+
+        assert response.status_code == 200
+        events = [json.loads(line) for line in response.text.splitlines()]
+        assert events[0] == {'type': 'error', 'row': 2, 'error': events[0]['error']}
+        assert events[-1] == {'type': 'summary', 'processed': 3, 'imported': 2, 'failed': 1}
+        assert len(database.get_user_feedback_history('u1')) == 2
+
+    def test_json_array(self, client, database):
+        rows = [{'user_id': 'u2', 'date': f'2025-11-{d:02d}', 'had_migraine': False} for d in range(1, 4)]
+        response = client.post('/feedback/bulk', json=rows)
+
+        events = [json.loads(line) for line in response.text.splitlines()]
+        assert events[-1]['imported'] == 3
+
+    def test_rejects_non_array_json(self, client):
+        response = client.post('/feedback/bulk', json={'user_id': 'u1'})
+        assert response.status_code == 400
+
+    def test_chunk_size_is_bounded(self, client):
+        response = client.post('/feedback/bulk?chunk_size=100000000', json=[])
+        assert response.status_code == 422
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "--tb=short"])
@@ -0,0 +1,141 @@
+"""
+Tests for the group-commit feedback writer (Ticket 026)
+
+Author: ALINE Team
+Date: 2025-11-16
+"""
+
+import asyncio
+import sqlite3
+import sys
+from pathlib import Path
+
+import pytest
+
+# Add project root to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from service.database import Database
+from service.feedback_writer import FeedbackBatchWriter
+
+
+@pytest.fixture
+def database(tmp_path):
+    """Isolated database per test"""
+    return Database(str(tmp_path / 'feedback.db'))
+
+
+class TestAddFeedbackBatch:
+    """Database-level batched insert"""
+
+    def test_returns_ids_in_order(self, database):
+        records = [
+            {'user_id': 'u1', 'date': f'2025-11-{day:02d}', 'had_migraine': day % 2 == 0}
+            for day in range(1, 6)
+        ]
+        ids = database.add_feedback_batch(records)
+
+        assert len(ids) == 5
+        assert ids == sorted(ids), "IDs should follow insertion order"
+        assert len(database.get_user_feedback_history('u1')) == 5
+
+    def test_replace_semantics_match_add_feedback(self, database):
+        database.add_feedback('u1', '2025-11-01', had_migraine=False)
+        database.add_feedback_batch([
+            {'user_id': 'u1', 'date': '2025-11-01', 'had_migraine': True, 'severity': 6}
+        ])
+
+        history = database.get_user_feedback_history('u1')
+        assert len(history) == 1
+        assert history[0]['actual_outcome'] == 1
+        assert history[0]['severity'] == 6
+
+    def test_failed_batch_is_rolled_back(self, database):
+        records = [
+            {'user_id': 'u1', 'date': '2025-11-01', 'had_migraine': True},
+            {'user_id': None, 'date': '2025-11-02', 'had_migraine': True},  # NOT NULL violation
+        ]
+        with pytest.raises(sqlite3.IntegrityError):
+            database.add_feedback_batch(records)
+
+        assert database.get_user_feedback_history('u1') == []
+
+
+class TestFeedbackBatchWriter:
+    """Async group-commit writer"""
+
+    @pytest.mark.asyncio
+    async def test_concurrent_submissions_share_a_commit(self, database):
+        writer = FeedbackBatchWriter(database, batch_window=0.05)
+
+        ids = await asyncio.gather(*[
+            writer.submit(f'user{i}', '2025-11-15', had_migraine=bool(i % 2))
+            for i in range(20)
+        ])
+        await writer.close()
+
+        assert len(set(ids)) == 20, "Every caller should get its own row ID"
+        assert writer.rows_written == 20
+        assert writer.batches_committed < 20, "Submissions should be coalesced"
+
+    @pytest.mark.asyncio
+    async def test_bad_row_does_not_fail_batch(self, database):
+        writer = FeedbackBatchWriter(database, batch_window=0.05)
+
+        results = await asyncio.gather(
+            writer.submit('u1', '2025-11-01', had_migraine=True),
+            writer.submit(None, '2025-11-02', had_migraine=True),
+            writer.submit('u2', '2025-11-01', had_migraine=False),
+            return_exceptions=True
+        )
+        await writer.close()
+
+        assert isinstance(results[0], int)
+        assert isinstance(results[1], sqlite3.IntegrityError)
+        assert isinstance(results[2], int)
+
+    @pytest.mark.asyncio
+    async def test_close_flushes_pending(self, database):
+        writer = FeedbackBatchWriter(database, batch_window=1.0)
+
+        task = asyncio.create_task(writer.submit('u1', '2025-11-01', had_migraine=True))
+        await asyncio.sleep(0)
+        await writer.close()
+
+        assert isinstance(await task, int)
+        assert len(database.get_user_feedback_history('u1')) == 1
+
+    @pytest.mark.asyncio
+    async def test_submit_during_close_is_rejected(self, database):
+        writer = FeedbackBatchWriter(database)
+
+        first = await writer.submit('u1', '2025-11-01', had_migraine=True)
+        closing = asyncio.create_task(writer.close())
+        await asyncio.sleep(0)
+
+        with pytest.raises(RuntimeError):
+            await asyncio.wait_for(writer.submit('u1', '2025-11-02', had_migraine=True), timeout=1.0)
+        await closing
+
+        assert isinstance(first, int)
+        # The writer restarts for submissions made after close() finished
+        assert isinstance(await writer.submit('u1', '2025-11-03', had_migraine=False), int)
+        await writer.close()
+
+    @pytest.mark.asyncio
+    async def test_cancelled_worker_fails_pending_futures(self, database):
+        writer = FeedbackBatchWriter(database, batch_window=1.0)
+
+        tasks = [
+            asyncio.create_task(writer.submit('u1', f'2025-11-0{d}', had_migraine=True))
+            for d in range(1, 4)
+        ]
+        await asyncio.sleep(0.01)
+        writer._worker.cancel()
+
+        results = await asyncio.wait_for(asyncio.gather(*tasks, return_exceptions=True), timeout=1.0)
+        assert all(isinstance(r, RuntimeError) for r in results)
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "--tb=short"])
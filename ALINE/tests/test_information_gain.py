@@ -13,9 +13,21 @@ import pytest
 import sys
 from pathlib import Path
 
+import torch
+
 # Add project root to path
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
+WEIGHTS = torch.tensor([0.5, 0.4, 0.45, 0.35])
+
+
+@pytest.fixture
+def model():
+    from models.aline import SimpleALINE
+    
+    torch.manual_seed(0)
+    return SimpleALINE(in_dim=3, d_model=16, nhead=2, nlayers=1).eval()
+
 
 class TestInformationGainQueries:
     """Test information gain queries from Ticket #022"""
@@ -58,13 +70,111 @@ class TestInformationGainQueries:
         except ImportError:
             pytest.skip("Ticket #022 not yet implemented")
     
-    def test_gradient_based_sensitivity(self):
+    def test_gradient_based_sensitivity(self, model):
         """Test gradient-based sensitivity calculation"""
-        pytest.skip("Ticket #022 not yet implemented - will test when added")
+        from models.policy_utils import feature_information_gain
+        
+        x = torch.randn(3, 24, 3, generator=torch.Generator().manual_seed(0))
+        gains, risk = feature_information_gain(model, x, WEIGHTS, -1.8, method='backward')
+        vmap_gains, vmap_risk = feature_information_gain(model, x, WEIGHTS, -1.8, method='vmap')
+        
+        assert gains.shape == (3, 24, 3) and risk.shape == (3,)
+        assert torch.allclose(gains, vmap_gains, atol=1e-6)
+        assert torch.allclose(risk, vmap_risk, atol=1e-6)
     
-    def test_query_recommendation_api(self):
+    def test_query_recommendation_api(self, model, monkeypatch):
         """Test API endpoint for query recommendations"""
-        pytest.skip("Ticket #022 API endpoint not yet implemented")
+        from fastapi.testclient import TestClient
+        import service.main as main
+        
+        monkeypatch.setitem(main.app_state, 'model', model)
+        monkeypatch.setitem(main.app_state, 'model_loaded', True)
+        monkeypatch.setitem(main.app_state, 'device', torch.device('cpu'))
+        monkeypatch.setitem(main.app_state, 'migraine_weights', WEIGHTS)
+        monkeypatch.setitem(main.app_state, 'migraine_bias', -1.8)
+        monkeypatch.setitem(main.app_state, 'config', {'features': {'feature_names': ['Sleep', 'Stress']}})
+        client = TestClient(main.app)
+        features = torch.randn(24, 3, generator=torch.Generator().manual_seed(1)).tolist()
+        availability = [[1.0, 1.0, 0.0]] * 24
+        
+        response = client.post('/policy/feature-queries', json={
+            'user_id': 'u1', 'features': features, 'availability': availability, 'k_temporal': 2, 'k_features': 3
+        })
+        
+        assert response.status_code == 200
+        body = response.json()
+        assert len(body['temporal_queries']) == 2
+        assert body['feature_queries'][0]['feature'] == 'Feature_2', "only the missing feature has gain"
+        assert all(query['score'] == 0 for query in body['feature_queries'][1:])
+        assert client.post('/policy/feature-queries', json={
+            'user_id': 'u1', 'features': features[:5]
+        }).status_code == 400
+
+
+class TestBatchedInformationGain:
+    """Per-sample gains for SimpleALINE and batched top-k selection"""
+    
+    def test_gains_are_per_sample(self, model):
+        from models.policy_utils import feature_information_gain
+        
+        x = torch.randn(2, 24, 3, generator=torch.Generator().manual_seed(2))
+        changed = x.clone()
+        changed[1] += 1.0
+        
+        gains, _ = feature_information_gain(model, x, WEIGHTS, -1.8)
+        changed_gains, _ = feature_information_gain(model, changed, WEIGHTS, -1.8)
+        single, _ = feature_information_gain(model, x[:1], WEIGHTS, -1.8)
+        
+        assert torch.allclose(gains[0], changed_gains[0], atol=1e-7)
+        assert torch.allclose(gains[0], single[0], atol=1e-6)
+    
+    def test_availability_masks_measured_values(self, model):
+        from models.policy_utils import feature_information_gain
+        
+        x = torch.randn(1, 24, 3)
+        availability = torch.ones(1, 24, 3)
+        availability[0, 5, 1] = 0.0
+        
+        gains, _ = feature_information_gain(model, x, WEIGHTS, -1.8, availability)
+        
+        assert gains[0, 5, 1] > 0
+        assert gains.sum() == gains[0, 5, 1]
+    
+    def test_ranking_matches_per_element_selection(self):
+        from models.policy_utils import format_feature_queries, rank_feature_queries
+        
+        gains = torch.rand(4, 24, 6, generator=torch.Generator().manual_seed(3))
+        names = [f"f{i}" for i in range(6)]
+        
+        queries = format_feature_queries(rank_feature_queries(gains, k_temporal=3, k_features=2), names)
+        
+        for b in range(4):
+            temporal = gains[b].max(dim=-1).values
+            hours = temporal.topk(3).indices.tolist()
+            assert [q['hour'] for q in queries[b]['temporal_queries']] == hours
+            assert queries[b]['temporal_queries'][0]['features'] == [
+                names[i] for i in gains[b, hours[0]].topk(3).indices.tolist()
+            ]
+            features = gains[b].max(dim=0).values.topk(2).indices.tolist()
+            assert [q['feature'] for q in queries[b]['feature_queries']] == [names[i] for i in features]
+            assert [q['best_hour'] for q in queries[b]['feature_queries']] == [
+                gains[b, :, i].argmax().item() for i in features
+            ]
+    
+    def test_priority_queries_keep_their_format(self):
+        from models.policy_utils import get_priority_queries
+        
+        class DictModel(torch.nn.Module):
+            def forward(self, x):
+                return {'migraine_logit': x.sum(dim=(1, 2)) * 0.01}
+        
+        x = torch.randn(2, 24, 4)
+        queries = get_priority_queries(DictModel(), x, feature_availability=torch.zeros_like(x), k_temporal=2)
+        
+        assert len(queries) == 2
+        assert set(queries[0]) == {'temporal_queries', 'feature_queries'}
+        assert len(queries[0]['temporal_queries']) == 2
+        assert queries[0]['feature_queries'][0]['feature'].startswith('Feature_')
 
 
 class TestInformationGainStub:
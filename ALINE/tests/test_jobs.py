@@ -0,0 +1,240 @@
+"""
+Tests for the background job queue
+
+Author: ALINE Team
+Date: 2025-11-17
+"""
+
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+import httpx
+import pytest
+
+# Add project root to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from service.database import Database
+from service.jobs import JobQueue, JobQueueFullError, parse_upstream_limits
+
+
+@pytest.fixture
+def database(tmp_path):
+    return Database(str(tmp_path / 'jobs.db'))
+
+
+class Probe:
+    """Job handler that records concurrency and can be held open"""
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.active = 0
+        self.peak = 0
+        self.release = asyncio.Event()
+        self.hold = False
+
+    async def __call__(self, params):
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        try:
+            if self.hold:
+                await self.release.wait()
+            await asyncio.sleep(self.delay)
+            if params.get('fail'):
+                raise ValueError("upstream said no")
+            return {'echo': params.get('n')}
+        finally:
+            self.active -= 1
+
+
+async def until_finished(queue, job_id, timeout=2.0):
+    return await queue.get(job_id, wait=timeout)
+
+
+class TestJobLifecycle:
+    """Submission, execution and stored outcomes"""
+
+    @pytest.mark.asyncio
+    async def test_submit_returns_before_job_runs(self, database):
+        queue = JobQueue(database)
+        probe = Probe()
+        probe.hold = True
+        queue.register('slow', probe, upstream='n8n')
+
+        job_id = await queue.submit('slow', {'n': 1}, user_id='u1')
+        assert (await queue.get(job_id))['status'] in ('queued', 'running')
+
+        probe.release.set()
+        job = await until_finished(queue, job_id)
+
+        assert job['status'] == 'succeeded'
+        assert job['result'] == {'echo': 1}
+        assert job['user_id'] == 'u1'
+        await queue.stop()
+
+    @pytest.mark.asyncio
+    async def test_failure_and_timeout_are_recorded(self, database):
+        queue = JobQueue(database, job_timeout=0.05)
+        queue.register('fails', Probe(), upstream='a')
+        queue.register('hangs', Probe(delay=1.0), upstream='b')
+
+        failed = await until_finished(queue, await queue.submit('fails', {'fail': True}))
+        timed_out = await until_finished(queue, await queue.submit('hangs', {}))
+
+        assert (failed['status'], failed['error']) == ('failed', 'upstream said no')
+        assert timed_out['status'] == 'failed'
+        assert 'timed out' in timed_out['error']
+        assert queue.stats()['failed'] == 2
+        await queue.stop()
+
+    @pytest.mark.asyncio
+    async def test_long_poll_wakes_on_completion(self, database):
+        queue = JobQueue(database)
+        queue.register('quick', Probe(delay=0.05), upstream='n8n')
+        job_id = await queue.submit('quick', {'n': 2})
+
+        start = time.monotonic()
+        job = await queue.get(job_id, wait=5.0)
+
+        assert job['status'] == 'succeeded'
+        assert time.monotonic() - start < 1.0
+        await queue.stop()
+
+    @pytest.mark.asyncio
+    async def test_expired_results_are_gone(self, database):
+        queue = JobQueue(database, result_ttl=0)
+        queue.PURGE_INTERVAL = float('inf')
+        queue.register('quick', Probe(), upstream='n8n')
+        job_id = await queue.submit('quick', {})
+        await asyncio.sleep(0.1)
+
+        assert await queue.get(job_id) is None
+        assert database.purge_expired_jobs() == 1
+        await queue.stop()
+
+
+class TestConcurrencyLimits:
+    """Bounded workers per upstream and overall"""
+
+    @pytest.mark.asyncio
+    async def test_per_upstream_limit(self, database):
+        queue = JobQueue(database, workers=10, upstream_limits={'n8n': 2})
+        probe = Probe(delay=0.02)
+        queue.register('ctx', probe, upstream='n8n')
+
+        job_ids = [await queue.submit('ctx', {'n': i}) for i in range(8)]
+        jobs = [await until_finished(queue, job_id) for job_id in job_ids]
+
+        assert all(job['status'] == 'succeeded' for job in jobs)
+        assert probe.peak == 2
+        await queue.stop()
+
+    @pytest.mark.asyncio
+    async def test_slow_upstream_does_not_block_others(self, database):
+        queue = JobQueue(database, workers=4, upstream_limits={'n8n': 2, 'calendar': 2})
+        slow = Probe()
+        slow.hold = True
+        queue.register('slow', slow, upstream='n8n')
+        queue.register('fast', Probe(), upstream='calendar')
+
+        for _ in range(5):
+            await queue.submit('slow', {})
+        while slow.active < 2:
+            await asyncio.sleep(0.01)
+        job = await until_finished(queue, await queue.submit('fast', {'n': 3}))
+
+        assert job['status'] == 'succeeded'
+        assert slow.active == 2
+        slow.release.set()
+        await queue.stop()
+
+    @pytest.mark.asyncio
+    async def test_total_workers_cap(self, database):
+        queue = JobQueue(database, workers=3, upstream_limits={'a': 3, 'b': 3})
+        probe = Probe(delay=0.02)
+        queue.register('a', probe, upstream='a')
+        queue.register('b', probe, upstream='b')
+
+        job_ids = [await queue.submit(kind, {}) for kind in ('a', 'b') * 5]
+        for job_id in job_ids:
+            await until_finished(queue, job_id)
+
+        assert probe.peak == 3
+        await queue.stop()
+
+    @pytest.mark.asyncio
+    async def test_full_backlog_rejects(self, database):
+        queue = JobQueue(database, upstream_limits={'n8n': 1}, max_queued=2)
+        probe = Probe()
+        probe.hold = True
+        queue.register('ctx', probe, upstream='n8n')
+
+        for _ in range(3):  # one running, two waiting
+            await queue.submit('ctx', {})
+        with pytest.raises(JobQueueFullError):
+            await queue.submit('ctx', {})
+        await queue.stop()
+
+    @pytest.mark.asyncio
+    async def test_stop_fails_waiting_jobs(self, database):
+        queue = JobQueue(database, upstream_limits={'n8n': 1})
+        probe = Probe()
+        probe.hold = True
+        queue.register('ctx', probe, upstream='n8n')
+
+        running = await queue.submit('ctx', {})
+        waiting = await queue.submit('ctx', {})
+        await asyncio.sleep(0.05)
+        await queue.stop()
+
+        assert database.get_job(running)['status'] == 'failed'
+        assert database.get_job(waiting)['status'] == 'failed'
+
+    def test_parse_upstream_limits(self):
+        assert parse_upstream_limits("n8n=4, calendar=16,,") == {'n8n': 4, 'calendar': 16}
+
+
+class TestContextJobEndpoints:
+    """Submit and poll context generation over HTTP"""
+
+    def test_submit_and_long_poll(self, database, monkeypatch):
+        from fastapi.testclient import TestClient
+        import service.main as main
+        from service.calendar import CalendarService
+        from service.weather import WeatherService
+
+        feed = (
+            "BEGIN:VCALENDAR\r\nBEGIN:VEVENT\r\nUID:1\r\nDTSTART:20251118T090000Z\r\n"
+            "DTEND:20251118T100000Z\r\nEND:VEVENT\r\nEND:VCALENDAR\r\n"
+        )
+        calendar = CalendarService(client=httpx.AsyncClient(transport=httpx.MockTransport(
+            lambda request: httpx.Response(200, text=feed)
+        )))
+        queue = JobQueue(database)
+        queue.register('generate-context', main.run_context_job, upstream='calendar')
+        database.save_calendar_connection('u1', 'https://cal.test/a.ics', 'https://cal.test/a.ics')
+        monkeypatch.setattr(main, 'db', database)
+        monkeypatch.setattr(main, 'calendar_service', calendar)
+        monkeypatch.setattr(main, 'job_queue', queue)
+        monkeypatch.setattr(main, 'weather_service', WeatherService(disk_cache_path=''))
+
+        with TestClient(main.app) as client:
+            submitted = client.post('/aline/generate-context/jobs', json={
+                'userId': 'u1', 'priors': {'stress_level': {'a': 2, 'b': 2}}, 'date': '2025-11-18'
+            })
+            assert submitted.status_code == 202
+
+            job = client.get(submitted.json()['statusUrl'], params={'wait': 5}).json()
+            assert job['status'] == 'succeeded'
+            assert job['result']['calendarLoad']['summary']['meetings'] == 1
+
+            assert client.post('/aline/generate-context/jobs', json={
+                'userId': 'nobody', 'priors': {}
+            }).status_code == 404
+            assert client.get('/aline/jobs/unknown').status_code == 404
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "--tb=short"])
@@ -14,6 +14,7 @@ import sys
 from pathlib import Path
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
+import math
 import torch
 import pytest
 from models.policy_utils import (
@@ -21,7 +22,10 @@ from models.policy_utils import (
     select_topk_hours,
     evaluate_policy,
     simulate_random_policy,
-    simulate_fixed_policy
+    simulate_fixed_policy,
+    measurement_coverage,
+    plan_measurements,
+    plan_measurement_schedule
 )
 
 
@@ -217,6 +221,97 @@ def test_integration_policy_pipeline():
     print(f"  Precision: {precision:.4f}")
 
 
+def _plain_greedy(uncertainty, coverage, budget):
+    """Reference: re-evaluate every candidate's marginal gain at each step."""
+    u = uncertainty.flatten()
+    residual = torch.ones_like(u)
+    selected = []
+    for _ in range(budget):
+        gains = coverage @ (u * residual)
+        gains[selected] = float('-inf')
+        best = int(gains.argmax())
+        selected.append(best)
+        residual = residual * (1 - coverage[best])
+    return selected
+
+
+def test_measurement_coverage():
+    """Coverage is symmetric, unit on the diagonal and crosses midnight."""
+    coverage = measurement_coverage(num_days=3, correlation_hours=2.0, day_correlation=0.5)
+    
+    assert coverage.shape == (72, 72)
+    assert torch.allclose(coverage, coverage.T)
+    assert torch.all(coverage.diagonal() == 1)
+    assert coverage[23, 24] == pytest.approx(math.exp(-1.0)), "Late evening informs the next early morning"
+    assert coverage[8, 32] == pytest.approx(0.25), "Same hour next day: routine correlation squared"
+    assert coverage[8, 56] == pytest.approx(0.0625)
+
+
+def test_lazy_greedy_matches_plain_greedy():
+    """Lazy evaluation selects the same schedule with fewer gain evaluations."""
+    torch.manual_seed(42)
+    D, T, budget = 7, 24, 12
+    uncertainty = torch.rand(D, T) ** 3
+    coverage = measurement_coverage(D, T)
+    
+    plan = plan_measurements(uncertainty, coverage, budget, eval_batch=4)
+    
+    assert (plan['days'] * T + plan['hours']).tolist() == _plain_greedy(uncertainty, coverage, budget)
+    assert plan['evaluations'] < D * T * budget
+    assert torch.all(plan['gains'][1:] <= plan['gains'][:-1] + 1e-6), "Submodular: gains do not increase"
+    assert plan['objective'] == pytest.approx(plan['gains'].sum().item(), rel=1e-5)
+    assert plan['objective'] <= plan['total_uncertainty']
+    
+    print("✓ Lazy greedy test passed")
+    print(f"  Evaluations: {plan['evaluations']} (plain greedy: {D * T * budget})")
+
+
+def test_plan_respects_constraints():
+    """Candidate hours and the per-day cap are respected; the budget is shared across days."""
+    torch.manual_seed(0)
+    uncertainty = torch.rand(5, 24)
+    uncertainty[0] *= 10  # One very uncertain day
+    candidates = torch.zeros(5, 24, dtype=torch.bool)
+    candidates[:, 8:22] = True
+    
+    capped = plan_measurements(
+        uncertainty, measurement_coverage(5), budget=10, candidate_mask=candidates, max_per_day=3
+    )
+    assert len(capped['days']) == 10
+    assert torch.all((capped['hours'] >= 8) & (capped['hours'] < 22))
+    assert torch.bincount(capped['days'], minlength=5).max() <= 3
+    
+    # Measured days lose value, so the budget is not spent on one day only
+    uncapped = plan_measurements(uncertainty, measurement_coverage(5, correlation_hours=24.0), budget=10)
+    assert len(set(uncapped['days'].tolist())) > 1
+    
+    # Nothing left to reduce: nothing is scheduled
+    assert len(plan_measurements(torch.zeros(2, 24), measurement_coverage(2), budget=5)['days']) == 0
+
+
+def test_plan_measurement_schedule():
+    """A week is planned from the model's batched gradients."""
+    from models.aline import SimpleALINE
+    
+    torch.manual_seed(42)
+    model = SimpleALINE(in_dim=3, d_model=16, nhead=2, nlayers=1).eval()
+    migraine_weights = torch.tensor([0.5, 0.4, 0.45, 0.35])
+    x = torch.rand(7, 24, 3) * 2 - 1
+    availability = torch.zeros(7, 24, 3)
+    availability[2] = 1.0  # Day 2 is fully logged
+    
+    plan = plan_measurement_schedule(
+        model, x, migraine_weights, -1.8, budget=7,
+        feature_availability=availability, candidate_hours=list(range(7, 23)), batch_size=3
+    )
+    
+    assert plan['risk'].shape == (7,)
+    assert torch.all(plan['uncertainty'][2] == 0)
+    assert 2 not in plan['days'].tolist()
+    assert len(plan['days']) == 7
+    assert 0 < plan['objective'] <= plan['total_uncertainty']
+
+
 if __name__ == "__main__":
     print("Running Active Query Policy tests...\n")
     test_compute_priority_scores()
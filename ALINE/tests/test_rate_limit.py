@@ -0,0 +1,96 @@
+"""
+Tests for the token-bucket rate limiter
+
+Author: ALINE Team
+Date: 2025-11-17
+"""
+
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+# Add project root to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from service.rate_limit import RateLimiter
+
+
+class TestTokenBucket:
+    """In-process bucket"""
+
+    @pytest.mark.asyncio
+    async def test_burst_then_refill_rate(self):
+        limiter = RateLimiter(max_calls=5, period=0.5)  # 10 tokens/s
+
+        start = time.monotonic()
+        for _ in range(5):
+            await limiter.acquire()
+        assert time.monotonic() - start < 0.05
+
+        await limiter.acquire()
+        assert time.monotonic() - start >= 0.09
+        assert limiter.acquired == 6
+
+    @pytest.mark.asyncio
+    async def test_concurrent_callers_respect_budget(self):
+        limiter = RateLimiter(max_calls=4, period=0.2)  # 20 tokens/s
+
+        start = time.monotonic()
+        await asyncio.gather(*[limiter.acquire() for _ in range(10)])
+
+        # 4 from the initial burst, 6 more at 20/s
+        assert time.monotonic() - start >= 0.28
+
+    @pytest.mark.asyncio
+    async def test_waiters_are_served_fifo(self):
+        limiter = RateLimiter(max_calls=1, period=0.02)
+        order = []
+
+        async def worker(i):
+            await limiter.acquire()
+            order.append(i)
+
+        tasks = []
+        for i in range(8):
+            tasks.append(asyncio.ensure_future(worker(i)))
+            await asyncio.sleep(0)
+        await asyncio.gather(*tasks)
+
+        assert order == list(range(8))
+
+    def test_rejects_invalid_budget(self):
+        with pytest.raises(ValueError):
+            RateLimiter(max_calls=0, period=60)
+
+
+class TestSharedBucket:
+    """Bucket state shared through a SQLite file"""
+
+    @pytest.mark.asyncio
+    async def test_workers_share_one_budget(self, tmp_path):
+        path = str(tmp_path / 'limits.db')
+        worker_a = RateLimiter(max_calls=3, period=0.3, state_path=path, name='openweather')
+        worker_b = RateLimiter(max_calls=3, period=0.3, state_path=path, name='openweather')
+
+        start = time.monotonic()
+        for _ in range(3):
+            await worker_a.acquire()
+        await worker_b.acquire()
+
+        assert time.monotonic() - start >= 0.09, "worker B should wait for worker A's spent budget"
+
+    @pytest.mark.asyncio
+    async def test_names_are_independent(self, tmp_path):
+        path = str(tmp_path / 'limits.db')
+        weather = RateLimiter(max_calls=1, period=60, state_path=path, name='openweather')
+        calendar = RateLimiter(max_calls=1, period=60, state_path=path, name='calendar')
+
+        await weather.acquire()
+        await asyncio.wait_for(calendar.acquire(), timeout=1)
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "--tb=short"])
@@ -0,0 +1,236 @@
+"""
+Tests for circuit breakers, retry budgets and hedged requests
+
+Author: ALINE Team
+Date: 2025-11-17
+"""
+
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+import httpx
+import pytest
+
+# Add project root to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from service.resilience import CircuitBreaker, CircuitOpenError, Upstream, UpstreamError
+
+
+class ScriptedUpstream:
+    """Mock transport handler answering from a script of (delay, status | exception)"""
+
+    def __init__(self, *script):
+        self.script = list(script)
+        self.requests = 0
+
+    async def __call__(self, request: httpx.Request) -> httpx.Response:
+        step = self.script[min(self.requests, len(self.script) - 1)]
+        self.requests += 1
+        delay, outcome = step
+        if delay:
+            await asyncio.sleep(delay)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return httpx.Response(outcome, json={'attempt': self.requests})
+
+
+def client_for(handler):
+    return httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+
+class TestCircuitBreaker:
+    """State transitions"""
+
+    def test_opens_after_threshold_and_probes_after_reset(self):
+        now = [0.0]
+        breaker = CircuitBreaker('up', failure_threshold=2, reset_timeout=10, clock=lambda: now[0])
+
+        breaker.record_failure()
+        assert breaker.allow()
+        breaker.record_failure()
+        assert breaker.state == 'open'
+        assert not breaker.allow()
+
+        now[0] = 10.0
+        assert breaker.allow(), "one probe is allowed once the reset timeout has passed"
+        assert not breaker.allow(), "only one probe at a time"
+
+        breaker.record_failure()
+        assert breaker.state == 'open'
+
+        now[0] = 20.0
+        assert breaker.allow()
+        breaker.record_success()
+        assert breaker.state == 'closed'
+        assert breaker.stats()['times_opened'] == 2  # initial open + failed probe
+
+    def test_success_resets_failure_count(self):
+        breaker = CircuitBreaker('up', failure_threshold=3)
+        breaker.record_failure()
+        breaker.record_failure()
+        breaker.record_success()
+        breaker.record_failure()
+
+        assert breaker.state == 'closed'
+
+
+class TestRetries:
+    """Jittered retries within the latency budget"""
+
+    @pytest.mark.asyncio
+    async def test_get_retries_transient_errors(self):
+        handler = ScriptedUpstream((0, 503), (0, httpx.ConnectError('down')), (0, 200))
+        upstream = Upstream('up', backoff=0.001)
+
+        response = await upstream.get(client_for(handler), 'https://up.test/')
+
+        assert response.json() == {'attempt': 3}
+        assert upstream.retries == 2
+        assert upstream.breaker.state == 'closed'
+
+    @pytest.mark.asyncio
+    async def test_client_errors_are_not_retried(self):
+        handler = ScriptedUpstream((0, 404))
+        upstream = Upstream('up')
+
+        response = await upstream.get(client_for(handler), 'https://up.test/')
+
+        assert response.status_code == 404
+        assert handler.requests == 1
+
+    @pytest.mark.asyncio
+    async def test_latency_budget_bounds_slow_upstream(self):
+        handler = ScriptedUpstream((5.0, 200))
+        upstream = Upstream('up', latency_budget=0.2, max_attempts=5)
+
+        start = time.monotonic()
+        with pytest.raises(httpx.TimeoutException):
+            await upstream.get(client_for(handler), 'https://up.test/')
+
+        assert time.monotonic() - start < 0.5
+        assert upstream.failures == 1
+
+    @pytest.mark.asyncio
+    async def test_post_is_not_retried_after_reaching_upstream(self):
+        handler = ScriptedUpstream((0, 502), (0, 200))
+        upstream = Upstream('up')
+
+        with pytest.raises(UpstreamError):
+            await upstream.post(client_for(handler), 'https://up.test/', json={})
+        assert handler.requests == 1
+
+    @pytest.mark.asyncio
+    async def test_post_is_retried_on_connect_error(self):
+        handler = ScriptedUpstream((0, httpx.ConnectError('refused')), (0, 200))
+        upstream = Upstream('up', backoff=0.001)
+
+        response = await upstream.post(client_for(handler), 'https://up.test/', json={})
+        assert response.status_code == 200
+
+    @pytest.mark.asyncio
+    async def test_open_circuit_fails_fast(self):
+        handler = ScriptedUpstream((0, 500))
+        upstream = Upstream('up', max_attempts=1, breaker=CircuitBreaker('up', failure_threshold=2))
+        client = client_for(handler)
+
+        for _ in range(2):
+            with pytest.raises(UpstreamError):
+                await upstream.get(client, 'https://up.test/')
+        with pytest.raises(CircuitOpenError):
+            await upstream.get(client, 'https://up.test/')
+
+        assert handler.requests == 2
+
+    @pytest.mark.asyncio
+    async def test_before_attempt_runs_per_request(self):
+        handler = ScriptedUpstream((0, 500), (0, 200))
+        calls = []
+
+        async def before():
+            calls.append(1)
+
+        upstream = Upstream('up', backoff=0.001, before_attempt=before)
+        await upstream.get(client_for(handler), 'https://up.test/')
+
+        assert len(calls) == 2
+
+
+class TestHedging:
+    """Hedged idempotent GETs"""
+
+    @pytest.mark.asyncio
+    async def test_slow_first_request_is_hedged(self):
+        handler = ScriptedUpstream((1.0, 200), (0, 200))
+        upstream = Upstream('up', hedge_delay=0.05)
+
+        start = time.monotonic()
+        response = await upstream.get(client_for(handler), 'https://up.test/')
+
+        assert response.json() == {'attempt': 2}
+        assert time.monotonic() - start < 0.5
+        assert upstream.hedges == 1
+
+    @pytest.mark.asyncio
+    async def test_fast_request_is_not_hedged(self):
+        handler = ScriptedUpstream((0, 200))
+        upstream = Upstream('up', hedge_delay=0.05)
+
+        await upstream.get(client_for(handler), 'https://up.test/')
+        assert handler.requests == 1
+        assert upstream.hedges == 0
+
+
+class TestFallbacks:
+    """Weather and calendar degrade quickly while the circuit is open"""
+
+    @pytest.mark.asyncio
+    async def test_weather_serves_cached_data_when_open(self):
+        from service.weather import WeatherService
+
+        handler = ScriptedUpstream((0, 200))
+        service = WeatherService(client=client_for(handler), disk_cache_path='')
+        await service.get_current_weather(1.0, 2.0)
+
+        # Too old to serve stale normally, but better than defaults while OpenWeather is down
+        cell = service.grid_cell(1.0, 2.0)
+        service.cache.set(cell, {'current': {'pressure': 999.0}}, stored_at=time.time() - service.MAX_STALE - 1)
+        service.upstream.breaker.state = 'open'
+        service.upstream.breaker.opened_at = time.monotonic()
+
+        weather = await service.get_current_weather(1.0, 2.0)
+
+        assert weather['pressure'] == 999.0
+        assert service.stale_fallbacks == 1
+        assert handler.requests == 1
+
+    @pytest.mark.asyncio
+    async def test_weather_defaults_when_open_and_uncached(self):
+        from service.weather import WeatherService
+
+        handler = ScriptedUpstream((0, 200))
+        service = WeatherService(client=client_for(handler), disk_cache_path='')
+        service.upstream.breaker.state = 'open'
+        service.upstream.breaker.opened_at = time.monotonic()
+
+        assert await service.get_current_weather(1.0, 2.0) == service._get_default_weather()
+        assert handler.requests == 0
+
+    @pytest.mark.asyncio
+    async def test_calendar_context_fails_fast_when_open(self):
+        from service.calendar import CalendarService
+
+        service = CalendarService()
+        service.n8n.breaker.state = 'open'
+        service.n8n.breaker.opened_at = time.monotonic()
+
+        start = time.monotonic()
+        with pytest.raises(CircuitOpenError):
+            await service.generate_context_with_calendar('u1', 'https://cal.test/a.ics', {}, 'https://n8n.test/hook')
+        assert time.monotonic() - start < 0.1
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "--tb=short"])
@@ -0,0 +1,280 @@
+"""
+Tests for the analytic risk head and nightly batch risk scoring
+
+Author: ALINE Team
+Date: 2025-11-17
+"""
+
+import sys
+from datetime import date, datetime, timezone
+from pathlib import Path
+
+import pytest
+import torch
+
+# Add project root to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from models.aline import SimpleALINE
+from models.risk_head import analytic_risk
+from service.database import Database
+from service.risk_batch import RiskBatchScorer, SensitivityGrid, interpolate_surface, shard_of
+
+WEIGHTS = torch.tensor([0.5, 0.4, 0.45, 0.35])
+DAY = date(2025, 11, 18)
+CUTOFF = int(datetime(2025, 11, 18, tzinfo=timezone.utc).timestamp())
+GRID = SensitivityGrid(['sleep', 'caffeine'], [0, 2], [-1.0, 0.0, 1.0])
+
+
+@pytest.fixture
+def database(tmp_path):
+    return Database(str(tmp_path / 'risk.db'))
+
+
+@pytest.fixture
+def model():
+    torch.manual_seed(0)
+    return SimpleALINE(in_dim=3, d_model=16, nhead=2, nlayers=1).eval()
+
+
+def store_window(database, user_id, hours=24, end=CUTOFF, in_dim=3, seed=0):
+    generator = torch.Generator().manual_seed(seed)
+    values = torch.randn(hours, in_dim, generator=generator).tolist()
+    database.save_hourly_features(user_id, [
+        (end - (hours - i) * 3600, values[i]) for i in range(hours)
+    ])
+    return values
+
+
+class TestAnalyticRisk:
+    """Probit-approximated risk head"""
+
+    def test_matches_monte_carlo(self):
+        torch.manual_seed(1)
+        mu = torch.randn(4) * 2
+        sigma = torch.rand(4) + 0.2
+
+        mean, lower, upper = analytic_risk(mu, sigma, WEIGHTS, -1.8)
+
+        samples = torch.randn(200_000, 4) * sigma + mu
+        probs = torch.sigmoid(samples @ WEIGHTS - 1.8)
+        assert mean.item() == pytest.approx(probs.mean().item(), abs=0.01)
+        assert lower.item() == pytest.approx(torch.quantile(probs[:100_000], 0.05).item(), abs=0.01)
+        assert upper.item() == pytest.approx(torch.quantile(probs[:100_000], 0.95).item(), abs=0.01)
+
+    def test_no_uncertainty_is_plain_sigmoid(self):
+        mu = torch.tensor([[1.0, 0.0, -1.0, 2.0]])
+        mean, lower, upper = analytic_risk(mu, torch.zeros_like(mu), WEIGHTS, -1.8)
+
+        expected = torch.sigmoid(mu @ WEIGHTS - 1.8)
+        assert torch.allclose(mean, expected)
+        assert torch.allclose(lower, expected) and torch.allclose(upper, expected)
+        assert mean.shape == (1,)
+
+
+class TestFeatureWindows:
+    """Stored hourly features"""
+
+    def test_latest_window_before_cutoff(self, database):
+        store_window(database, 'u1', hours=30, end=CUTOFF + 2 * 3600)
+        store_window(database, 'u2', hours=5)
+
+        windows = database.latest_feature_windows(['u1', 'u2', 'nobody'], CUTOFF)
+
+        assert set(windows) == {'u1', 'u2'}
+        starts = [hour_start for hour_start, _ in windows['u1']]
+        assert len(starts) == 24
+        assert starts[-1] == CUTOFF - 3600
+        assert starts == sorted(starts)
+        assert len(windows['u2']) == 5
+
+    def test_hours_before_the_window_are_not_read(self, database):
+        store_window(database, 'stale', end=CUTOFF - 7 * 24 * 3600)
+        store_window(database, 'u1', hours=26)
+
+        windows = database.latest_feature_windows(['stale', 'u1'], CUTOFF)
+
+        assert 'stale' not in windows
+        assert windows['u1'][0][0] == CUTOFF - 24 * 3600
+
+    def test_users_are_paged_in_order(self, database):
+        for user_id in ('c', 'a', 'b'):
+            store_window(database, user_id, hours=2)
+
+        assert database.list_feature_users(None, 2) == ['a', 'b']
+        assert database.list_feature_users('b', 2) == ['c']
+
+
+class TestRiskBatchScorer:
+    """Sharded, checkpointed batch scoring"""
+
+    def test_scores_full_windows_and_skips_the_rest(self, database, model):
+        values = store_window(database, 'u1', seed=1)
+        store_window(database, 'u2', seed=2)
+        store_window(database, 'short', hours=10)
+
+        summary = RiskBatchScorer(database, model, WEIGHTS, -1.8, DAY, batch_size=1).run()
+
+        assert (summary['scored'], summary['skipped']) == (2, 1)
+        with torch.no_grad():
+            posterior, _ = model(torch.tensor([values]))
+        mean, lower, upper = analytic_risk(posterior.mean[0, -1], posterior.stddev[0, -1], WEIGHTS, -1.8)
+
+        stored = database.get_risk_prediction('u1', DAY.isoformat())
+        assert stored['mean_probability'] == pytest.approx(mean.item(), abs=1e-6)
+        assert stored['lower_bound'] == pytest.approx(lower.item(), abs=1e-6)
+        assert stored['upper_bound'] == pytest.approx(upper.item(), abs=1e-6)
+        assert stored['window_end'] == CUTOFF
+        assert database.get_risk_prediction('short', DAY.isoformat()) is None
+
+    def test_skips_gappy_and_stale_windows(self, database, model):
+        store_window(database, 'u1')
+        # 24 stored hours, but 3 of them before a gap in the last day
+        store_window(database, 'gappy', hours=10, end=CUTOFF - 20 * 3600)
+        store_window(database, 'gappy', hours=14)
+        # A full day of logging, but a week ago
+        store_window(database, 'stale', end=CUTOFF - 7 * 24 * 3600)
+
+        summary = RiskBatchScorer(database, model, WEIGHTS, -1.8, DAY).run()
+
+        assert (summary['scored'], summary['skipped']) == (1, 2)
+        assert database.get_risk_prediction('gappy', DAY.isoformat()) is None
+        assert database.get_risk_prediction('stale', DAY.isoformat()) is None
+
+    def test_shards_partition_users(self, database, model):
+        users = [f"user{i:02d}" for i in range(12)]
+        for i, user_id in enumerate(users):
+            store_window(database, user_id, seed=i)
+
+        summaries = [
+            RiskBatchScorer(database, model, WEIGHTS, -1.8, DAY, shard=shard, num_shards=3, page_size=5).run()
+            for shard in range(3)
+        ]
+
+        assert [s['scored'] for s in summaries] == [
+            sum(shard_of(user_id, 3) == shard for user_id in users) for shard in range(3)
+        ]
+        assert all(database.get_risk_prediction(user_id, DAY.isoformat()) for user_id in users)
+
+    def test_resumes_from_checkpoint(self, database, model):
+        for i in range(5):
+            store_window(database, f"user{i}", seed=i)
+
+        first = RiskBatchScorer(database, model, WEIGHTS, -1.8, DAY, page_size=2)
+        first.run(max_pages=1)
+        assert database.get_checkpoint(first.checkpoint_name) == 'user1'
+
+        second = RiskBatchScorer(database, model, WEIGHTS, -1.8, DAY, page_size=2)
+        summary = second.run()
+
+        assert summary['scored'] == 3
+        assert database.get_checkpoint(second.checkpoint_name) is None
+        assert all(database.get_risk_prediction(f"user{i}", DAY.isoformat()) for i in range(5))
+
+    def test_rejects_invalid_shard(self, database, model):
+        with pytest.raises(ValueError):
+            RiskBatchScorer(database, model, WEIGHTS, -1.8, DAY, shard=2, num_shards=2)
+
+
+class TestSensitivitySurfaces:
+    """Surfaces stored with the prediction and dropped on new data"""
+
+    def test_surface_is_stored_with_prediction(self, database, model):
+        store_window(database, 'u1')
+        RiskBatchScorer(database, model, WEIGHTS, -1.8, DAY, batch_size=4, sensitivity=GRID).run()
+
+        stored = database.get_risk_prediction('u1', DAY.isoformat())
+        surface = stored['sensitivity']
+        assert surface['features'] == ['sleep', 'caffeine']
+        assert len(surface['risk']) == 2 and len(surface['risk'][0]) == 3
+        assert stored['window_start'] == CUTOFF - 24 * 3600
+
+    def test_new_hours_in_the_window_drop_the_surface(self, database, model):
+        store_window(database, 'u1')
+        store_window(database, 'u2')
+        RiskBatchScorer(database, model, WEIGHTS, -1.8, DAY, sensitivity=GRID).run()
+
+        # Today's hours do not change the window of today's prediction
+        database.save_hourly_features('u1', [(CUTOFF + 3600, [0.0, 0.0, 0.0])])
+        assert database.get_risk_prediction('u1', DAY.isoformat())['sensitivity'] is not None
+
+        database.save_hourly_features('u1', [(CUTOFF - 3 * 3600, [0.0, 0.0, 0.0])])
+        assert database.get_risk_prediction('u1', DAY.isoformat())['sensitivity'] is None
+        assert database.get_risk_prediction('u2', DAY.isoformat())['sensitivity'] is not None
+
+    def test_interpolation(self):
+        surface = GRID.surface([[0.1, 0.2, 0.4], [0.3, 0.3, 0.3]])
+
+        assert interpolate_surface(surface, 'sleep', 0.5) == pytest.approx(0.3)
+        assert interpolate_surface(surface, 'sleep', 5.0) == pytest.approx(0.4)
+        with pytest.raises(KeyError):
+            interpolate_surface(surface, 'stress', 0.0)
+
+    def test_grid_must_increase(self):
+        with pytest.raises(ValueError):
+            SensitivityGrid(['sleep'], [0], [1.0, 0.0])
+
+
+class TestStoredRiskEndpoints:
+    """Feature ingestion and prediction lookups over HTTP"""
+
+    def test_store_features_and_read_prediction(self, database, model, monkeypatch):
+        from fastapi.testclient import TestClient
+        import service.main as main
+
+        monkeypatch.setattr(main, 'db', database)
+        monkeypatch.setitem(main.app_state, 'model', None)
+        client = TestClient(main.app)
+
+        response = client.post('/features/hourly', json={
+            'user_id': 'u1',
+            'hours': [
+                {'hour_start': f"2025-11-17T{hour:02d}:00:00Z", 'features': [0.1, 0.2, 0.3]}
+                for hour in range(24)
+            ]
+        })
+        assert response.status_code == 200
+        assert response.json()['stored'] == 24
+
+        assert client.post('/features/hourly', json={
+            'user_id': 'u1', 'hours': [{'hour_start': '2025-11-17T10:30:00', 'features': [0.1, 0.2, 0.3]}]
+        }).status_code == 400
+        assert client.get('/risk/daily/u1', params={'date': '2025-11-18'}).status_code == 404
+
+        RiskBatchScorer(database, model, WEIGHTS, -1.8, DAY).run()
+        stored = client.get('/risk/daily/u1', params={'date': '2025-11-18'}).json()
+
+        assert 0 < stored['lower_bound'] <= stored['mean_probability'] <= stored['upper_bound'] < 1
+        assert stored['window_end'] == '2025-11-18T00:00:00+00:00'
+
+    def test_sensitivity_surface_is_cached(self, database, model, monkeypatch):
+        from fastapi.testclient import TestClient
+        import service.main as main
+
+        monkeypatch.setattr(main, 'db', database)
+        monkeypatch.setitem(main.app_state, 'model', model)
+        monkeypatch.setitem(main.app_state, 'model_loaded', True)
+        monkeypatch.setitem(main.app_state, 'migraine_weights', WEIGHTS)
+        monkeypatch.setitem(main.app_state, 'migraine_bias', -1.8)
+        monkeypatch.setitem(main.app_state, 'config', {
+            'features': {'feature_names': ['sleep', 'stress', 'caffeine']},
+            'sensitivity': {'features': ['sleep', 'caffeine'], 'grid': [-1.0, 0.0, 1.0]}
+        })
+        client = TestClient(main.app)
+        store_window(database, 'u1')
+        params = {'date': '2025-11-18', 'feature': 'caffeine', 'value': 0.5}
+
+        first = client.get('/risk/sensitivity/u1', params=params).json()
+        second = client.get('/risk/sensitivity/u1', params=params).json()
+
+        assert (first['cached'], second['cached']) == (False, True)
+        assert first['risk'] == second['risk']
+        assert second['lookup'] == pytest.approx(sum(second['risk'][1][1:]) / 2)
+        assert database.get_risk_prediction('u1', '2025-11-18')['sensitivity'] is not None
+
+        assert client.get('/risk/sensitivity/u1', params={'date': '2025-11-18', 'feature': 'x'}).status_code == 400
+        assert client.get('/risk/sensitivity/nobody', params={'date': '2025-11-18'}).status_code == 404
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "--tb=short"])
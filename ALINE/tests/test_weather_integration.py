@@ -13,6 +13,7 @@ from pathlib import Path
 # Add project root to path
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
+from service.cache import TTLCache
 from service.weather import WeatherService
 
 
@@ -42,7 +43,7 @@ class TestOpenWeatherIntegration:
     
     def test_cache_structure(self, weather_service):
         """Test that cache is properly initialized"""
-        assert isinstance(weather_service.cache, dict), "Cache should be a dictionary"
+        assert isinstance(weather_service.cache, TTLCache), "Cache should be a bounded TTL cache"
         assert len(weather_service.cache) == 0, "Cache should start empty"
     
     def test_api_configuration(self, weather_service):
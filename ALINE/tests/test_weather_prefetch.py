@@ -0,0 +1,172 @@
+"""
+Tests for scheduled weather prefetch of active user locations
+
+Author: ALINE Team
+Date: 2025-11-17
+"""
+
+import asyncio
+import sqlite3
+import sys
+from pathlib import Path
+
+import httpx
+import pytest
+
+# Add project root to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from service.database import Database
+from service.weather import WeatherService
+from service.weather_prefetch import WeatherPrefetcher
+
+
+class FakeUpstream:
+    """One Call stand-in that records request count and peak concurrency"""
+
+    def __init__(self, delay=0.01):
+        self.delay = delay
+        self.requests = 0
+        self.active = 0
+        self.peak = 0
+
+    async def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.requests += 1
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        await asyncio.sleep(self.delay)
+        self.active -= 1
+        return httpx.Response(200, json={'current': {'pressure': 1005.0}, 'hourly': []})
+
+
+@pytest.fixture
+def upstream():
+    return FakeUpstream()
+
+
+@pytest.fixture
+def database(tmp_path):
+    return Database(str(tmp_path / 'prefetch.db'))
+
+
+@pytest.fixture
+def service(upstream):
+    return WeatherService(
+        client=httpx.AsyncClient(transport=httpx.MockTransport(upstream)),
+        disk_cache_path=''
+    )
+
+
+def make_prefetcher(service, database, budget=100, **kwargs):
+    prefetcher = WeatherPrefetcher(service, database, interval=900, **kwargs)
+    # Size the daily quota so that one run may spend exactly `budget` calls
+    prefetcher.DAILY_QUOTA = budget * 86400 / 900 / prefetcher.QUOTA_FRACTION
+    service.rate_limiter.max_calls = 10_000
+    return prefetcher
+
+
+class TestDueCells:
+    """Selection of cells to prefetch"""
+
+    def test_users_in_one_cell_are_deduplicated(self, service, database):
+        database.record_user_location('u1', 40.712, -73.99)
+        database.record_user_location('u2', 40.748, -73.92)
+        database.record_user_location('u3', 51.507, -0.127)
+
+        assert len(make_prefetcher(service, database).due_cells()) == 2
+
+    def test_fresh_cells_are_skipped_and_missing_first(self, service, database):
+        database.record_user_location('u1', 10.0, 10.0)
+        database.record_user_location('u2', 20.0, 20.0)
+        database.record_user_location('u3', 30.0, 30.0)
+        now = service.cache.clock()
+        service.cache.set(service.grid_cell(10.0, 10.0), {}, stored_at=now - 60)
+        service.cache.set(service.grid_cell(20.0, 20.0), {}, stored_at=now - service.CACHE_TTL + 60)
+
+        due = make_prefetcher(service, database).due_cells()
+        assert due == [service.grid_cell(30.0, 30.0), service.grid_cell(20.0, 20.0)]
+
+    def test_inactive_users_are_ignored(self, service, database):
+        database.record_user_location('u1', 10.0, 10.0)
+        with sqlite3.connect(database.db_path) as conn:
+            conn.execute("UPDATE user_locations SET updated_at = updated_at - 30 * 86400")
+
+        assert make_prefetcher(service, database, active_days=7).due_cells() == []
+
+
+class TestPrefetchRun:
+    """Budgeted, concurrency-bounded batches"""
+
+    @pytest.mark.asyncio
+    async def test_run_populates_cache(self, upstream, service, database):
+        for i in range(6):
+            database.record_user_location(f'u{i}', float(i), 0.0)
+        prefetcher = make_prefetcher(service, database)
+
+        summary = await prefetcher.run_once()
+        assert summary['fetched'] == 6
+        assert summary['deferred'] == 0
+
+        for i in range(6):
+            await service.get_current_weather(float(i), 0.0)
+        assert upstream.requests == 6
+        assert (await prefetcher.run_once())['due'] == 0
+
+    @pytest.mark.asyncio
+    async def test_budget_defers_excess_cells(self, upstream, service, database):
+        for i in range(5):
+            database.record_user_location(f'u{i}', float(i), 0.0)
+
+        summary = await make_prefetcher(service, database, budget=2).run_once()
+
+        assert (summary['fetched'], summary['deferred']) == (2, 3)
+        assert upstream.requests == 2
+
+    def test_budget_respects_daily_quota(self, service, database):
+        prefetcher = WeatherPrefetcher(service, database, interval=900)
+        prefetcher.DAILY_QUOTA = 1000
+
+        # 50% of (1000/day * 900s) = 5 calls, below 50% of 60/min * 15 min
+        assert prefetcher.budget_per_run() == 5
+
+    @pytest.mark.asyncio
+    async def test_concurrency_is_bounded(self, upstream, service, database):
+        for i in range(12):
+            database.record_user_location(f'u{i}', float(i), 0.0)
+
+        await make_prefetcher(service, database, concurrency=3).run_once()
+
+        assert upstream.requests == 12
+        assert upstream.peak <= 3
+
+    @pytest.mark.asyncio
+    async def test_start_and_stop(self, service, database):
+        database.record_user_location('u1', 1.0, 1.0)
+        prefetcher = make_prefetcher(service, database)
+
+        prefetcher.start()
+        await asyncio.sleep(0.05)
+        await prefetcher.stop()
+
+        assert prefetcher.last_run['fetched'] == 1
+
+
+class TestLocationRecording:
+    """Weather endpoints remember user locations"""
+
+    def test_endpoint_records_location(self, service, database, monkeypatch):
+        from fastapi.testclient import TestClient
+        import service.main as main
+
+        monkeypatch.setattr(main, 'db', database)
+        monkeypatch.setattr(main, 'weather_service', service)
+        client = TestClient(main.app)
+
+        client.get('/weather/current', params={'lat': 40.7, 'lon': -74.0, 'user_id': 'u1'})
+        client.get('/weather/forecast', params={'lat': 51.5, 'lon': -0.1})
+
+        assert database.get_active_user_locations() == [(40.7, -74.0)]
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "--tb=short"])
@@ -0,0 +1,503 @@
+"""
+Tests for WeatherService upstream usage against a fake One Call endpoint
+
+Author: ALINE Team
+Date: 2025-11-17
+"""
+
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+import httpx
+import pytest
+
+# Add project root to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from service.cache import MISSING, TTLCache
+from service.pressure_history import PressureHistory
+from service.weather import WeatherService
+
+
+def onecall_payload(pressure=1010.0):
+    """Minimal One Call response with current conditions and 48 hourly entries"""
+    return {
+        'current': {'dt': 1_700_000_000, 'pressure': pressure, 'temp': 12.5, 'humidity': 70},
+        'hourly': [
+            {'dt': 1_700_000_000 + 3600 * h, 'pressure': pressure + h, 'temp': 12.0, 'humidity': 68}
+            for h in range(48)
+        ]
+    }
+
+
+class FakeUpstream:
+    """httpx mock transport handler that counts One Call requests"""
+
+    def __init__(self, payload=None, status_code=200, delay=0.0):
+        self.payload = payload or onecall_payload()
+        self.status_code = status_code
+        self.delay = delay
+        self.requests = []
+
+    async def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request)
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        return httpx.Response(self.status_code, json=self.payload)
+
+
+@pytest.fixture
+def upstream():
+    return FakeUpstream()
+
+
+def make_service(upstream, **kwargs):
+    """WeatherService whose HTTP client is served by `upstream` (no disk tier unless given)"""
+    kwargs.setdefault('disk_cache_path', '')
+    return WeatherService(client=httpx.AsyncClient(transport=httpx.MockTransport(upstream)), **kwargs)
+
+
+@pytest.fixture
+def service(upstream):
+    return make_service(upstream)
+
+
+class TestUnifiedOneCall:
+    """Current, pressure change and forecast share one payload"""
+
+    @pytest.mark.asyncio
+    async def test_weather_panel_costs_one_call(self, service, upstream):
+        current = await service.get_current_weather(40.7128, -74.0060)
+        delta = await service.get_pressure_change(40.7128, -74.0060, hours_ago=3)
+        forecast = await service.get_forecast(40.7128, -74.0060, hours=24)
+
+        assert current['pressure'] == 1010.0
+        assert delta is None, "one observation is not a pressure change"
+        assert len(forecast) == 24
+        assert len(upstream.requests) == 1
+        assert service.upstream_calls == 1
+
+    @pytest.mark.asyncio
+    async def test_cache_hits_skip_rate_limiter(self, service):
+        for _ in range(5):
+            await service.get_current_weather(40.7128, -74.0060)
+            await service.get_forecast(40.7128, -74.0060)
+
+        assert service.rate_limiter.acquired == 1
+
+    @pytest.mark.asyncio
+    async def test_upstream_error_falls_back(self, upstream, service):
+        upstream.status_code = 503
+
+        assert await service.get_current_weather(1.0, 2.0) == service._get_default_weather()
+        assert await service.get_pressure_change(1.0, 2.0) is None
+        assert await service.get_forecast(1.0, 2.0) == []
+
+
+
+class TestRequestCoalescing:
+    """Concurrent misses for one location share a single upstream fetch"""
+
+    @pytest.mark.asyncio
+    async def test_concurrent_misses_coalesce(self, upstream, service):
+        upstream.delay = 0.05
+
+        results = await asyncio.gather(*[
+            service.get_current_weather(40.7128 + i * 1e-3, -74.0060) for i in range(20)
+        ])
+
+        assert len(upstream.requests) == 1
+        assert service.coalesced_requests == 19
+        assert all(r['pressure'] == 1010.0 for r in results)
+        assert service._inflight == {}
+
+    @pytest.mark.asyncio
+    async def test_distinct_locations_fetch_separately(self, upstream, service):
+        upstream.delay = 0.01
+
+        await asyncio.gather(
+            service.get_current_weather(40.71, -74.00),
+            service.get_current_weather(51.51, -0.13),
+        )
+
+        assert len(upstream.requests) == 2
+
+    @pytest.mark.asyncio
+    async def test_failure_is_shared_then_retried(self, upstream, service):
+        upstream.delay = 0.01
+        upstream.status_code = 500
+
+        results = await asyncio.gather(*[service.get_current_weather(1.0, 2.0) for _ in range(5)])
+        assert all(r == service._get_default_weather() for r in results)
+        assert len(upstream.requests) == service.upstream.max_attempts  # one fetch, retried
+
+        upstream.status_code = 200
+        assert (await service.get_current_weather(1.0, 2.0))['pressure'] == 1010.0
+        assert len(upstream.requests) == service.upstream.max_attempts + 1
+
+    @pytest.mark.asyncio
+    async def test_cancelled_caller_does_not_cancel_fetch(self, upstream, service):
+        upstream.delay = 0.05
+
+        first = asyncio.ensure_future(service.get_current_weather(1.0, 2.0))
+        await asyncio.sleep(0)
+        second = asyncio.ensure_future(service.get_current_weather(1.0, 2.0))
+        await asyncio.sleep(0.01)
+        first.cancel()
+
+        assert (await second)['pressure'] == 1010.0
+        assert len(upstream.requests) == 1
+
+
+
+class TestTTLCache:
+    """Bounded LRU mapping with expiry"""
+
+    def test_entries_expire(self):
+        now = [1000.0]
+        cache = TTLCache(maxsize=4, ttl=60, clock=lambda: now[0])
+        cache.set('a', 1)
+
+        now[0] += 59
+        assert cache.get('a') == 1
+        now[0] += 2
+        assert cache.get('a') is MISSING
+        assert cache.get_entry('a') == (1, 61)
+        assert cache.stats()['expired'] == 2
+
+    def test_size_is_bounded(self):
+        cache = TTLCache(maxsize=3, ttl=60)
+        for i in range(100):
+            cache.set(i, i)
+
+        assert len(cache) == 3
+        assert cache.stats()['evictions'] == 97
+
+
+class TestGridCells:
+    """Spatial bucketing of weather lookups"""
+
+    @pytest.mark.asyncio
+    async def test_nearby_users_share_a_cell(self, upstream, service):
+        # Three users within a few km of each other in Manhattan
+        for lat, lon in [(40.712, -73.990), (40.730, -73.952), (40.748, -73.921)]:
+            await service.get_current_weather(lat, lon)
+
+        assert len(upstream.requests) == 1
+        assert service.cache_stats()['hit_rate'] == pytest.approx(2 / 3)
+
+    @pytest.mark.asyncio
+    async def test_fetches_cell_center(self, upstream):
+        service = make_service(upstream, grid_resolution=0.5)
+        await service.get_current_weather(40.7128, -74.0060)
+
+        params = upstream.requests[0].url.params
+        assert (float(params['lat']), float(params['lon'])) == (40.75, -74.25)
+
+    def test_cells_are_contiguous(self, service):
+        assert service.grid_cell(0.3, -0.3) == (3, -3)
+        assert service.grid_cell(0.29, -0.29) == (2, -3)
+
+    @pytest.mark.asyncio
+    async def test_memory_is_bounded(self, upstream):
+        service = make_service(upstream, cache_size=8)
+        for i in range(50):
+            await service.get_current_weather(i * 0.5, 0.0)
+
+        stats = service.cache_stats()
+        assert stats['size'] == 8
+        assert stats['evictions'] == 42
+
+    def test_stats_endpoint(self, service, monkeypatch):
+        from fastapi.testclient import TestClient
+        import service.main as main
+
+        monkeypatch.setattr(main, 'weather_service', service)
+        body = TestClient(main.app).get('/weather/cache_stats').json()
+
+        assert {'size', 'maxsize', 'hit_rate', 'upstream_calls'} <= set(body)
+
+
+
+def seed(service, lat, lon, age, pressure=1000.0):
+    """Cache a payload for (lat, lon) that was fetched `age` seconds ago"""
+    service.cache.set(service.grid_cell(lat, lon), onecall_payload(pressure), stored_at=time.time() - age)
+
+
+async def drain(service):
+    """Wait for background refreshes to finish"""
+    while service._inflight:
+        await asyncio.gather(*service._inflight.values(), return_exceptions=True)
+
+
+class TestStaleWhileRevalidate:
+    """Expired entries are served while a background refresh runs"""
+
+    @pytest.mark.asyncio
+    async def test_stale_entry_served_immediately(self, upstream, service):
+        upstream.delay = 0.2
+        seed(service, 1.0, 2.0, age=service.CACHE_TTL + 60)
+
+        start = time.monotonic()
+        weather = await service.get_current_weather(1.0, 2.0)
+        assert time.monotonic() - start < 0.1
+        assert weather['pressure'] == 1000.0
+        assert service.stale_hits == 1
+
+        await drain(service)
+        assert (await service.get_current_weather(1.0, 2.0))['pressure'] == 1010.0
+        assert len(upstream.requests) == 1
+
+    @pytest.mark.asyncio
+    async def test_too_stale_blocks_on_fetch(self, upstream, service):
+        seed(service, 1.0, 2.0, age=service.MAX_STALE + 1)
+
+        assert (await service.get_current_weather(1.0, 2.0))['pressure'] == 1010.0
+        assert service.stale_hits == 0
+
+    @pytest.mark.asyncio
+    async def test_popular_entry_refreshed_before_expiry(self, upstream, service):
+        seed(service, 1.0, 2.0, age=service.CACHE_TTL * 0.9)
+
+        assert (await service.get_current_weather(1.0, 2.0))['pressure'] == 1000.0
+        await drain(service)
+
+        payload, age = service.cache.get_entry(service.grid_cell(1.0, 2.0))
+        assert payload['current']['pressure'] == 1010.0
+        assert age < 5
+        assert service.background_refreshes == 1
+
+    @pytest.mark.asyncio
+    async def test_fresh_entry_not_refreshed(self, upstream, service):
+        seed(service, 1.0, 2.0, age=10)
+
+        await service.get_current_weather(1.0, 2.0)
+        assert service._inflight == {}
+        assert upstream.requests == []
+
+    @pytest.mark.asyncio
+    async def test_concurrent_refreshes_are_capped(self, upstream, service):
+        upstream.delay = 0.05
+        service.MAX_REFRESHES = 2
+        for i in range(5):
+            seed(service, float(i), 0.0, age=service.CACHE_TTL + 1)
+
+        for i in range(5):
+            await service.get_current_weather(float(i), 0.0)
+        await drain(service)
+
+        assert service.background_refreshes == 2
+        assert service.refreshes_skipped == 3
+        assert len(upstream.requests) == 2
+
+    @pytest.mark.asyncio
+    async def test_failed_refresh_keeps_stale_entry(self, upstream, service):
+        upstream.status_code = 502
+        seed(service, 1.0, 2.0, age=service.CACHE_TTL + 1)
+
+        await service.get_current_weather(1.0, 2.0)
+        await drain(service)
+        assert service._refreshing == 0
+
+        assert (await service.get_current_weather(1.0, 2.0))['pressure'] == 1000.0
+        await drain(service)
+
+
+
+class TestDiskTier:
+    """Persistent payload tier shared across workers and restarts"""
+
+    @pytest.fixture
+    def disk_path(self, tmp_path):
+        return str(tmp_path / 'weather_cache.db')
+
+    @pytest.mark.asyncio
+    async def test_restart_starts_warm(self, upstream, disk_path):
+        first = make_service(upstream, disk_cache_path=disk_path)
+        await first.get_current_weather(40.71, -74.00)
+        await first.get_current_weather(51.51, -0.13)
+
+        restarted = make_service(upstream, disk_cache_path=disk_path)
+        assert len(restarted.cache) == 2
+
+        await restarted.get_current_weather(40.71, -74.00)
+        assert len(upstream.requests) == 2
+        assert restarted.cache_stats()['hit_rate'] == 1.0
+
+    @pytest.mark.asyncio
+    async def test_workers_share_fetches(self, upstream, disk_path):
+        worker_a = make_service(upstream, disk_cache_path=disk_path)
+        worker_b = make_service(upstream, disk_cache_path=disk_path)
+
+        await worker_a.get_current_weather(40.71, -74.00)
+        weather = await worker_b.get_current_weather(40.71, -74.00)
+
+        assert weather['pressure'] == 1010.0
+        assert len(upstream.requests) == 1
+        assert worker_b.cache_stats()['disk_hits'] == 1
+
+    @pytest.mark.asyncio
+    async def test_refresh_reuses_other_workers_fetch(self, upstream, disk_path):
+        worker_a = make_service(upstream, disk_cache_path=disk_path)
+        worker_b = make_service(upstream, disk_cache_path=disk_path)
+        seed(worker_b, 40.71, -74.00, age=worker_b.CACHE_TTL + 1)
+
+        await worker_a.get_current_weather(40.71, -74.00)
+        assert (await worker_b.get_current_weather(40.71, -74.00))['pressure'] == 1000.0
+        await drain(worker_b)
+
+        assert (await worker_b.get_current_weather(40.71, -74.00))['pressure'] == 1010.0
+        assert len(upstream.requests) == 1
+
+    def test_entries_past_max_stale_are_pruned(self, upstream, disk_path):
+        service = make_service(upstream, disk_cache_path=disk_path)
+        service.disk_cache.set('0.1:1:1', onecall_payload(), stored_at=time.time() - service.MAX_STALE - 1)
+        service.disk_cache.set('0.1:2:2', onecall_payload(), stored_at=time.time() - 60)
+
+        restarted = make_service(upstream, disk_cache_path=disk_path)
+        assert (2, 2) in restarted.cache
+        assert (1, 1) not in restarted.cache
+        assert restarted.disk_cache.get('0.1:1:1') is None
+
+    def test_other_resolution_not_loaded(self, upstream, disk_path):
+        make_service(upstream, disk_cache_path=disk_path).disk_cache.set('0.5:1:1', onecall_payload())
+
+        assert len(make_service(upstream, disk_cache_path=disk_path).cache) == 0
+
+    def test_empty_path_disables_tier(self, upstream):
+        assert make_service(upstream, disk_cache_path='').disk_cache is None
+
+
+
+HOUR = 3600
+
+
+class TestPressureHistory:
+    """Hourly ring buffer of observed pressure"""
+
+    def test_delta_uses_past_observation(self):
+        history = PressureHistory(hours=24)
+        for h in range(6):
+            history.record('cell', 1_700_000_000 + h * HOUR, 1000.0 + h)
+
+        assert history.delta('cell', 3) == pytest.approx(3.0)
+        assert history.delta('cell', 5) == pytest.approx(5.0)
+        assert history.delta('cell', 6) == pytest.approx(5.0)  # neighbouring hour
+        assert history.delta('cell', 8) is None
+        assert history.delta('other', 3) is None
+
+    def test_missing_hour_uses_neighbour(self):
+        history = PressureHistory(hours=24)
+        history.record('cell', 0, 1000.0)
+        history.record('cell', 2 * HOUR, 1002.0)
+        history.record('cell', 4 * HOUR, 1004.0)
+
+        # Hour 1 was never observed: the earlier neighbour is tried first
+        assert history.delta('cell', 3) == pytest.approx(4.0)
+
+    def test_buffer_wraps(self):
+        history = PressureHistory(hours=4)
+        for h in range(10):
+            history.record('cell', h * HOUR, float(h))
+
+        assert [p for _, p in history.series('cell')] == [6.0, 7.0, 8.0, 9.0]
+        assert history.delta('cell', 2) == pytest.approx(2.0)
+        assert history.delta('cell', 4) is None
+
+    def test_locations_are_bounded(self):
+        history = PressureHistory(hours=4, max_locations=3)
+        for i in range(10):
+            history.record(i, 0, 1000.0)
+
+        assert len(history) == 3
+
+
+class TestPressureChange:
+    """Pressure change from observed history instead of forecast values"""
+
+    @pytest.mark.asyncio
+    async def test_forecast_values_are_not_used(self, service):
+        # The fake payload's hourly (future) pressures rise 1 hPa/h
+        assert await service.get_pressure_change(1.0, 2.0, hours_ago=3) is None
+
+    @pytest.mark.asyncio
+    async def test_delta_from_recorded_fetches(self, upstream, service):
+        cell = service.grid_cell(1.0, 2.0)
+        for h in range(5):
+            upstream.payload = onecall_payload(pressure=1012.0 - 0.8 * h)
+            upstream.payload['current']['dt'] += h * HOUR
+            await service.refresh_cell(cell)
+
+        delta = await service.get_pressure_change(1.0, 2.0, hours_ago=3)
+
+        assert delta == pytest.approx(-2.4)
+        assert len(upstream.requests) == 5, "pressure change should not cost an upstream call"
+
+    @pytest.mark.asyncio
+    async def test_environment_features(self, upstream, service):
+        cell = service.grid_cell(1.0, 2.0)
+        for h in range(4):
+            upstream.payload = onecall_payload(pressure=1010.0 - h)
+            upstream.payload['current']['dt'] += h * HOUR
+            await service.refresh_cell(cell)
+
+        features = await service.get_environment_features(1.0, 2.0)
+
+        assert features['Barometric Pressure Change'] == pytest.approx(3.0)
+        assert 'Air Quality Index' in features
+        assert len(service.get_pressure_history(1.0, 2.0)) == 4
+
+    @pytest.mark.asyncio
+    async def test_missing_history_is_not_reported_as_no_change(self, service):
+        features = await service.get_environment_features(1.0, 2.0)
+
+        assert 'Barometric Pressure Change' not in features
+        assert 'Air Quality Index' in features
+
+    @pytest.mark.asyncio
+    async def test_history_rebuilt_from_disk(self, upstream, tmp_path):
+        path = str(tmp_path / 'weather_cache.db')
+        first = make_service(upstream, disk_cache_path=path)
+        await first.get_current_weather(1.0, 2.0)
+
+        restarted = make_service(upstream, disk_cache_path=path)
+        assert len(restarted.get_pressure_history(1.0, 2.0)) == 1
+
+    @pytest.mark.asyncio
+    async def test_hourly_history_survives_restart(self, upstream, tmp_path):
+        path = str(tmp_path / 'weather_cache.db')
+        first = make_service(upstream, disk_cache_path=path)
+        first.REFRESH_AHEAD = 0.0  # refetch every hour instead of reusing the shared payload
+        cell = first.grid_cell(1.0, 2.0)
+        recent = int(time.time()) - 4 * HOUR  # within PRESSURE_HISTORY_HOURS
+        for h in range(4):
+            upstream.payload = onecall_payload(pressure=1010.0 - h)
+            upstream.payload['current']['dt'] = recent + h * HOUR
+            await first.refresh_cell(cell)
+
+        restarted = make_service(upstream, disk_cache_path=path)
+
+        assert len(restarted.get_pressure_history(1.0, 2.0)) == 4
+        assert await restarted.get_pressure_change(1.0, 2.0, hours_ago=3) == pytest.approx(-3.0)
+        assert len(upstream.requests) == 4
+
+    @pytest.mark.asyncio
+    async def test_history_recorded_by_another_worker(self, upstream, tmp_path):
+        path = str(tmp_path / 'weather_cache.db')
+        worker_a = make_service(upstream, disk_cache_path=path)
+        worker_b = make_service(upstream, disk_cache_path=path)
+        worker_a.REFRESH_AHEAD = 0.0  # refetch every hour instead of reusing the shared payload
+        cell = worker_a.grid_cell(1.0, 2.0)
+        recent = int(time.time()) - 4 * HOUR  # within PRESSURE_HISTORY_HOURS
+        for h in range(4):
+            upstream.payload = onecall_payload(pressure=1010.0 + h)
+            upstream.payload['current']['dt'] = recent + h * HOUR
+            await worker_a.refresh_cell(cell)
+
+        assert await worker_b.get_pressure_change(1.0, 2.0, hours_ago=3) == pytest.approx(3.0)
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "--tb=short"])
@@ -0,0 +1,154 @@
+"""
+Tests for batched what-if (counterfactual) risk scoring
+
+Author: ALINE Team
+Date: 2025-11-17
+"""
+
+import sys
+from pathlib import Path
+
+import pytest
+import torch
+
+# Add project root to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from models.aline import SimpleALINE
+from models.counterfactual import (
+    counterfactual_risk, materialize_variants, perturbation_maps, sensitivity_surfaces
+)
+from models.risk_head import analytic_risk
+
+WEIGHTS = torch.tensor([0.5, 0.4, 0.45, 0.35])
+
+
+@pytest.fixture
+def model():
+    torch.manual_seed(0)
+    return SimpleALINE(in_dim=3, d_model=16, nhead=2, nlayers=1).eval()
+
+
+@pytest.fixture
+def base():
+    return torch.randn(24, 3, generator=torch.Generator().manual_seed(1))
+
+
+class TestPerturbationMaps:
+    """Composition of set/scale/add into per-cell affine maps"""
+
+    def test_operations_compose_in_order(self, base):
+        scenarios = [
+            [('set', [0], 0, 24, 2.0), ('add', [0], 0, 24, 1.0)],
+            [('add', [1], 6, 12, 1.0), ('scale', [1], 0, 24, 3.0)],
+            [('scale', [0, 2], 22, 24, 0.5), ('set', [2], 23, 24, -1.0)],
+        ]
+        variants = materialize_variants(base, *perturbation_maps(scenarios, 24, 3))
+
+        expected = base.repeat(3, 1, 1)
+        expected[0, :, 0] = 3.0
+        expected[1, 6:12, 1] += 1.0
+        expected[1, :, 1] *= 3.0
+        expected[2, 22:, [0, 2]] *= 0.5
+        expected[2, 23, 2] = -1.0
+        assert torch.allclose(variants, expected)
+
+    def test_invalid_perturbations_are_rejected(self):
+        with pytest.raises(ValueError):
+            perturbation_maps([[('pow', [0], 0, 24, 2.0)]], 24, 3)
+        with pytest.raises(ValueError):
+            perturbation_maps([[('set', [3], 0, 24, 2.0)]], 24, 3)
+        with pytest.raises(ValueError):
+            perturbation_maps([[('set', [0], 5, 5, 2.0)]], 24, 3)
+
+
+class TestCounterfactualRisk:
+    """Single-forward scoring of all scenarios"""
+
+    def test_matches_scoring_each_variant(self, model, base):
+        scenarios = [[('scale', [0], 0, 24, 1.0)], [('set', [1], 12, 24, 3.0)]]
+
+        risk = counterfactual_risk(model, base, scenarios, WEIGHTS, -1.8)
+
+        perturbed = base.clone()
+        perturbed[12:, 1] = 3.0
+        with torch.no_grad():
+            posterior, _ = model(torch.stack([base, perturbed]))
+        mean, _, _ = analytic_risk(posterior.mean[:, -1], posterior.stddev[:, -1], WEIGHTS, -1.8)
+
+        assert risk['mean'].shape == (3,)
+        assert torch.allclose(risk['mean'][[0, 2]], mean, atol=1e-6)
+        assert risk['delta'][0].abs().item() < 1e-6
+        assert risk['delta'][1].item() == pytest.approx((mean[1] - mean[0]).item(), abs=1e-6)
+
+
+class TestSensitivitySurfaces:
+    """Batched feature × grid surfaces"""
+
+    def test_matches_set_scenarios(self, model, base):
+        windows = torch.stack([base, base.flip(0)])
+        grid = [-1.0, 0.0, 1.0]
+
+        risk = sensitivity_surfaces(model, windows, [0, 2], grid, WEIGHTS, -1.8)
+
+        assert risk['surface'].shape == (2, 2, 3)
+        for b in range(2):
+            scenarios = [[('set', [f], 0, 24, v)] for f in (0, 2) for v in grid]
+            expected = counterfactual_risk(model, windows[b], scenarios, WEIGHTS, -1.8)
+            assert torch.allclose(risk['mean'][b], expected['mean'][0], atol=1e-6)
+            assert torch.allclose(risk['surface'][b].flatten(), expected['mean'][1:], atol=1e-6)
+
+
+class TestWhatIfEndpoint:
+    """POST /risk/what-if"""
+
+    @pytest.fixture
+    def client(self, model, monkeypatch):
+        from fastapi.testclient import TestClient
+        import service.main as main
+
+        monkeypatch.setitem(main.app_state, 'model', model)
+        monkeypatch.setitem(main.app_state, 'model_loaded', True)
+        monkeypatch.setitem(main.app_state, 'device', torch.device('cpu'))
+        monkeypatch.setitem(main.app_state, 'migraine_weights', WEIGHTS)
+        monkeypatch.setitem(main.app_state, 'migraine_bias', -1.8)
+        monkeypatch.setitem(main.app_state, 'config', {
+            'features': {'feature_names': ['Sleep Duration (hours)', 'Stress Level (1-10)', 'Caffeine Intake (mg)']}
+        })
+        return TestClient(main.app)
+
+    def test_scenarios_and_deltas(self, client, base):
+        response = client.post('/risk/what-if', json={
+            'user_id': 'u1',
+            'features': base.tolist(),
+            'scenarios': [
+                {'name': 'unchanged', 'perturbations': [{'op': 'add', 'features': [0], 'value': 0.0}]},
+                {'name': 'more sleep', 'perturbations': [
+                    {'op': 'set', 'features': ['Sleep Duration (hours)'], 'hour_start': 0, 'hour_end': 8, 'value': 1.5}
+                ]},
+            ]
+        })
+
+        assert response.status_code == 200
+        body = response.json()
+        assert [s['name'] for s in body['scenarios']] == ['unchanged', 'more sleep']
+        assert body['scenarios'][0]['delta'] == pytest.approx(0.0, abs=1e-6)
+        assert body['scenarios'][1]['mean_probability'] == pytest.approx(
+            body['baseline']['mean_probability'] + body['scenarios'][1]['delta'], abs=1e-6
+        )
+
+    def test_bad_requests(self, client, base):
+        def post(perturbation, features=base.tolist()):
+            return client.post('/risk/what-if', json={
+                'user_id': 'u1', 'features': features, 'scenarios': [{'perturbations': [perturbation]}]
+            })
+
+        assert post({'op': 'set', 'features': ['Nope'], 'value': 1.0}).status_code == 400
+        assert post({'op': 'set', 'features': [7], 'value': 1.0}).status_code == 400
+        assert post({'op': 'set', 'features': [0], 'hour_start': 9, 'hour_end': 3, 'value': 1.0}).status_code == 400
+        assert post({'op': 'set', 'features': [0], 'value': 1.0}, features=base.tolist()[:20]).status_code == 400
+        assert post({'op': 'mul', 'features': [0], 'value': 1.0}).status_code == 422
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "--tb=short"])